@@ -0,0 +1,52 @@
+"""Add unique constraint on entities name and type
+
+Revision ID: a1c3e5f7b901
+Revises: 6dac7a7d7811
+Create Date: 2025-04-12 10:21:47.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f7b901'
+down_revision: Union[str, None] = '6dac7a7d7811'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 合併重複的實體：關聯改指向最小 id，再刪除多餘的實體
+    op.execute("""
+        DELETE FROM news_entities ne
+        USING entities e
+        WHERE ne.entity_id = e.id
+          AND EXISTS (
+              SELECT 1 FROM news_entities other
+              JOIN entities oe ON oe.id = other.entity_id
+              WHERE other.news_id = ne.news_id AND other.role = ne.role
+                AND oe.name = e.name AND oe.entity_type = e.entity_type AND oe.id < e.id
+          )
+    """)
+    op.execute("""
+        UPDATE news_entities ne
+        SET entity_id = keep.id
+        FROM entities e, (
+            SELECT name, entity_type, MIN(id) AS id FROM entities GROUP BY name, entity_type
+        ) keep
+        WHERE ne.entity_id = e.id
+          AND keep.name = e.name AND keep.entity_type = e.entity_type AND keep.id <> e.id
+    """)
+    op.execute("""
+        DELETE FROM entities e
+        USING entities keep
+        WHERE keep.name = e.name AND keep.entity_type = e.entity_type AND keep.id < e.id
+    """)
+    op.create_unique_constraint('uq_entity_name_type', 'entities', ['name', 'entity_type'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_entity_name_type', 'entities', type_='unique')
@@ -0,0 +1,31 @@
+"""Create news event sequence
+
+Revision ID: a3b5c7d9e013
+Revises: e1a3c5d7f902
+Create Date: 2025-06-24 15:08:42.731094
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3b5c7d9e013'
+down_revision: Union[str, None] = 'e1a3c5d7f902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 只有透過 pg_notify 推播時才使用；SQLite 上推播事件由行程內以時間產生 id
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(sa.schema.CreateSequence(sa.Sequence('news_event_seq')))
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(sa.schema.DropSequence(sa.Sequence('news_event_seq')))
@@ -0,0 +1,29 @@
+"""Replace news published_at index with (published_at, id)
+
+Revision ID: a7c9e1f3b568
+Revises: f6b8d0e2a457
+Create Date: 2025-06-05 14:27:51.603914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c9e1f3b568'
+down_revision: Union[str, None] = 'f6b8d0e2a457'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 匯出以 (published_at, id) 做 keyset 分頁，複合索引同樣可供只依 published_at 排序的查詢使用
+    op.create_index('idx_news_published_at_id', 'news', ['published_at', 'id'], unique=False)
+    op.drop_index('idx_news_published_at', table_name='news')
+
+
+def downgrade() -> None:
+    op.create_index('idx_news_published_at', 'news', ['published_at'], unique=False)
+    op.drop_index('idx_news_published_at_id', table_name='news')
@@ -0,0 +1,36 @@
+"""Create news_related table
+
+Revision ID: b2d4f6a8c013
+Revises: a1c3e5f7b901
+Create Date: 2025-04-15 21:08:12.640551
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a8c013'
+down_revision: Union[str, None] = 'a1c3e5f7b901'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('news_related',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('news_id', sa.Integer(), nullable=False),
+    sa.Column('related_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['news_id'], ['news.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['related_id'], ['news.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('news_id', 'rank', name='uq_news_related_rank')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('news_related')
@@ -0,0 +1,42 @@
+"""Create facet_counts table
+
+Revision ID: c9e1a3b5d780
+Revises: b8d0f2a4c679
+Create Date: 2025-06-12 10:41:07.362915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9e1a3b5d780'
+down_revision: Union[str, None] = 'b8d0f2a4c679'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('facet_counts',
+    sa.Column('facet_type', sa.String(length=20), nullable=False),
+    sa.Column('facet_id', sa.Integer(), nullable=False),
+    sa.Column('news_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('facet_type', 'facet_id')
+    )
+    # 以既有資料回填計數
+    op.execute("""
+        INSERT INTO facet_counts (facet_type, facet_id, news_count)
+        SELECT 'all', 0, count(*) FROM news
+        UNION ALL
+        SELECT 'category', category_id, count(*) FROM news WHERE category_id IS NOT NULL GROUP BY category_id
+        UNION ALL
+        SELECT 'tag', tag_id, count(DISTINCT news_id) FROM news_tags GROUP BY tag_id
+        UNION ALL
+        SELECT 'entity', entity_id, count(DISTINCT news_id) FROM news_entities GROUP BY entity_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('facet_counts')
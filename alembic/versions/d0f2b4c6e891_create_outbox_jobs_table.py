@@ -0,0 +1,43 @@
+"""Create outbox_jobs table
+
+Revision ID: d0f2b4c6e891
+Revises: c9e1a3b5d780
+Create Date: 2025-06-16 09:27:45.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0f2b4c6e891'
+down_revision: Union[str, None] = 'c9e1a3b5d780'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=100), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('idempotency_key', sa.String(length=300), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index('idx_outbox_jobs_kind_status_run_after', 'outbox_jobs', ['kind', 'status', 'run_after'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_outbox_jobs_kind_status_run_after', table_name='outbox_jobs')
+    op.drop_table('outbox_jobs')
@@ -0,0 +1,46 @@
+"""Create news view analytics tables
+
+Revision ID: d4f6b8c0e235
+Revises: c3e5a7b9d124
+Create Date: 2025-04-22 11:35:50.904417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6b8c0e235'
+down_revision: Union[str, None] = 'c3e5a7b9d124'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 按日分區的原始事件表，分區由 app.analytics 建立與清除
+    op.create_table('news_view_events',
+    sa.Column('news_id', sa.Integer(), nullable=False),
+    sa.Column('viewed_at', sa.DateTime(), nullable=False),
+    postgresql_partition_by='RANGE (viewed_at)'
+    )
+    op.create_index('idx_news_view_events_news_id_viewed_at', 'news_view_events', ['news_id', 'viewed_at'], unique=False)
+    op.create_table('news_view_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('news_id', sa.Integer(), nullable=False),
+    sa.Column('granularity', sa.String(length=10), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('views', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['news_id'], ['news.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('news_id', 'granularity', 'bucket_start', name='uq_news_view_rollup')
+    )
+    op.create_index('idx_news_view_rollups_granularity_bucket', 'news_view_rollups', ['granularity', 'bucket_start'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_news_view_rollups_granularity_bucket', table_name='news_view_rollups')
+    op.drop_table('news_view_rollups')
+    op.drop_index('idx_news_view_events_news_id_viewed_at', table_name='news_view_events')
+    op.drop_table('news_view_events')
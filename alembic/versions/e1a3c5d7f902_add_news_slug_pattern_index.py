@@ -0,0 +1,32 @@
+"""Add news slug pattern index
+
+Revision ID: e1a3c5d7f902
+Revises: d0f2b4c6e891
+Create Date: 2025-06-18 10:12:31.402517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1a3c5d7f902'
+down_revision: Union[str, None] = 'd0f2b4c6e891'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite 以二進位定序比較，既有的唯一索引即可支援前綴範圍查詢
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.create_index('idx_news_slug_pattern', 'news', ['slug'], unique=False,
+                    postgresql_ops={'slug': 'varchar_pattern_ops'})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('idx_news_slug_pattern', table_name='news')
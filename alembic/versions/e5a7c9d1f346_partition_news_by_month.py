@@ -0,0 +1,194 @@
+"""Partition news by published_at month
+
+Revision ID: e5a7c9d1f346
+Revises: d4f6b8c0e235
+Create Date: 2025-04-29 10:12:07.331842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9d1f346'
+down_revision: Union[str, None] = 'd4f6b8c0e235'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEWS_COLUMNS = "id, title, slug, content, summary, published_at, thumbnail_url, is_featured, category_id, created_at, updated_at"
+
+# 分區表上的唯一索引必須包含分區鍵，無法再被外鍵參照；
+# 這些表改由 news_cascade_delete 觸發器在刪除新聞時清理
+DEPENDENT_TABLES = [
+    ('news_tags', 'news_id', 'CASCADE'),
+    ('news_entities', 'news_id', 'CASCADE'),
+    ('news_metrics', 'news_id', 'CASCADE'),
+    ('news_images', 'news_id', None),
+    ('news_related', 'news_id', 'CASCADE'),
+    ('news_related', 'related_id', 'CASCADE'),
+    ('news_fingerprints', 'news_id', 'CASCADE'),
+    ('news_view_rollups', 'news_id', 'CASCADE'),
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("""
+        DO $$
+        DECLARE r record;
+        BEGIN
+            FOR r IN SELECT conrelid::regclass AS tbl, conname FROM pg_constraint
+                     WHERE contype = 'f' AND confrelid = 'news'::regclass LOOP
+                EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', r.tbl, r.conname);
+            END LOOP;
+        END $$
+    """)
+    op.execute("ALTER TABLE news RENAME TO news_unpartitioned")
+    op.execute("ALTER SEQUENCE news_id_seq OWNED BY NONE")
+    op.execute("""
+        CREATE TABLE news (
+            id integer NOT NULL DEFAULT nextval('news_id_seq'),
+            title varchar(255) NOT NULL,
+            slug varchar(300) NOT NULL,
+            content text NOT NULL,
+            summary text,
+            published_at timestamp without time zone NOT NULL,
+            thumbnail_url varchar(512),
+            is_featured boolean,
+            category_id integer REFERENCES categories (id),
+            created_at timestamp without time zone,
+            updated_at timestamp without time zone
+        ) PARTITION BY RANGE (published_at)
+    """)
+    op.execute("CREATE TABLE news_default PARTITION OF news DEFAULT")
+    # 從最舊的新聞到三個月後，每月一個分區；之後由 python -m app.partitions 維護
+    op.execute("""
+        DO $$
+        DECLARE m date;
+        BEGIN
+            FOR m IN SELECT generate_series(
+                         date_trunc('month', coalesce(s.oldest, now())),
+                         date_trunc('month', now()) + interval '3 months',
+                         interval '1 month')::date
+                     FROM (SELECT min(published_at) AS oldest FROM news_unpartitioned) s LOOP
+                EXECUTE format('CREATE TABLE %I PARTITION OF news FOR VALUES FROM (%L) TO (%L)',
+                               'news_p' || to_char(m, 'YYYYMM'), m, (m + interval '1 month')::date);
+            END LOOP;
+        END $$
+    """)
+    op.execute(f"INSERT INTO news ({NEWS_COLUMNS}) SELECT {NEWS_COLUMNS} FROM news_unpartitioned")
+    op.execute("DROP TABLE news_unpartitioned")
+    op.execute("ALTER SEQUENCE news_id_seq OWNED BY news.id")
+
+    # 主鍵必須包含分區鍵；以 id 開頭，依 id 查詢仍可使用
+    op.create_primary_key('news_pkey', 'news', ['id', 'published_at'])
+    op.create_index('idx_news_slug', 'news', ['slug'], unique=False)
+    op.create_index('idx_news_published_at', 'news', ['published_at'], unique=False)
+    op.create_index('idx_news_category_id', 'news', ['category_id'], unique=False)
+    op.create_index('idx_news_is_featured', 'news', ['is_featured'], unique=False)
+
+    # slug 的全域唯一性改由 news_slugs 保證；衝突時以 unique_violation 回報，
+    # crud.add_news 依然收到 IntegrityError 並重新配置 slug
+    op.create_table('news_slugs',
+    sa.Column('slug', sa.String(length=300), nullable=False),
+    sa.Column('news_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('slug')
+    )
+    op.execute("INSERT INTO news_slugs (slug, news_id) SELECT slug, id FROM news")
+    op.execute("""
+        CREATE FUNCTION news_slug_registry() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF current_setting('news.partition_maintenance', true) = 'on' THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'DELETE' THEN
+                -- 跨分區的 UPDATE 會以 DELETE + INSERT 執行，新聞仍在時保留登記
+                DELETE FROM news_slugs s WHERE s.slug = OLD.slug AND s.news_id = OLD.id
+                    AND NOT EXISTS (SELECT 1 FROM news n WHERE n.id = OLD.id AND n.slug = OLD.slug);
+                RETURN NULL;
+            END IF;
+            IF TG_OP = 'UPDATE' THEN
+                IF NEW.slug = OLD.slug THEN
+                    RETURN NULL;
+                END IF;
+                DELETE FROM news_slugs WHERE slug = OLD.slug AND news_id = OLD.id;
+            END IF;
+            INSERT INTO news_slugs (slug, news_id) VALUES (NEW.slug, NEW.id) ON CONFLICT (slug) DO NOTHING;
+            IF NOT FOUND AND NOT EXISTS (SELECT 1 FROM news_slugs WHERE slug = NEW.slug AND news_id = NEW.id) THEN
+                RAISE EXCEPTION 'duplicate key value violates unique constraint "news_slug_key"'
+                    USING ERRCODE = 'unique_violation', CONSTRAINT = 'news_slug_key',
+                          DETAIL = format('Key (slug)=(%s) already exists.', NEW.slug);
+            END IF;
+            RETURN NULL;
+        END $$
+    """)
+    op.execute("""
+        CREATE TRIGGER news_slug_registry AFTER INSERT OR UPDATE OF slug OR DELETE ON news
+        FOR EACH ROW EXECUTE FUNCTION news_slug_registry()
+    """)
+    deletes = "\n".join(
+        f"            DELETE FROM {table} WHERE {column} = OLD.id;" for table, column, _ in DEPENDENT_TABLES
+    )
+    op.execute(f"""
+        CREATE FUNCTION news_cascade_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF current_setting('news.partition_maintenance', true) = 'on'
+               OR EXISTS (SELECT 1 FROM news WHERE id = OLD.id) THEN
+                RETURN NULL;
+            END IF;
+{deletes}
+            RETURN NULL;
+        END $$
+    """)
+    op.execute("""
+        CREATE TRIGGER news_cascade_delete AFTER DELETE ON news
+        FOR EACH ROW EXECUTE FUNCTION news_cascade_delete()
+    """)
+    op.execute("ANALYZE news")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("DROP TRIGGER news_cascade_delete ON news")
+    op.execute("DROP FUNCTION news_cascade_delete()")
+    op.execute("DROP TRIGGER news_slug_registry ON news")
+    op.execute("DROP FUNCTION news_slug_registry()")
+    op.drop_table('news_slugs')
+    op.drop_index('idx_news_is_featured', table_name='news')
+    op.drop_index('idx_news_category_id', table_name='news')
+    op.drop_index('idx_news_published_at', table_name='news')
+    op.drop_index('idx_news_slug', table_name='news')
+    op.drop_constraint('news_pkey', 'news', type_='primary')
+
+    op.execute("ALTER TABLE news RENAME TO news_partitioned")
+    op.execute("ALTER SEQUENCE news_id_seq OWNED BY NONE")
+    op.create_table('news',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('news_id_seq')"), nullable=False),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('slug', sa.String(length=300), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('summary', sa.Text(), nullable=True),
+    sa.Column('published_at', sa.DateTime(), nullable=False),
+    sa.Column('thumbnail_url', sa.String(length=512), nullable=True),
+    sa.Column('is_featured', sa.Boolean(), nullable=True),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('slug')
+    )
+    op.execute(f"INSERT INTO news ({NEWS_COLUMNS}) SELECT {NEWS_COLUMNS} FROM news_partitioned")
+    op.execute("DROP TABLE news_partitioned")
+    op.execute("ALTER SEQUENCE news_id_seq OWNED BY news.id")
+    op.create_index('idx_news_category_id', 'news', ['category_id'], unique=False)
+    op.create_index('idx_news_is_featured', 'news', ['is_featured'], unique=False)
+    op.create_index('idx_news_published_at', 'news', ['published_at'], unique=False)
+    for table, column, ondelete in DEPENDENT_TABLES:
+        op.create_foreign_key(None, table, 'news', [column], ['id'], ondelete=ondelete)
@@ -0,0 +1,29 @@
+"""Add sha256 to news_images
+
+Revision ID: f6b8d0e2a457
+Revises: e5a7c9d1f346
+Create Date: 2025-06-02 09:41:18.206531
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b8d0e2a457'
+down_revision: Union[str, None] = 'e5a7c9d1f346'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('news_images', sa.Column('sha256', sa.String(length=64), nullable=True))
+    # 既有圖片以資料庫計算雜湊；SQLite 沒有 sha256 函式，留待下次上傳時補上
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("UPDATE news_images SET sha256 = encode(sha256(image_data), 'hex')")
+
+
+def downgrade() -> None:
+    op.drop_column('news_images', 'sha256')
@@ -0,0 +1,225 @@
+"""請求准入控制：每個客戶端與路由的令牌桶限流，以及昂貴路由的並行上限
+
+超過速率回 429、並行已滿回 503，兩者都帶 Retry-After，讓過載時的延遲維持在可控範圍，
+而不是讓請求在資料庫連線池前排隊直到逾時。令牌桶預設存在行程內；設定 REDIS_URL 後改用
+Redis（Lua 腳本原子更新），多個 worker 共用同一份額度。
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .cache import LRUCache
+
+ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+REDIS_URL = os.getenv("REDIS_URL")
+# 在反向代理後面時，以 X-Forwarded-For 的第一個位址識別客戶端
+TRUST_PROXY = os.getenv("TRUST_PROXY", "0") == "1"
+
+
+class Rule(NamedTuple):
+    name: str
+    pattern: Pattern
+    methods: Tuple[str, ...]
+    rate: float
+    burst: int
+    max_concurrency: Optional[int] = None
+    max_wait: float = 0.05
+
+
+# 由上而下比對，第一條符合的規則生效
+RULES: List[Rule] = [
+    Rule("search", re.compile(r"^/search/$"), ("GET",), rate=5, burst=10, max_concurrency=4),
+    Rule("write", re.compile(r"^/news/"), ("POST",), rate=2, burst=10, max_concurrency=4),
+    # 匯出會長時間佔用一條資料庫連線
+    Rule("export", re.compile(r"^/export/"), ("GET",), rate=0.2, burst=3, max_concurrency=2),
+    Rule("default", re.compile(r"^/"), ("GET", "POST"), rate=20, burst=40),
+]
+
+
+class MemoryBucketStore:
+    """行程內令牌桶，桶的數量有上限"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self._buckets = LRUCache(maxsize=max_keys)
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        """取一個令牌，回傳 (是否允許, 需等待的秒數)"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        if tokens >= 1.0:
+            self._buckets.put(key, (tokens - 1.0, now))
+            return True, 0.0
+        self._buckets.put(key, (tokens, now))
+        return False, (1.0 - tokens) / rate
+
+
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisBucketStore:
+    """以 Redis 共用的令牌桶；Redis 無法連線時放行請求，不讓限流本身變成故障點"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as aioredis
+
+        self._client = aioredis.from_url(url)
+        self._script = self._client.register_script(_REDIS_TOKEN_BUCKET)
+        self.prefix = prefix
+        self.errors = 0
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        try:
+            allowed, retry = await self._script(keys=[self.prefix + key], args=[rate, burst])
+        except Exception:
+            self.errors += 1
+            return True, 0.0
+        return bool(allowed), float(retry)
+
+
+class ConcurrencyLimiter:
+    """並行上限；滿載時最多等待 max_wait 秒，之後直接拒絕"""
+
+    def __init__(self, limit: int, max_wait: float):
+        self.limit = limit
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self.limit - self._semaphore._value
+
+    async def acquire(self) -> bool:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return True
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def release(self):
+        self._semaphore.release()
+
+
+class AdmissionStats:
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.limiters: Dict[str, ConcurrencyLimiter] = {}
+
+    def record(self, rule: str, outcome: str):
+        self.counts[(rule, outcome)] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        result: Dict[str, Dict[str, int]] = {}
+        for (rule, outcome), count in self.counts.items():
+            result.setdefault(rule, {})[outcome] = count
+        for name, limiter in self.limiters.items():
+            result.setdefault(name, {})["in_flight"] = limiter.in_flight
+        return result
+
+
+stats = AdmissionStats()
+
+
+def _client_id(scope: Scope) -> str:
+    if TRUST_PROXY:
+        forwarded = Headers(scope=scope).get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def _reject(send: Send, status: int, retry_after: float, detail: str):
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp, rules: List[Rule] = RULES, store=None):
+        self.app = app
+        self.rules = rules
+        if store is None:
+            store = RedisBucketStore(REDIS_URL) if REDIS_URL else MemoryBucketStore()
+        self.store = store
+        self.limiters = {
+            rule.name: ConcurrencyLimiter(rule.max_concurrency, rule.max_wait)
+            for rule in rules if rule.max_concurrency
+        }
+        stats.limiters = self.limiters
+
+    def _match(self, scope: Scope) -> Optional[Rule]:
+        for rule in self.rules:
+            if scope["method"] in rule.methods and rule.pattern.match(scope["path"]):
+                return rule
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        rule = self._match(scope)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, retry_after = await self.store.take(f"{rule.name}:{_client_id(scope)}", rule.rate, rule.burst)
+        if not allowed:
+            stats.record(rule.name, "rate_limited")
+            await _reject(send, 429, retry_after, "請求過於頻繁，請稍後再試")
+            return
+
+        limiter = self.limiters.get(rule.name)
+        if limiter is None:
+            stats.record(rule.name, "admitted")
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            stats.record(rule.name, "shed")
+            await _reject(send, 503, 1, "伺服器忙碌中，請稍後再試")
+            return
+        stats.record(rule.name, "admitted")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
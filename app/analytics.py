@@ -0,0 +1,259 @@
+"""新聞瀏覽分析：記憶體緩衝的瀏覽事件、批次寫入、分鐘/小時/日彙總與資料保留
+
+請求路徑上只做一次 append；背景執行緒定期把緩衝區以 COPY 寫入按日分區的
+news_view_events，並在同一個交易中把增量累加到 news_view_rollups 與 news_metrics.view_count
+（熱門新聞依 view_count 排序）。
+"""
+import argparse
+import io
+import threading
+from collections import Counter, deque
+from datetime import date, datetime, timedelta
+from typing import Deque, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+from .database import copy_from
+
+FLUSH_INTERVAL = 1.0
+FLUSH_SIZE = 5000
+# 資料庫無法寫入時緩衝區的上限，超過時丟棄最舊的事件
+MAX_BUFFER = 200_000
+
+GRANULARITIES = ("minute", "hour", "day")
+RAW_RETENTION_DAYS = 7
+ROLLUP_RETENTION_DAYS = {"minute": 2, "hour": 90}
+PARTITION_PREFIX = "news_view_events_p"
+
+ViewEvent = Tuple[int, datetime]
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _partition_name(day: date) -> str:
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+class ViewRecorder:
+    """收集瀏覽事件並在背景批次寫入"""
+
+    def __init__(self, engine: Engine, flush_interval: float = FLUSH_INTERVAL,
+                 flush_size: int = FLUSH_SIZE, max_buffer: int = MAX_BUFFER):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._buffer: Deque[ViewEvent] = deque(maxlen=max_buffer)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._partitions: Set[date] = set()
+        self.dropped = 0
+        self.flushed = 0
+
+    def record(self, news_id: int, viewed_at: Optional[datetime] = None):
+        """記錄一次瀏覽（O(1)，不碰資料庫）"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((news_id, viewed_at or datetime.now()))
+        if len(self._buffer) >= self.flush_size:
+            self._wakeup.set()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="view-recorder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"寫入瀏覽事件時出錯: {e}")
+
+    def flush(self) -> int:
+        """把緩衝區寫入資料庫，回傳寫入的事件數"""
+        with self._flush_lock:
+            events: List[ViewEvent] = []
+            while self._buffer:
+                events.append(self._buffer.popleft())
+            if not events:
+                return 0
+            try:
+                with self.engine.begin() as conn:
+                    created = self._ensure_partitions(conn, {ts.date() for _, ts in events})
+                    _copy_events(conn, events)
+                    _apply_rollups(conn, events)
+                    _apply_view_counts(conn, events)
+            except Exception:
+                # 放回緩衝區，下次再試；緩衝區中的事件都比這一批新，放不下時丟棄這一批中最舊的
+                room = max(self._buffer.maxlen - len(self._buffer), 0)
+                kept = events[max(len(events) - room, 0):] if room else []
+                self._buffer.extendleft(reversed(kept))
+                self.dropped += len(events) - len(kept)
+                raise
+            # 交易 commit 後才記為已建立，rollback 時下次會重新建立
+            self._partitions |= created
+            self.flushed += len(events)
+            return len(events)
+
+    def _ensure_partitions(self, conn: Connection, days: Iterable[date]) -> Set[date]:
+        """建立尚未確認存在的分區，回傳這次建立的日期"""
+        missing = set(days) - self._partitions
+        if missing and conn.dialect.name == "postgresql":
+            for day in missing:
+                create_partition(conn, day)
+        return missing
+
+
+def create_partition(conn: Connection, day: date):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_partition_name(day)} PARTITION OF news_view_events "
+        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+    ))
+
+
+def _copy_events(conn: Connection, events: List[ViewEvent]):
+    if conn.dialect.name == "postgresql":
+        buf = io.StringIO()
+        for news_id, viewed_at in events:
+            buf.write(f"{news_id}\t{viewed_at.isoformat(sep=' ')}\n")
+        buf.seek(0)
+        copy_from(conn, "COPY news_view_events (news_id, viewed_at) FROM STDIN", buf)
+    else:
+        conn.execute(
+            insert(models.news_view_events),
+            [{"news_id": news_id, "viewed_at": viewed_at} for news_id, viewed_at in events],
+        )
+
+
+def _apply_rollups(conn: Connection, events: List[ViewEvent]):
+    """先在記憶體中彙總，再以 upsert 累加到各粒度的桶"""
+    counts = Counter(
+        (news_id, granularity, bucket_start(viewed_at, granularity))
+        for news_id, viewed_at in events
+        for granularity in GRANULARITIES
+    )
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(models.NewsViewRollup)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["news_id", "granularity", "bucket_start"],
+        set_={"views": models.NewsViewRollup.views + stmt.excluded.views},
+    )
+    conn.execute(stmt, [
+        {"news_id": news_id, "granularity": granularity, "bucket_start": start, "views": views}
+        for (news_id, granularity, start), views in counts.items()
+    ])
+
+
+def _apply_view_counts(conn: Connection, events: List[ViewEvent]):
+    """把這一批的瀏覽數累加到 news_metrics；依 news_id 順序更新，並行的交易不會互相死結"""
+    counts = Counter(news_id for news_id, _ in events)
+    now = datetime.now()
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(models.NewsMetrics)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["news_id"],
+        set_={"view_count": models.NewsMetrics.view_count + stmt.excluded.view_count,
+              "last_updated": stmt.excluded.last_updated},
+    )
+    conn.execute(stmt, [
+        {"news_id": news_id, "view_count": views, "last_updated": now}
+        for news_id, views in sorted(counts.items())
+    ])
+
+
+def get_view_series(conn, news_id: int, granularity: str, since: datetime,
+                    until: Optional[datetime] = None):
+    """只讀取彙總表的瀏覽量時間序列"""
+    query = select(models.NewsViewRollup.bucket_start, models.NewsViewRollup.views) \
+        .where(
+            models.NewsViewRollup.news_id == news_id,
+            models.NewsViewRollup.granularity == granularity,
+            models.NewsViewRollup.bucket_start >= bucket_start(since, granularity),
+        ) \
+        .order_by(models.NewsViewRollup.bucket_start)
+    if until is not None:
+        query = query.where(models.NewsViewRollup.bucket_start <= until)
+    return conn.execute(query).all()
+
+
+def maintain(engine: Engine, today: Optional[date] = None, days_ahead: int = 3):
+    """預先建立未來的分區，並依保留政策刪除舊的原始事件與細粒度彙總"""
+    today = today or date.today()
+    raw_cutoff = today - timedelta(days=RAW_RETENTION_DAYS)
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            for offset in range(days_ahead + 1):
+                create_partition(conn, today + timedelta(days=offset))
+            partitions = conn.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'news_view_events'"
+            )).scalars().all()
+            for name in partitions:
+                try:
+                    day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+                except ValueError:
+                    continue
+                if day < raw_cutoff:
+                    conn.execute(text(f"DROP TABLE {name}"))
+                    print(f"已刪除分區 {name}")
+        else:
+            conn.execute(
+                delete(models.news_view_events)
+                .where(models.news_view_events.c.viewed_at < datetime.combine(raw_cutoff, datetime.min.time()))
+            )
+
+        for granularity, days in ROLLUP_RETENTION_DAYS.items():
+            cutoff = datetime.combine(today - timedelta(days=days), datetime.min.time())
+            conn.execute(
+                delete(models.NewsViewRollup)
+                .where(models.NewsViewRollup.granularity == granularity,
+                       models.NewsViewRollup.bucket_start < cutoff)
+            )
+
+
+_recorder: Optional[ViewRecorder] = None
+
+
+def get_recorder() -> ViewRecorder:
+    global _recorder
+    if _recorder is None:
+        from .database import engine
+        _recorder = ViewRecorder(engine)
+    return _recorder
+
+
+def record_view(news_id: int):
+    get_recorder().record(news_id)
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="瀏覽分析維護：建立分區、套用保留政策")
+    parser.add_argument("--days-ahead", type=int, default=3, help="預先建立幾天後的分區")
+    args = parser.parse_args()
+    maintain(engine, days_ahead=args.days_ahead)
@@ -0,0 +1,207 @@
+"""回應壓縮：依 Accept-Encoding 協商 br / zstd / gzip，並快取已壓縮的熱門列表回應
+
+只有可快取路徑的 GET 200 回應會進快取；每個壓縮格式的結果在第一次被要求時產生並存入，
+之後相同格式的請求直接送出快取中的位元組，不會再壓縮一次。串流回應（例如 SSE）不會被緩衝或壓縮。
+"""
+import asyncio
+import gzip
+import os
+import re
+import time
+import zlib
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 未安裝時不提供 br
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 未安裝時不提供 zstd
+    zstandard = None
+
+MINIMUM_SIZE = 1024
+# 超過此大小的回應改在執行緒池中壓縮，避免卡住事件迴圈
+OFFLOAD_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 6
+
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "10"))
+CACHEABLE_PATHS = [
+    re.compile(r"^/news/$"),
+    re.compile(r"^/news/hot/$"),
+    re.compile(r"^/news/featured/$"),
+    re.compile(r"^/news/[^/]+/related$"),
+    re.compile(r"^/categories/[^/]+/news/$"),
+    re.compile(r"^/tags/[^/]+/news/$"),
+    re.compile(r"^/facets$"),
+    re.compile(r"^/trending/[^/]+$"),
+]
+
+# 伺服器偏好順序（q 值相同時）
+_PREFERENCE = ["br", "zstd", "gzip"]
+
+
+def _compressors() -> Dict[str, Callable[[bytes], bytes]]:
+    compressors = {"gzip": lambda body: gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli is not None:
+        compressors["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+    if zstandard is not None:
+        compressors["zstd"] = lambda body: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return compressors
+
+
+COMPRESSORS = _compressors()
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """從 Accept-Encoding 選出最適合的壓縮格式，不壓縮時回傳 None"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+    best, best_q = None, 0.0
+    for coding in _PREFERENCE:
+        if coding not in COMPRESSORS:
+            continue
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CachedResponse(NamedTuple):
+    status: int
+    headers: List[Tuple[bytes, bytes]]
+    variants: Dict[Optional[str], bytes]
+    expires_at: float
+
+
+response_cache = LRUCache(maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "512")))
+
+
+def streaming_compressor(encoding: str) -> Callable[[bytes, bool], bytes]:
+    """串流回應用的增量壓縮器；每段資料都會 flush，客戶端不必等整個回應結束才能解壓"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return lambda data, final: compressor.process(data) + (compressor.finish() if final else compressor.flush())
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        return lambda data, final: compressor.compress(data) + compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_FINISH if final else zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return lambda data, final: compressor.compress(data) + compressor.flush(
+        zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def _is_cacheable(scope: Scope) -> bool:
+    return scope["method"] == "GET" and any(p.match(scope["path"]) for p in CACHEABLE_PATHS)
+
+
+async def _compress(encoding: str, body: bytes) -> bytes:
+    if len(body) >= OFFLOAD_SIZE:
+        return await asyncio.to_thread(COMPRESSORS[encoding], body)
+    return COMPRESSORS[encoding](body)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE, cache_ttl: float = CACHE_TTL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache_ttl = cache_ttl
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        cache_key = None
+        if self.cache_ttl > 0 and _is_cacheable(scope):
+            cache_key = (scope["path"], scope.get("query_string", b""))
+            entry = response_cache.get(cache_key)
+            if entry is not None and entry.expires_at > time.monotonic():
+                await self._send_cached(entry, encoding, send)
+                return
+
+        start_message: Optional[Message] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-length" not in headers or "content-encoding" in headers:
+                    # 串流或已壓縮的回應原樣送出，標頭不延遲
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if cache_key is not None and start_message["status"] == 200:
+                entry = CachedResponse(
+                    status=200,
+                    headers=[(k, v) for k, v in start_message["headers"] if k.lower() != b"content-length"],
+                    variants={None: body},
+                    expires_at=time.monotonic() + self.cache_ttl,
+                )
+                response_cache.put(cache_key, entry)
+                await self._send_cached(entry, encoding, send)
+                return
+
+            if encoding is not None and len(body) >= self.minimum_size:
+                body = await _compress(encoding, body)
+                mutable = MutableHeaders(raw=list(start_message["headers"]))
+                mutable["content-encoding"] = encoding
+                mutable["content-length"] = str(len(body))
+                mutable.add_vary_header("Accept-Encoding")
+                start_message = {**start_message, "headers": mutable.raw}
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _send_cached(self, entry: CachedResponse, encoding: Optional[str], send: Send):
+        identity = entry.variants[None]
+        if encoding is None or len(identity) < self.minimum_size:
+            encoding = None
+        body = entry.variants.get(encoding)
+        if body is None:
+            body = await _compress(encoding, identity)
+            # variants 只會新增鍵，並行請求最多重複壓縮一次
+            entry.variants[encoding] = body
+
+        headers = MutableHeaders(raw=list(entry.headers))
+        headers["content-length"] = str(len(body))
+        headers.add_vary_header("Accept-Encoding")
+        if encoding is not None:
+            headers["content-encoding"] = encoding
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers.raw})
+        await send({"type": "http.response.body", "body": body})
@@ -1,13 +1,97 @@
-from sqlalchemy.orm import Session
-from datetime import datetime
+from sqlalchemy import BigInteger, and_, bindparam, cast, exists, func, select, true, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload, load_only, selectinload
+from collections import Counter
+from datetime import datetime, timezone
 from slugify import slugify
-from . import models
-from typing import List, Optional, Dict
+from . import dedup, facets, jobs, models, push
+from .cache import slug_cache
+from .compression import response_cache
+from functools import lru_cache
+from typing import List, Optional, Dict, FrozenSet, Iterable, Tuple, Any
+
+# slug 最長 300 字元，保留空間給 "-<n>" 後綴
+SLUG_MAX_LENGTH = 280
+SLUG_RETRIES = 3
+
+# 可選擇的新聞欄位；列表頁預設只取卡片需要的欄位
+NEWS_COLUMN_FIELDS = ("id", "title", "slug", "content", "summary", "published_at", "thumbnail_url",
+                      "is_featured", "category_id", "created_at", "updated_at")
+NEWS_RELATION_FIELDS = ("category", "tags", "metrics")
+NEWS_FIELDS = NEWS_COLUMN_FIELDS + NEWS_RELATION_FIELDS + ("image_url",)
+CARD_FIELDS = ("id", "title", "slug", "summary", "published_at", "thumbnail_url", "is_featured",
+               "category", "image_url")
+
+# (news_id, entity_name, entity_type, role, metadata)
+EntityLink = Tuple[int, str, str, str, Optional[Dict[str, Any]]]
+
+# 熱路徑查詢在模組載入時建立一次，參數一律以 bindparam 傳入：重複使用同一個 select() 物件時
+# SQLAlchemy 不必每次重建查詢與快取鍵，也不會重新編譯；SQL 字串固定，驅動可以把它當成預備語句
+_HOT_NEWS = select(models.News) \
+    .join(models.NewsMetrics, models.News.id == models.NewsMetrics.news_id) \
+    .order_by(models.NewsMetrics.view_count.desc()) \
+    .limit(bindparam("limit"))
+_FEATURED_NEWS = select(models.News) \
+    .where(models.News.is_featured == true()) \
+    .order_by(models.News.published_at.desc()) \
+    .limit(bindparam("limit"))
+_NEWS_BY_SLUG = select(models.News).where(models.News.slug == bindparam("slug")).limit(1)
+_RELATED_NEWS = select(models.News) \
+    .join(models.NewsRelated, models.News.id == models.NewsRelated.related_id) \
+    .where(models.NewsRelated.news_id == select(models.News.id)
+           .where(models.News.slug == bindparam("slug")).scalar_subquery()) \
+    .order_by(models.NewsRelated.rank) \
+    .limit(bindparam("limit"))
+# 列表查詢依欄位投影組合各建立一次
+LIST_STATEMENT_CACHE_SIZE = 256
+
+
+def _insert(db: Session, model):
+    """依資料庫方言建立支援 ON CONFLICT 的 INSERT"""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
+
+def allocate_slug(db: Session, title: str) -> str:
+    """產生不重複的 slug，重複時加上比現有最大數字後綴大一的後綴"""
+    base = slugify(title, max_length=SLUG_MAX_LENGTH) or "news"
+    if db.scalar(select(models.News.id).where(models.News.slug == base).limit(1)) is None:
+        return base
+    prefix = f"{base}-"
+    # 只掃描 prefix 之後緊接著數字的 slug，「base-xxx-...」這類共用前綴的 slug 不在範圍內
+    slug = models.News.slug
+    suffix = func.substr(slug, len(prefix) + 1)
+    if db.get_bind().dialect.name == "postgresql":
+        # 非 C 定序下一般的比較運算子用不到索引，改用 varchar_pattern_ops 索引支援的逐位元組比較
+        in_range = and_(slug.op("~>=~")(f"{prefix}0"), slug.op("~<~")(f"{prefix}:"))
+        numeric = suffix.op("~")("^[0-9]{1,9}$")
+    else:
+        in_range = and_(slug >= f"{prefix}0", slug < f"{prefix}:")
+        numeric = and_(func.length(suffix) <= 9, ~suffix.op("GLOB")("*[^0-9]*"))
+    highest = db.scalar(select(func.max(cast(suffix, BigInteger))).where(in_range, numeric))
+    return f"{prefix}{max(highest or 1, 1) + 1}"
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """帶時區的時間轉成 UTC 後去掉時區；published_at 欄位不帶時區，兩者無法直接比較"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
 
 def add_news(db: Session, title: str, content: str, summary: str, 
              published_at: datetime, category_name: str, tags: List[str] = None, 
              ):
-    """向資料庫添加新聞"""
+    """向資料庫添加新聞（近似重複的新聞會合併到既有新聞）"""
+    published_at = _naive_utc(published_at)
+    fingerprint = dedup.simhash(content)
+    duplicate_id = dedup.find_duplicate(db, fingerprint)
+    if duplicate_id is not None:
+        news = db.query(models.News).filter(models.News.id == duplicate_id).first()
+        if news:
+            return _merge_news(db, news, title, content, summary, published_at, tags, fingerprint)
+
     # 處理分類
     category = db.query(models.Category).filter(models.Category.name == category_name).first()
     if not category:
@@ -16,97 +100,267 @@ def add_news(db: Session, title: str, content: str, summary: str,
         db.flush()
     # add image
     
-    # 創建新聞
-    news = models.News(
-        title=title,
-        slug=slugify(title),
-        content=content,
-        summary=summary,
-        published_at=published_at,
-        category_id=category.id,
-        
-    )
-    db.add(news)
-    db.flush()
+    # 創建新聞，slug 被其他 worker 搶先使用時重新分配
+    for attempt in range(SLUG_RETRIES):
+        news = models.News(
+            title=title,
+            slug=allocate_slug(db, title),
+            content=content,
+            summary=summary,
+            published_at=published_at,
+            category_id=category.id,
+            
+        )
+        try:
+            with db.begin_nested():
+                db.add(news)
+        except IntegrityError:
+            if attempt == SLUG_RETRIES - 1:
+                raise
+        else:
+            break
     
     # 添加標籤
-    if tags:
-        for tag_name in tags:
-            tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
-            if not tag:
-                tag = models.Tag(name=tag_name, slug=slugify(tag_name))
-                db.add(tag)
-                db.flush()
-            
-            news_tag = models.NewsTag(news_id=news.id, tag_id=tag.id)
-            db.add(news_tag)
+    tag_ids = _add_tags(db, news.id, tags)
     
     # 初始化新聞指標
     metrics = models.NewsMetrics(news_id=news.id, view_count=0)
     db.add(metrics)
     
+    dedup.save_fingerprint(db, news.id, fingerprint)
+    facet_keys = [("category", category.id)] + [("tag", tag_id) for tag_id in tag_ids]
+    facets.increment(db, facet_keys + [facets.TOTAL_KEY])
+    _enqueue_processing(db, news.id, fingerprint)
+    event = push.news_event_data(news)
+    db.commit()
+    dedup.index_fingerprint(news.id, fingerprint)
+    facets.index_news(news.id, category.id, published_at, facet_keys)
+    jobs.wake()
+    push.announce(db, "created", event)
+    return news
+
+
+def _enqueue_processing(db: Session, news_id: int, fingerprint: int):
+    """在寫入新聞的同一個交易中排入後續處理；以內容指紋作為 key，內容相同時不會重複處理"""
+    jobs.enqueue(db, "news.extract_entities", {"news_id": news_id},
+                 key=f"news.extract_entities:{news_id}:{fingerprint}")
+
+
+def _add_tags(db: Session, news_id: int, tags: Optional[List[str]], existing: Iterable[int] = ()) -> List[int]:
+    """為新聞加上標籤，略過已存在的關聯；回傳新加上的標籤 id"""
+    seen = set(existing)
+    added = []
+    for tag_name in tags or []:
+        tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
+        if not tag:
+            tag = models.Tag(name=tag_name, slug=slugify(tag_name))
+            db.add(tag)
+            db.flush()
+        if tag.id in seen:
+            continue
+        seen.add(tag.id)
+        
+        news_tag = models.NewsTag(news_id=news_id, tag_id=tag.id)
+        db.add(news_tag)
+        added.append(tag.id)
+    return added
+
+
+def _merge_news(db: Session, news: models.News, title: str, content: str, summary: str,
+                published_at: datetime, tags: Optional[List[str]], fingerprint: int):
+    """把近似重複的新聞合併到既有新聞：較新的版本覆蓋內容，標籤取聯集"""
+    previous_published_at = news.published_at
+    if published_at >= _naive_utc(news.published_at):
+        news.title = title
+        news.content = content
+        news.summary = summary
+        news.published_at = published_at
+        dedup.save_fingerprint(db, news.id, fingerprint)
+        _enqueue_processing(db, news.id, fingerprint)
+    else:
+        fingerprint = None
+    
+    tag_ids = _add_tags(db, news.id, tags, existing=(tag.id for tag in news.tags))
+    facet_keys = [("tag", tag_id) for tag_id in tag_ids]
+    facets.increment(db, facet_keys)
+    
+    event = push.news_event_data(news)
+    category_id, current_published_at = news.category_id, news.published_at
     db.commit()
+    facets.index_news(news.id, category_id, current_published_at, facet_keys, previous_published_at)
+    if fingerprint is not None:
+        dedup.index_fingerprint(news.id, fingerprint)
+        jobs.wake()
+        push.announce(db, "updated", event)
     return news
 
 def get_hot_news(db: Session, limit: int = 5):
     """獲取熱門新聞"""
-    return db.query(models.News) \
-        .join(models.NewsMetrics, models.News.id == models.NewsMetrics.news_id) \
-        .order_by(models.NewsMetrics.view_count.desc()) \
-        .limit(limit) \
-        .all()
+    return db.scalars(_HOT_NEWS, {"limit": limit}).all()
 
 
-def record_news_view(db: Session, news_id: int):
-    """記錄新聞瀏覽"""
-    metrics = db.query(models.NewsMetrics).filter(models.NewsMetrics.news_id == news_id).first()
-    if metrics:
-        metrics.view_count += 1
-        metrics.last_updated = datetime.now()
-    else:
-        metrics = models.NewsMetrics(news_id=news_id, view_count=1)
-        db.add(metrics)
+def set_news_image(db: Session, news_id: int, file, mime_type: str, sha256: str) -> bool:
+    """寫入新聞圖片，內容與現有圖片相同時不重寫；回傳是否有變更"""
+    existing = db.query(models.NewsImage).filter(models.NewsImage.news_id == news_id).first()
+    if existing is not None and existing.sha256 == sha256:
+        return False
+    if existing is None:
+        existing = models.NewsImage(news_id=news_id, created_at=datetime.now())
+        db.add(existing)
+    existing.image_data = file.read()
+    existing.mime_type = mime_type
+    existing.sha256 = sha256
     db.commit()
+    return True
+
+
+def get_media_asset(db: Session, sha256: str) -> Optional[models.MediaAsset]:
+    return db.query(models.MediaAsset).filter(models.MediaAsset.sha256 == sha256).first()
+
+
+def existing_media_hashes(db: Session, hashes: Iterable[str]) -> set:
+    hashes = list(hashes)
+    if not hashes:
+        return set()
+    return set(db.scalars(select(models.MediaAsset.sha256).where(models.MediaAsset.sha256.in_(hashes))))
+
+
+def add_media_assets(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """批次寫入媒體檔，已存在的雜湊直接略過；回傳新寫入的數量"""
+    if not rows:
+        return 0
+    created = db.execute(
+        _insert(db, models.MediaAsset)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["sha256"])
+        .returning(models.MediaAsset.sha256)
+    ).all()
+    db.commit()
+    return len(created)
 
 
 def add_entity_to_news(db: Session, news_id: int, entity_name: str, entity_type: str, role: str, metadata: Dict = None):
     """添加實體關聯"""
-    entity = db.query(models.Entity).filter(
-        models.Entity.name == entity_name,
-        models.Entity.entity_type == entity_type
-    ).first()
+    add_entities_to_news_batch(db, [(news_id, entity_name, entity_type, role, metadata)])
+
+
+def add_entities_to_news_batch(db: Session, links: Iterable[EntityLink]):
+    """批次添加實體關聯（已存在的關聯會被略過）
+
+    Returns:
+        新建立的 news_entities 列，已存在的關聯不會出現在結果中
+    """
+    links = list(links)
+    if not links:
+        return []
+
+    # 補上缺少的實體，同名同類型只取第一次出現的 metadata
+    entity_rows = {}
+    for _, name, entity_type, _, metadata in links:
+        entity_rows.setdefault((name, entity_type), {
+            "name": name, "entity_type": entity_type, "meta_info": metadata
+        })
+    db.execute(
+        _insert(db, models.Entity)
+        .values(list(entity_rows.values()))
+        .on_conflict_do_nothing(index_elements=["name", "entity_type"])
+    )
+    entity_ids = {
+        (name, entity_type): entity_id
+        for entity_id, name, entity_type in db.execute(
+            select(models.Entity.id, models.Entity.name, models.Entity.entity_type)
+            .where(tuple_(models.Entity.name, models.Entity.entity_type).in_(list(entity_rows)))
+        )
+    }
+
+    # 一次寫入所有關聯，衝突的列直接略過
+    link_rows = list({
+        (news_id, entity_ids[(name, entity_type)], role): {
+            "news_id": news_id, "entity_id": entity_ids[(name, entity_type)], "role": role
+        }
+        for news_id, name, entity_type, role, _ in links
+    }.values())
+    created = db.execute(
+        _insert(db, models.NewsEntity)
+        .values(link_rows)
+        .on_conflict_do_nothing(index_elements=["news_id", "entity_id", "role"])
+        .returning(
+            models.NewsEntity.id, models.NewsEntity.news_id,
+            models.NewsEntity.entity_id, models.NewsEntity.role
+        )
+    ).all()
+    # 同一實體可能以不同 role 關聯同一篇新聞，只有第一次關聯才計入分面
+    pairs = {(row.news_id, row.entity_id) for row in created}
+    linked = Counter(
+        tuple(pair) for pair in db.execute(
+            select(models.NewsEntity.news_id, models.NewsEntity.entity_id)
+            .where(tuple_(models.NewsEntity.news_id, models.NewsEntity.entity_id).in_(list(pairs)))
+        )
+    ) if pairs else Counter()
+    created_per_pair = Counter((row.news_id, row.entity_id) for row in created)
+    new_pairs = [pair for pair in pairs if linked[pair] == created_per_pair[pair]]
+    facets.increment(db, [("entity", entity_id) for _, entity_id in new_pairs])
+    db.commit()
+    facets.index_links((news_id, ("entity", entity_id)) for news_id, entity_id in new_pairs)
+    # 背景抽取實體不經過 API 的寫入路由，快取的 /facets 等回應要在這裡清除（只清得到本行程的快取）
+    if created:
+        response_cache.clear()
+    return created
+
+
+@lru_cache(maxsize=LIST_STATEMENT_CACHE_SIZE)
+def _news_list_statement(source: Optional[str], fields: Optional[FrozenSet[str]]):
+    """最新、分類或標籤新聞列表的查詢；只載入指定欄位（None 表示完整新聞），並以 EXISTS 子查詢判斷有無圖片"""
+    stmt = select(models.News)
+    if source == "category":
+        stmt = stmt.join(models.Category, models.News.category_id == models.Category.id) \
+            .where(models.Category.slug == bindparam("slug"))
+    elif source == "tag":
+        stmt = stmt.join(models.NewsTag, models.News.id == models.NewsTag.news_id) \
+            .join(models.Tag, models.NewsTag.tag_id == models.Tag.id) \
+            .where(models.Tag.slug == bindparam("slug"))
+    stmt = stmt.order_by(models.News.published_at.desc()) \
+        .offset(bindparam("skip")) \
+        .limit(bindparam("limit"))
     
-    if not entity:
-        entity = models.Entity(name=entity_name, entity_type=entity_type, metadata=metadata)
-        db.add(entity)
-        db.flush()
+    if fields is not None:
+        columns = [getattr(models.News, f) for f in NEWS_COLUMN_FIELDS if f in fields]
+        options = [load_only(*columns)]
+        if "category" in fields:
+            options.append(joinedload(models.News.category))
+        if "tags" in fields:
+            options.append(selectinload(models.News.tags))
+        if "metrics" in fields:
+            options.append(selectinload(models.News.metrics))
+        stmt = stmt.options(*options)
+    if fields is None or "image_url" in fields:
+        stmt = stmt.add_columns(exists().where(models.NewsImage.news_id == models.News.id).label("has_image"))
+    return stmt
+
+
+def _fetch_news(db: Session, source: Optional[str], params: Dict[str, Any], fields: Optional[Iterable[str]]):
+    fields = frozenset(fields) if fields is not None else None
+    result = db.execute(_news_list_statement(source, fields), params)
+    if fields is not None and "image_url" not in fields:
+        return result.scalars().all()
     
-    news_entity = models.NewsEntity(news_id=news_id, entity_id=entity.id, role=role)
-    db.add(news_entity)
-    db.commit()
+    items = []
+    for news, image in result:
+        news.image_url = f"/news/{news.id}/image" if image else None
+        items.append(news)
+    return items
 
 
-def get_news_by_category(db: Session, category_slug: str, skip: int = 0, limit: int = 10):
+def get_news_by_category(db: Session, category_slug: str, skip: int = 0, limit: int = 10,
+                         fields: Optional[Iterable[str]] = None):
     """獲取特定分類的新聞"""
-    return db.query(models.News) \
-        .join(models.Category, models.News.category_id == models.Category.id) \
-        .filter(models.Category.slug == category_slug) \
-        .order_by(models.News.published_at.desc()) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
+    return _fetch_news(db, "category", {"slug": category_slug, "skip": skip, "limit": limit}, fields)
 
 
-def get_news_by_tag(db: Session, tag_slug: str, skip: int = 0, limit: int = 10):
+def get_news_by_tag(db: Session, tag_slug: str, skip: int = 0, limit: int = 10,
+                    fields: Optional[Iterable[str]] = None):
     """獲取特定標籤的新聞"""
-    return db.query(models.News) \
-        .join(models.NewsTag, models.News.id == models.NewsTag.news_id) \
-        .join(models.Tag, models.NewsTag.tag_id == models.Tag.id) \
-        .filter(models.Tag.slug == tag_slug) \
-        .order_by(models.News.published_at.desc()) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
+    return _fetch_news(db, "tag", {"slug": tag_slug, "skip": skip, "limit": limit}, fields)
 
 
 def get_news_by_entity(db: Session, entity_name: str, entity_type: Optional[str] = None, skip: int = 0, limit: int = 10):
@@ -127,24 +381,33 @@ def get_news_by_entity(db: Session, entity_name: str, entity_type: Optional[str]
 
 def get_featured_news(db: Session, limit: int = 5):
     """獲取精選新聞"""
-    return db.query(models.News) \
-        .filter(models.News.is_featured == True) \
-        .order_by(models.News.published_at.desc()) \
-        .limit(limit) \
-        .all()
+    return db.scalars(_FEATURED_NEWS, {"limit": limit}).all()
 
 
-def get_recent_news(db: Session, limit: int = 10):
+def get_recent_news(db: Session, limit: int = 10, skip: int = 0,
+                    fields: Optional[Iterable[str]] = None):
     """獲取最新新聞"""
-    return db.query(models.News) \
-        .order_by(models.News.published_at.desc()) \
-        .limit(limit) \
-        .all()
+    return _fetch_news(db, None, {"skip": skip, "limit": limit}, fields)
 
 
 def get_news_by_slug(db: Session, slug: str):
-    """通過 slug 獲取特定新聞"""
-    return db.query(models.News).filter(models.News.slug == slug).first()
+    """通過 slug 獲取特定新聞（slug -> id 有 LRU 快取，命中時以主鍵查詢）"""
+    news_id = slug_cache.get(slug)
+    if news_id is not None:
+        news = db.get(models.News, news_id)
+        if news is not None and news.slug == slug:
+            return news
+        slug_cache.invalidate(slug)
+    
+    news = db.scalars(_NEWS_BY_SLUG, {"slug": slug}).first()
+    if news:
+        slug_cache.put(slug, news.id)
+    return news
+
+
+def get_related_news(db: Session, slug: str, limit: int = 10):
+    """獲取預先計算好的相關新聞"""
+    return db.scalars(_RELATED_NEWS, {"slug": slug, "limit": limit}).all()
 
 
 def search_news(db: Session, query: str, skip: int = 0, limit: int = 10):
@@ -0,0 +1,265 @@
+"""近似重複新聞偵測：以 64 位元 SimHash 指紋搭配 LSH 分段索引
+
+指紋保存在 news_fingerprints 表，每個行程在記憶體中維護一份分段索引。
+漢明距離不超過 MAX_DISTANCE 的兩個指紋至少有一段完全相同，因此查詢只需比對同段的候選。
+"""
+import argparse
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .text import tokenize
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+MAX_DISTANCE = BANDS - 1
+# 內容太短時指紋不穩定，不做重複判斷
+MIN_TOKENS = 20
+# 重新讀取其他 worker 新增指紋的間隔（秒）
+REFRESH_INTERVAL = 5.0
+# 增量載入只看比已載入更大的 news_id，其他 worker 未依 id 順序 commit 的指紋與合併時改寫的指紋
+# 會被略過，每隔這段時間在背景執行緒整份重新載入
+FULL_RELOAD_INTERVAL = 300.0
+
+_BAND_MASK = (1 << BAND_BITS) - 1
+
+
+def simhash(text: str) -> Optional[int]:
+    """計算文字的 64 位元 SimHash，內容過短時回傳 None"""
+    # numpy 只有寫入新聞時才需要，延後到第一次使用時才載入以縮短啟動時間
+    import numpy as np
+
+    tokens = tokenize(text or "")
+    if len(tokens) < MIN_TOKENS:
+        return None
+    counts = Counter(tokens)
+    h = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in counts), dtype=np.uint64, count=len(counts))
+    # splitmix64：把 32 位元的 crc32 擴散成 64 位元
+    h = h + np.uint64(0x9E3779B97F4A7C15)
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    h = h ^ (h >> np.uint64(31))
+    bits = np.unpackbits(h.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    weights = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    votes = weights @ (bits.astype(np.int64) * 2 - 1)
+    return int(np.packbits(votes > 0, bitorder="little").view("<u8")[0])
+
+
+def to_signed(fingerprint: int) -> int:
+    """轉成 BIGINT 可保存的有號整數"""
+    return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+
+def to_unsigned(value: int) -> int:
+    return value & ((1 << 64) - 1)
+
+
+class FingerprintIndex:
+    """記憶體中的 SimHash LSH 索引"""
+
+    def __init__(self):
+        self._bands: List[Dict[int, Set[int]]] = [{} for _ in range(BANDS)]
+        self._fingerprints: Dict[int, int] = {}
+        self.max_news_id = 0
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def add(self, news_id: int, fingerprint: int):
+        self.remove(news_id)
+        self._fingerprints[news_id] = fingerprint
+        for band, key in enumerate(self._keys(fingerprint)):
+            self._bands[band].setdefault(key, set()).add(news_id)
+        self.max_news_id = max(self.max_news_id, news_id)
+
+    def remove(self, news_id: int):
+        fingerprint = self._fingerprints.pop(news_id, None)
+        if fingerprint is None:
+            return
+        for band, key in enumerate(self._keys(fingerprint)):
+            bucket = self._bands[band].get(key)
+            if bucket:
+                bucket.discard(news_id)
+                if not bucket:
+                    del self._bands[band][key]
+
+    def find(self, fingerprint: int, max_distance: int = MAX_DISTANCE) -> Optional[int]:
+        """回傳漢明距離最小且不超過 max_distance 的新聞 id"""
+        best_id, best_distance = None, max_distance + 1
+        for band, key in enumerate(self._keys(fingerprint)):
+            for news_id in self._bands[band].get(key, ()):
+                distance = (self._fingerprints[news_id] ^ fingerprint).bit_count()
+                if distance < best_distance or (
+                        best_id is not None and distance == best_distance and news_id < best_id):
+                    best_id, best_distance = news_id, distance
+        return best_id
+
+    @staticmethod
+    def _keys(fingerprint: int):
+        return [(fingerprint >> (band * BAND_BITS)) & _BAND_MASK for band in range(BANDS)]
+
+
+_index = FingerprintIndex()
+_index_lock = threading.Lock()
+_refreshed_at = 0.0
+_reloaded_at = 0.0
+# 背景重新載入期間本行程寫入的指紋，換上新索引前重播；None 表示沒有進行中的重新載入
+_replay: Optional[List[Tuple[int, Optional[int]]]] = None
+_reloader: Optional[threading.Thread] = None
+# reset 後遞增，捨棄 reset 之前開始的重新載入
+_generation = 0
+
+
+def _load(db: Session, index: FingerprintIndex):
+    rows = db.execute(
+        select(models.NewsFingerprint.news_id, models.NewsFingerprint.simhash)
+        .where(models.NewsFingerprint.news_id > index.max_news_id)
+        .execution_options(yield_per=10_000)
+    )
+    for news_id, value in rows:
+        index.add(news_id, to_unsigned(value))
+
+
+def get_index(db: Session) -> FingerprintIndex:
+    """取得本行程的索引，定期增量載入其他 worker 新寫入的指紋
+
+    第一次使用時在呼叫端整份載入；之後每隔 FULL_RELOAD_INTERVAL 改在背景執行緒整份重建，
+    寫入新聞的請求不必等待
+    """
+    global _index, _refreshed_at, _reloaded_at
+    now = time.monotonic()
+    if now - _refreshed_at < REFRESH_INTERVAL:
+        return _index
+    with _index_lock:
+        if not _reloaded_at:
+            index = FingerprintIndex()
+            _load(db, index)
+            _index = index
+            _reloaded_at = now
+        else:
+            if now - _reloaded_at >= FULL_RELOAD_INTERVAL and _replay is None:
+                _start_reload(db)
+                _reloaded_at = now
+            _load(db, _index)
+        _refreshed_at = time.monotonic()
+    return _index
+
+
+def _start_reload(db: Session):
+    """開始背景重新載入（呼叫端須持有 _index_lock）"""
+    global _replay, _reloader
+    _replay = []
+    _reloader = threading.Thread(target=_reload, args=(db.get_bind(), _generation),
+                                 name="fingerprint-reload", daemon=True)
+    _reloader.start()
+
+
+def _reload(bind, generation: int):
+    """以獨立的 session 整份載入指紋，重播載入期間本行程的寫入後換上新索引"""
+    global _index, _replay
+    index: Optional[FingerprintIndex] = FingerprintIndex()
+    try:
+        with Session(bind=bind) as db:
+            _load(db, index)
+    except Exception as e:
+        print(f"重新載入指紋索引時出錯: {e}")
+        index = None
+    with _index_lock:
+        if generation != _generation:
+            return
+        if index is not None:
+            for news_id, fingerprint in _replay:
+                _apply(index, news_id, fingerprint)
+            _index = index
+        _replay = None
+
+
+def reset():
+    """捨棄記憶體中的索引與進行中的重新載入，下次使用時整份重新載入"""
+    global _index, _refreshed_at, _reloaded_at, _replay, _generation
+    with _index_lock:
+        _index = FingerprintIndex()
+        _refreshed_at = _reloaded_at = 0.0
+        _replay = None
+        _generation += 1
+
+
+def find_duplicate(db: Session, fingerprint: Optional[int]) -> Optional[int]:
+    """查詢近似重複的既有新聞 id"""
+    if fingerprint is None:
+        return None
+    return get_index(db).find(fingerprint)
+
+
+def save_fingerprint(db: Session, news_id: int, fingerprint: Optional[int]):
+    """在目前交易中寫入指紋（不 commit），commit 後再呼叫 index_fingerprint"""
+    db.execute(delete(models.NewsFingerprint).where(models.NewsFingerprint.news_id == news_id))
+    if fingerprint is not None:
+        db.execute(insert(models.NewsFingerprint).values(news_id=news_id, simhash=to_signed(fingerprint)))
+
+
+def _apply(index: FingerprintIndex, news_id: int, fingerprint: Optional[int]):
+    if fingerprint is None:
+        index.remove(news_id)
+    else:
+        index.add(news_id, fingerprint)
+
+
+def index_fingerprint(news_id: int, fingerprint: Optional[int]):
+    with _index_lock:
+        _apply(_index, news_id, fingerprint)
+        if _replay is not None:
+            _replay.append((news_id, fingerprint))
+
+
+def rebuild(db: Session, batch_size: int = 1000) -> int:
+    """從 news 表重新計算所有指紋並重建索引"""
+    global _index, _replay, _generation
+    index = FingerprintIndex()
+    db.execute(delete(models.NewsFingerprint))
+    after_id = 0
+    while True:
+        batch = db.execute(
+            select(models.News.id, models.News.content)
+            .where(models.News.id > after_id)
+            .order_by(models.News.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        rows = []
+        for news_id, content in batch:
+            fingerprint = simhash(content)
+            if fingerprint is not None:
+                rows.append({"news_id": news_id, "simhash": to_signed(fingerprint)})
+                index.add(news_id, fingerprint)
+        if rows:
+            db.execute(insert(models.NewsFingerprint), rows)
+        after_id = batch[-1].id
+    db.commit()
+    with _index_lock:
+        _index = index
+        # 進行中的背景重新載入讀到的是重建前的指紋，不再換上
+        _replay = None
+        _generation += 1
+    return len(index)
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="從 news 表重建近似重複指紋索引")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        print(f"已為 {rebuild(db, args.batch_size)} 篇新聞建立指紋")
+    finally:
+        db.close()
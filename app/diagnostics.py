@@ -0,0 +1,202 @@
+"""查詢診斷：以 SQLAlchemy 引擎事件統計每種語句的次數與耗時，記錄慢查詢與抽樣的執行計畫
+
+語句先正規化（常數換成 ?、IN 清單收合）再取指紋，同一個 crud 查詢不論參數都算同一種。
+慢查詢的執行計畫在背景執行緒以另一條連線重跑 EXPLAIN 取得，不會拖慢原本的請求；
+只對 SELECT 執行，EXPLAIN ANALYZE 會真的執行語句，寫入語句不能重跑。
+"""
+import hashlib
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .cache import LRUCache
+
+ENABLED = os.getenv("QUERY_DIAGNOSTICS", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# 慢查詢中有多少比例會重跑 EXPLAIN；同一個指紋在 EXPLAIN_INTERVAL 秒內最多一次
+EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.2"))
+EXPLAIN_INTERVAL = 60.0
+MAX_FINGERPRINTS = 2000
+SLOW_LOG_SIZE = 200
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"%\(\w+\)s|:\w+|\$\d+|%s"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE), "IN (...)"),
+    (re.compile(r"\bVALUES\s*\([^()]*\)(?:\s*,\s*\([^()]*\))*", re.IGNORECASE), "VALUES (...)"),
+    (re.compile(r"\s+"), " "),
+]
+# 語句字串會被 SQLAlchemy 的編譯快取重用，正規化的結果也快取起來
+_normalized = LRUCache(maxsize=MAX_FINGERPRINTS)
+
+
+def normalize(statement: str) -> str:
+    """把語句中的常數與參數換成 ?，讓同一種查詢得到同一個指紋"""
+    result = _normalized.get(statement)
+    if result is None:
+        result = statement
+        for pattern, replacement in _LITERALS:
+            result = pattern.sub(replacement, result)
+        result = result.strip()
+        _normalized.put(statement, result)
+    return result
+
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.blake2b(normalized.encode(), digest_size=8).hexdigest()
+
+
+def _caller() -> Optional[str]:
+    """找出發出查詢的 app 函式（略過本模組與 SQLAlchemy）"""
+    frame = sys._getframe(2)
+    package = __name__.rpartition(".")[0]
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(package + ".") and module != __name__:
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+class QueryStat:
+    __slots__ = ("fingerprint", "statement", "source", "count", "total", "max", "slow", "explained_at")
+
+    def __init__(self, fingerprint: str, statement: str, source: Optional[str]):
+        self.fingerprint = fingerprint
+        self.statement = statement
+        self.source = source
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self.explained_at = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "source": self.source,
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "slow": self.slow,
+        }
+
+
+class QueryDiagnostics:
+    def __init__(self, slow_query_ms: float = SLOW_QUERY_MS, explain_sample_rate: float = EXPLAIN_SAMPLE_RATE):
+        self.slow_query_ms = slow_query_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.stats = LRUCache(maxsize=MAX_FINGERPRINTS)
+        self.slow_log: Deque[Dict[str, Any]] = deque(maxlen=SLOW_LOG_SIZE)
+        self._lock = threading.Lock()
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-explain")
+        self.since = datetime.now()
+
+    def install(self, engine: Engine):
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._error)
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.slow_log.clear()
+            self.since = datetime.now()
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def _error(self, context):
+        if context.connection is not None and context.connection.info.get("query_started"):
+            context.connection.info["query_started"].pop()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        if statement.startswith("EXPLAIN"):
+            return
+        normalized = normalize(statement)
+        key = fingerprint(normalized)
+        with self._lock:
+            stat = self.stats.get(key)
+            if stat is None:
+                stat = QueryStat(key, normalized, _caller())
+                self.stats.put(key, stat)
+            stat.count += 1
+            stat.total += elapsed
+            stat.max = max(stat.max, elapsed)
+            if elapsed * 1000 < self.slow_query_ms:
+                return
+            stat.slow += 1
+            entry = {
+                "fingerprint": key,
+                "source": stat.source,
+                "statement": statement,
+                "parameters": repr(parameters)[:500],
+                "duration_ms": round(elapsed * 1000, 3),
+                "at": datetime.now().isoformat(),
+                "plan": None,
+            }
+            self.slow_log.append(entry)
+            explain = (
+                not executemany
+                # 只 EXPLAIN ANALYZE 單純的 SELECT；WITH 可能是會寫入的 CTE（例如 partitions 的 WITH moved AS (DELETE …)）
+                and statement.lstrip()[:6].upper() == "SELECT"
+                and time.monotonic() - stat.explained_at >= EXPLAIN_INTERVAL
+                and random.random() < self.explain_sample_rate
+            )
+            if explain:
+                stat.explained_at = time.monotonic()
+        logger.warning("慢查詢 %.1f ms [%s] %s", elapsed * 1000, stat.source, normalized)
+        if explain:
+            self._explainer.submit(self._explain, conn.engine, statement, parameters, entry)
+
+    @staticmethod
+    def _explain(engine: Engine, statement: str, parameters, entry: Dict[str, Any]):
+        if engine.dialect.name == "postgresql":
+            prefix = "EXPLAIN (ANALYZE, BUFFERS)"
+        else:
+            prefix = "EXPLAIN QUERY PLAN"
+        try:
+            with engine.connect() as conn:
+                rows = conn.exec_driver_sql(f"{prefix} {statement}", parameters).all()
+                conn.rollback()
+        except Exception as e:
+            entry["plan"] = f"無法取得執行計畫: {e}"
+            return
+        entry["plan"] = "\n".join(str(row[-1]) for row in rows)
+        entry["seq_scan"] = "Seq Scan" in entry["plan"] or "SCAN " in entry["plan"]
+        logger.warning("慢查詢 %s 的執行計畫:\n%s", entry["fingerprint"], entry["plan"])
+
+    def top(self, limit: int = 20, order_by: str = "total") -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = [stat.as_dict() for stat in self.stats.values()]
+        key = {"total": "total_ms", "mean": "mean_ms", "max": "max_ms", "count": "count"}[order_by]
+        return sorted(rows, key=lambda row: row[key], reverse=True)[:limit]
+
+    def slow_queries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.slow_log)[-limit:][::-1]
+
+
+diagnostics = QueryDiagnostics()
+
+
+def install(engine: Engine):
+    if ENABLED:
+        diagnostics.install(engine)
@@ -0,0 +1,124 @@
+"""新聞批次匯出：以伺服器端游標串流 NDJSON / CSV，並以 keyset 檢查點續傳
+
+依 (published_at, id) 由舊到新輸出，每一列都帶著 cursor；中斷後以最後收到那列的 cursor
+作為 after 參數重新請求即可從下一列繼續，期間新發布的新聞會排在後面，不影響續傳位置。
+查詢以 stream_results 逐批取回，記憶體用量與匯出的列數無關。
+"""
+import base64
+import binascii
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.engine import Engine, Row
+from sqlalchemy.sql import Select
+
+from . import models
+from .compression import streaming_compressor
+
+BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+Cursor = Tuple[datetime, int]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(published_at: datetime, news_id: int) -> str:
+    raw = f"{published_at.isoformat()}|{news_id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(token: str) -> Cursor:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        published_at, _, news_id = raw.rpartition("|")
+        return datetime.fromisoformat(published_at), int(news_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor("無效的匯出 cursor") from e
+
+
+def build_query(dialect: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                category: Optional[str] = None, tag: Optional[str] = None,
+                after: Optional[Cursor] = None, include_content: bool = True) -> Select:
+    """依條件建立匯出查詢；published_at 的範圍條件讓 PostgreSQL 只掃描相關的月分區"""
+    aggregate = func.string_agg if dialect == "postgresql" else func.group_concat
+    tags = (
+        select(aggregate(models.Tag.slug, ","))
+        .join(models.NewsTag, models.NewsTag.tag_id == models.Tag.id)
+        .where(models.NewsTag.news_id == models.News.id)
+        .scalar_subquery()
+    )
+    columns = [models.News.id, models.News.title, models.News.slug, models.News.summary]
+    if include_content:
+        columns.append(models.News.content)
+    columns += [models.News.published_at, models.Category.slug.label("category"), tags.label("tags"),
+                models.News.is_featured, models.News.thumbnail_url]
+    query = select(*columns).outerjoin(models.Category, models.Category.id == models.News.category_id)
+    if start is not None:
+        query = query.where(models.News.published_at >= start)
+    if end is not None:
+        query = query.where(models.News.published_at < end)
+    if category is not None:
+        query = query.where(models.Category.slug == category)
+    if tag is not None:
+        query = query.where(models.News.id.in_(
+            select(models.NewsTag.news_id)
+            .join(models.Tag, models.Tag.id == models.NewsTag.tag_id)
+            .where(models.Tag.slug == tag)
+        ))
+    if after is not None:
+        query = query.where(tuple_(models.News.published_at, models.News.id) > tuple_(*after))
+    return query.order_by(models.News.published_at, models.News.id)
+
+
+def _record(row: Row) -> dict:
+    record = row._asdict()
+    record["tags"] = record["tags"].split(",") if record["tags"] else []
+    record["cursor"] = encode_cursor(row.published_at, row.id)
+    record["published_at"] = row.published_at.isoformat()
+    return record
+
+
+def _ndjson(rows: List[Row], fields: List[str]) -> str:
+    return "".join(json.dumps(_record(row), ensure_ascii=False) + "\n" for row in rows)
+
+
+def _csv(rows: List[Row], fields: List[str]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        record = _record(row)
+        record["tags"] = "|".join(record["tags"])
+        writer.writerow([record[field] for field in fields])
+    return buffer.getvalue()
+
+
+WRITERS = {"ndjson": _ndjson, "csv": _csv}
+
+
+def stream(engine: Engine, query: Select, fmt: str, encoding: Optional[str] = None) -> Iterator[bytes]:
+    """逐批取回並編碼；同步產生器由 StreamingResponse 在執行緒池中迭代"""
+    compress: Optional[Callable[[bytes, bool], bytes]] = streaming_compressor(encoding) if encoding else None
+    write = WRITERS[fmt]
+    fields = [column.name for column in query.selected_columns] + ["cursor"]
+
+    def emit(chunk: str) -> bytes:
+        data = chunk.encode()
+        return compress(data, False) if compress else data
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(fields)
+        yield emit(buffer.getvalue())
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=BATCH_SIZE).execute(query)
+        for rows in result.partitions():
+            yield emit(write(rows, fields))
+    if compress:
+        yield compress(b"", True)
@@ -0,0 +1,190 @@
+"""新聞實體抽取：以 Aho-Corasick 自動機一次線性掃描文章，找出球隊與球員"""
+import argparse
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .gazetteer import GAZETTEER
+
+# 出現在標題或提及次數達門檻時視為主要實體
+MAIN_ROLE = "main"
+MENTIONED_ROLE = "mentioned"
+MAIN_MENTION_THRESHOLD = 3
+
+
+class EntityRef(NamedTuple):
+    name: str
+    entity_type: str
+
+
+class Match(NamedTuple):
+    start: int
+    end: int
+    entity: EntityRef
+
+
+class AhoCorasick:
+    """多模式字串比對自動機"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[Tuple[int, EntityRef], ...]] = [()]
+
+    def add(self, word: str, value: EntityRef):
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] += ((len(word), value),)
+
+    def build(self):
+        """以 BFS 建立失敗連結，並把後綴狀態的輸出合併進來"""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = fail
+                self._out[nxt] += self._out[fail]
+                queue.append(nxt)
+        return self
+
+    def iter(self, text: str) -> Iterable[Tuple[int, int, EntityRef]]:
+        """產生 (start, end, value)，包含所有重疊的比對結果"""
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        state = 0
+        for i, ch in enumerate(text):
+            if state:
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(ch, 0)
+            else:
+                state = root.get(ch, 0)
+                if not state:
+                    continue
+            for length, value in out[state]:
+                yield i - length + 1, i + 1, value
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and (ch.isalnum() or ch in "'-")
+
+
+class EntityExtractor:
+    """依詞典從文章中抽取實體，並判斷其在新聞中的角色"""
+
+    def __init__(self, gazetteer: Dict[str, Dict[str, List[str]]] = GAZETTEER):
+        self._automaton = AhoCorasick()
+        for entity_type, entries in gazetteer.items():
+            for name, aliases in entries.items():
+                ref = EntityRef(name, entity_type)
+                for alias in {name, *aliases}:
+                    self._automaton.add(alias.lower(), ref)
+        self._automaton.build()
+
+    def find(self, text: str) -> List[Match]:
+        """回傳最左最長、互不重疊的比對結果"""
+        if not text:
+            return []
+        text = text.lower()
+        matches = []
+        for start, end, entity in self._automaton.iter(text):
+            # 英文別名需落在單字邊界上，避免 "Heat" 比對到 "heated"
+            if text[start].isascii():
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if end < len(text) and _is_word_char(text[end]):
+                    continue
+            matches.append(Match(start, end, entity))
+
+        matches.sort(key=lambda m: (m.start, m.start - m.end))
+        selected = []
+        last_end = 0
+        for match in matches:
+            if match.start >= last_end:
+                selected.append(match)
+                last_end = match.end
+        return selected
+
+    def extract(self, title: str, content: str) -> Dict[EntityRef, str]:
+        """回傳 {實體: 角色}"""
+        in_title = {m.entity for m in self.find(title)}
+        counts = Counter(m.entity for m in self.find(content))
+        roles = {}
+        for entity in in_title | counts.keys():
+            if entity in in_title or counts[entity] >= MAIN_MENTION_THRESHOLD:
+                roles[entity] = MAIN_ROLE
+            else:
+                roles[entity] = MENTIONED_ROLE
+        return roles
+
+
+_default_extractor: Optional[EntityExtractor] = None
+
+
+def get_extractor() -> EntityExtractor:
+    """取得共用的抽取器（自動機只建立一次）"""
+    global _default_extractor
+    if _default_extractor is None:
+        _default_extractor = EntityExtractor()
+    return _default_extractor
+
+
+def extract_entities_for_news(db: Session, news_items: Iterable[models.News],
+                              extractor: Optional[EntityExtractor] = None):
+    """抽取多篇新聞的實體，並以批次方式寫入關聯
+
+    Returns:
+        新建立的關聯數量
+    """
+    extractor = extractor or get_extractor()
+    links = [
+        (news.id, entity.name, entity.entity_type, role, None)
+        for news in news_items
+        for entity, role in extractor.extract(news.title, news.content).items()
+    ]
+    return len(crud.add_entities_to_news_batch(db, links))
+
+
+def run(db: Session, batch_size: int = 500, after_id: int = 0) -> int:
+    """依 id 順序掃描 news 表，為所有文章抽取實體"""
+    extractor = get_extractor()
+    total = 0
+    while True:
+        batch = db.query(models.News.id, models.News.title, models.News.content) \
+            .filter(models.News.id > after_id) \
+            .order_by(models.News.id) \
+            .limit(batch_size) \
+            .all()
+        if not batch:
+            return total
+        total += extract_entities_for_news(db, batch, extractor)
+        after_id = batch[-1].id
+        print(f"已處理至新聞 id {after_id}，累計新增 {total} 個關聯")
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="為既有新聞抽取球隊與球員實體")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--after-id", type=int, default=0, help="只處理 id 大於此值的新聞")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        run(db, batch_size=args.batch_size, after_id=args.after_id)
+    finally:
+        db.close()
@@ -0,0 +1,431 @@
+"""分面導覽：分類、標籤與實體各自有多少篇新聞
+
+不帶篩選條件時直接讀 facet_counts 表；這張表在 crud 寫入新聞與實體關聯的同一個交易中遞增，
+每個 worker 看到的數字都一致。帶篩選條件（搜尋、日期範圍或已選的分面）時改用記憶體中的
+roaring bitmap：每個分面值與每一天各有一個新聞 id 集合，篩選條件求交集後再逐一計數，
+多層下鑽也只需要幾毫秒。bitmap 依 news、news_tags、news_entities 的自增 id 增量載入其他 worker
+新寫入的資料，並定期在背景執行緒整份重建以反映刪除。
+"""
+import argparse
+import heapq
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, or_, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+
+try:
+    from pyroaring import BitMap
+except ImportError:  # pragma: no cover - 未安裝時以 set 代替，結果相同但較耗記憶體
+    BitMap = set
+
+REFRESH_INTERVAL = 5.0
+FULL_RELOAD_INTERVAL = 3600.0
+# 增量載入時從已載入的最大 id 往回重新讀取的筆數：其他 worker 先取得 id、較晚 commit 的列
+# 只要落後不超過這個範圍就會被載入；重複加入同一列不影響結果
+RESCAN_WINDOW = 1000
+# 搜尋範圍內最多取多少篇新聞計算分面
+SEARCH_SCOPE_LIMIT = 50_000
+FACET_TYPES = ("category", "tag", "entity")
+# facet_counts 中記錄新聞總數的列
+TOTAL_KEY = ("all", 0)
+
+FacetKey = Tuple[str, int]
+
+
+def increment(db: Session, keys: Iterable[FacetKey]):
+    """在目前交易中遞增分面計數（不 commit）"""
+    counts = Counter(keys)
+    if not counts:
+        return
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    # 依固定順序更新，並行的交易不會互相死結
+    stmt = dialect.insert(models.FacetCount).values([
+        {"facet_type": facet_type, "facet_id": facet_id, "news_count": count}
+        for (facet_type, facet_id), count in sorted(counts.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["facet_type", "facet_id"],
+        set_={"news_count": models.FacetCount.news_count + stmt.excluded.news_count},
+    ))
+
+
+def rebuild_counts(db: Session):
+    """從關聯表重新計算 facet_counts（批次匯入或刪除新聞之後使用）"""
+    db.execute(delete(models.FacetCount))
+    db.execute(text("""
+        INSERT INTO facet_counts (facet_type, facet_id, news_count)
+        SELECT 'all', 0, count(*) FROM news
+        UNION ALL
+        SELECT 'category', category_id, count(*) FROM news WHERE category_id IS NOT NULL GROUP BY category_id
+        UNION ALL
+        SELECT 'tag', tag_id, count(DISTINCT news_id) FROM news_tags GROUP BY tag_id
+        UNION ALL
+        SELECT 'entity', entity_id, count(DISTINCT news_id) FROM news_entities GROUP BY entity_id
+    """))
+    db.commit()
+
+
+def _intersection_count(a, b) -> int:
+    if BitMap is set:
+        return len(a & b)
+    return a.intersection_cardinality(b)
+
+
+class FacetIndex:
+    """記憶體中每個分面值與每一天的新聞 id bitmap"""
+
+    def __init__(self):
+        self.bitmaps: Dict[FacetKey, BitMap] = {}
+        self.days: Dict[date, BitMap] = {}
+        self.all = BitMap()
+        self.max_ids = {"news": 0, "news_tags": 0, "news_entities": 0}
+        self._ranked: Dict[str, List[Tuple[FacetKey, BitMap]]] = {}
+
+    def update(self, other: "FacetIndex"):
+        """併入另一份索引（增量載入的結果）"""
+        for key, bitmap in other.bitmaps.items():
+            existing = self.bitmaps.get(key)
+            if existing is None:
+                self.bitmaps[key] = bitmap
+            else:
+                existing |= bitmap
+            self._ranked.pop(key[0], None)
+        for day, bitmap in other.days.items():
+            existing = self.days.get(day)
+            if existing is None:
+                self.days[day] = bitmap
+            else:
+                existing |= bitmap
+        self.all |= other.all
+        for table, max_id in other.max_ids.items():
+            self.max_ids[table] = max(self.max_ids[table], max_id)
+
+    def add(self, key: FacetKey, news_id: int):
+        bitmap = self.bitmaps.get(key)
+        if bitmap is None:
+            bitmap = self.bitmaps[key] = BitMap()
+        bitmap.add(news_id)
+        self._ranked.pop(key[0], None)
+
+    def add_news(self, news_id: int, category_id: Optional[int], published_at: datetime,
+                 previous_published_at: Optional[datetime] = None):
+        if previous_published_at is not None and previous_published_at.date() != published_at.date():
+            self.days.get(previous_published_at.date(), BitMap()).discard(news_id)
+        self.all.add(news_id)
+        day = self.days.get(published_at.date())
+        if day is None:
+            day = self.days[published_at.date()] = BitMap()
+        day.add(news_id)
+        if category_id is not None:
+            self.add(("category", category_id), news_id)
+
+    def between(self, start: Optional[datetime], end: Optional[datetime]) -> BitMap:
+        """published_at 所在日期落在 start 與 end 兩天之間（含）的新聞；邊界日由呼叫端再修正"""
+        first = start.date() if start else date.min
+        last = end.date() if end else date.max
+        days = [bitmap for day, bitmap in self.days.items() if first <= day <= last]
+        if BitMap is set:
+            return set().union(*days)
+        return BitMap.union(*days) if days else BitMap()
+
+    def ranked(self, facet_type: str) -> List[Tuple[FacetKey, BitMap]]:
+        """依 bitmap 大小由大到小排序，計數時可以提早停止"""
+        ranked = self._ranked.get(facet_type)
+        if ranked is None:
+            ranked = sorted(((key, bitmap) for key, bitmap in self.bitmaps.items() if key[0] == facet_type),
+                            key=lambda item: len(item[1]), reverse=True)
+            self._ranked[facet_type] = ranked
+        return ranked
+
+    def top(self, facet_type: str, scope: BitMap, limit: int) -> List[Tuple[int, int]]:
+        """範圍內新聞數最多的分面值 [(id, count)]"""
+        heap: List[Tuple[int, int]] = []
+        for (_, facet_id), bitmap in self.ranked(facet_type):
+            # 交集不可能超過 bitmap 本身的大小，之後的分面值都不會進入前 limit 名
+            if len(heap) == limit and len(bitmap) <= heap[0][0]:
+                break
+            count = _intersection_count(scope, bitmap)
+            if count == 0:
+                continue
+            if len(heap) < limit:
+                heapq.heappush(heap, (count, -facet_id))
+            elif count > heap[0][0]:
+                heapq.heapreplace(heap, (count, -facet_id))
+        return [(-negative_id, count) for count, negative_id in sorted(heap, reverse=True)]
+
+
+def _load(db: Session, index: FacetIndex):
+    """載入 id 大於 index.max_ids 的新聞與關聯"""
+    rows = db.execute(
+        select(models.News.id, models.News.category_id, models.News.published_at)
+        .where(models.News.id > index.max_ids["news"])
+        .execution_options(yield_per=10_000)
+    )
+    for news_id, category_id, published_at in rows:
+        index.add_news(news_id, category_id, published_at)
+        index.max_ids["news"] = max(index.max_ids["news"], news_id)
+
+    links = [
+        ("news_tags", "tag", models.NewsTag.id, models.NewsTag.news_id, models.NewsTag.tag_id),
+        ("news_entities", "entity", models.NewsEntity.id, models.NewsEntity.news_id, models.NewsEntity.entity_id),
+    ]
+    for table, facet_type, id_column, news_column, facet_column in links:
+        rows = db.execute(
+            select(id_column, news_column, facet_column)
+            .where(id_column > index.max_ids[table])
+            .execution_options(yield_per=10_000)
+        )
+        for link_id, news_id, facet_id in rows:
+            index.add((facet_type, facet_id), news_id)
+            index.max_ids[table] = max(index.max_ids[table], link_id)
+
+
+# _index_lock 只在讀寫記憶體中的索引時持有，讀資料庫時不持有；_load_lock 讓同時只有一個請求做增量載入
+_index = FacetIndex()
+_index_lock = threading.Lock()
+_load_lock = threading.Lock()
+_loaded = False
+_refreshed_at = 0.0
+_reloaded_at = 0.0
+# 背景重建期間本行程的寫入，換上新索引前重播；None 表示沒有進行中的重建
+_replay: Optional[List[Tuple[Callable, tuple]]] = None
+_reloader: Optional[threading.Thread] = None
+# reset 後遞增，捨棄 reset 之前開始的重建
+_generation = 0
+
+
+def get_index(db: Session) -> FacetIndex:
+    """取得本行程的 bitmap 索引，定期增量載入
+
+    第一次使用時在呼叫端整份載入；之後的增量載入先讀進另一份索引再併入，並重新讀取
+    水位線下 RESCAN_WINDOW 筆；每隔 FULL_RELOAD_INTERVAL 在背景執行緒整份重建。
+    其他請求正在增量載入時直接使用目前的索引
+    """
+    global _index, _loaded, _refreshed_at, _reloaded_at
+    now = time.monotonic()
+    if now - _refreshed_at < REFRESH_INTERVAL:
+        return _index
+    if not _load_lock.acquire(blocking=not _loaded):
+        return _index
+    try:
+        if not _loaded:
+            index = FacetIndex()
+            _load(db, index)
+            with _index_lock:
+                _index = index
+                _loaded = True
+            _reloaded_at = now
+        else:
+            with _index_lock:
+                if now - _reloaded_at >= FULL_RELOAD_INTERVAL and _replay is None:
+                    _start_reload(db)
+                    _reloaded_at = now
+                delta = FacetIndex()
+                delta.max_ids = {table: max(max_id - RESCAN_WINDOW, 0) for table, max_id in _index.max_ids.items()}
+            _load(db, delta)
+            with _index_lock:
+                _index.update(delta)
+        _refreshed_at = time.monotonic()
+    finally:
+        _load_lock.release()
+    return _index
+
+
+def _start_reload(db: Session):
+    """開始背景重建（呼叫端須持有 _index_lock）"""
+    global _replay, _reloader
+    _replay = []
+    _reloader = threading.Thread(target=_reload, args=(db.get_bind(), _generation),
+                                 name="facet-reload", daemon=True)
+    _reloader.start()
+
+
+def _reload(bind, generation: int):
+    """以獨立的 session 整份載入，重播載入期間本行程的寫入後換上新索引"""
+    global _index, _replay
+    index: Optional[FacetIndex] = FacetIndex()
+    try:
+        with Session(bind=bind) as db:
+            _load(db, index)
+    except Exception as e:
+        print(f"重建分面索引時出錯: {e}")
+        index = None
+    with _index_lock:
+        if generation != _generation:
+            return
+        if index is not None:
+            for apply, args in _replay:
+                apply(index, *args)
+            _index = index
+        _replay = None
+
+
+def reset():
+    """捨棄記憶體中的索引與進行中的重建，下次使用時整份重建"""
+    global _index, _loaded, _refreshed_at, _reloaded_at, _replay, _generation
+    with _index_lock:
+        _index = FacetIndex()
+        _loaded = False
+        _refreshed_at = _reloaded_at = 0.0
+        _replay = None
+        _generation += 1
+
+
+def _add_news(index: FacetIndex, news_id: int, category_id: Optional[int], published_at: datetime,
+              keys: Sequence[FacetKey], previous_published_at: Optional[datetime]):
+    index.add_news(news_id, category_id, published_at, previous_published_at)
+    for key in keys:
+        index.add(key, news_id)
+
+
+def _add_links(index: FacetIndex, pairs: Sequence[Tuple[int, FacetKey]]):
+    for news_id, key in pairs:
+        index.add(key, news_id)
+
+
+def _record(apply: Callable, *args):
+    with _index_lock:
+        apply(_index, *args)
+        if _replay is not None:
+            _replay.append((apply, args))
+
+
+def index_news(news_id: int, category_id: Optional[int], published_at: datetime,
+               keys: Iterable[FacetKey] = (), previous_published_at: Optional[datetime] = None):
+    """commit 後把本行程的寫入反映到索引，不必等下次增量載入"""
+    if not _loaded:
+        return
+    _record(_add_news, news_id, category_id, published_at, list(keys), previous_published_at)
+
+
+def index_links(pairs: Iterable[Tuple[int, FacetKey]]):
+    if not _loaded:
+        return
+    _record(_add_links, list(pairs))
+
+
+def _labels(db: Session, facet_type: str, ids: Sequence[int]) -> Dict[int, dict]:
+    if not ids:
+        return {}
+    if facet_type == "entity":
+        rows = db.execute(select(models.Entity.id, models.Entity.name, models.Entity.entity_type)
+                          .where(models.Entity.id.in_(ids)))
+        return {row.id: {"name": row.name, "entity_type": row.entity_type} for row in rows}
+    model = models.Category if facet_type == "category" else models.Tag
+    rows = db.execute(select(model.id, model.name, model.slug).where(model.id.in_(ids)))
+    return {row.id: {"name": row.name, "slug": row.slug} for row in rows}
+
+
+class _Filters(NamedTuple):
+    """篩選條件中需要查詢資料庫的部分，在取得 _index_lock 之前先查好"""
+    keys: List[FacetKey]
+    start: Optional[datetime]
+    end: Optional[datetime]
+    search: Optional[BitMap]
+    excluded: Optional[BitMap]
+
+
+def _resolve_filters(db: Session, q: Optional[str], start: Optional[datetime], end: Optional[datetime],
+                     category: Optional[str], tags: Sequence[str], entities: Sequence[int]) -> _Filters:
+    keys: List[FacetKey] = []
+    if category is not None:
+        keys.append(("category", db.scalar(select(models.Category.id).where(models.Category.slug == category))))
+    if tags:
+        tag_ids = dict(db.execute(select(models.Tag.slug, models.Tag.id).where(models.Tag.slug.in_(tags))).all())
+        keys += [("tag", tag_ids.get(slug)) for slug in tags]
+    keys += [("entity", entity_id) for entity_id in entities]
+    search = None
+    if q:
+        pattern = f"%{q}%"
+        search = BitMap(db.scalars(
+            select(models.News.id)
+            .where(or_(models.News.title.ilike(pattern), models.News.content.ilike(pattern),
+                       models.News.summary.ilike(pattern)))
+            .limit(SEARCH_SCOPE_LIMIT)
+        ))
+    # 日 bitmap 只精確到日，邊界日中不在範圍內的新聞以 SQL 找出後移除
+    outside = []
+    if start is not None and start.time() != datetime.min.time():
+        day = datetime.combine(start.date(), datetime.min.time())
+        outside.append((models.News.published_at >= day) & (models.News.published_at < start))
+    if end is not None:
+        day = datetime.combine(end.date() + timedelta(days=1), datetime.min.time())
+        outside.append((models.News.published_at >= end) & (models.News.published_at < day))
+    excluded = BitMap(db.scalars(select(models.News.id).where(or_(*outside)))) if outside else None
+    return _Filters(keys, start, end, search, excluded)
+
+
+def _scope(index: FacetIndex, filters: _Filters) -> BitMap:
+    """符合篩選條件的新聞 id（呼叫端須持有 _index_lock）"""
+    bitmaps = [index.bitmaps.get(key, BitMap()) for key in filters.keys]
+    if filters.start is not None or filters.end is not None:
+        bitmaps.append(index.between(filters.start, filters.end))
+    if filters.search is not None:
+        bitmaps.append(filters.search)
+    # 從最小的集合開始求交集
+    bitmaps.sort(key=len)
+    scope = BitMap(bitmaps[0])
+    for bitmap in bitmaps[1:]:
+        if not scope:
+            break
+        scope &= bitmap
+    if filters.excluded and scope:
+        scope -= filters.excluded
+    return scope
+
+
+def get_facets(db: Session, q: Optional[str] = None, start: Optional[datetime] = None,
+               end: Optional[datetime] = None, category: Optional[str] = None, tags: Sequence[str] = (),
+               entities: Sequence[int] = (), limit: int = 20) -> dict:
+    filtered = any([q, start, end, category, tags, entities])
+    top: Dict[str, List[Tuple[int, int]]] = {}
+    if not filtered:
+        for facet_type in FACET_TYPES:
+            top[facet_type] = db.execute(
+                select(models.FacetCount.facet_id, models.FacetCount.news_count)
+                .where(models.FacetCount.facet_type == facet_type, models.FacetCount.news_count > 0)
+                .order_by(models.FacetCount.news_count.desc(), models.FacetCount.facet_id)
+                .limit(limit)
+            ).all()
+        total = db.scalar(select(models.FacetCount.news_count).where(
+            models.FacetCount.facet_type == TOTAL_KEY[0], models.FacetCount.facet_id == TOTAL_KEY[1])) or 0
+    else:
+        index = get_index(db)
+        filters = _resolve_filters(db, q, start, end, category, tags, entities)
+        # index_news / index_links 會在其他執行緒修改同一份索引，讀取期間持有鎖
+        with _index_lock:
+            scope = _scope(index, filters)
+            for facet_type in FACET_TYPES:
+                top[facet_type] = index.top(facet_type, scope, limit) if scope else []
+        total = len(scope)
+
+    result = {"total": total}
+    for facet_type, key in (("category", "categories"), ("tag", "tags"), ("entity", "entities")):
+        labels = _labels(db, facet_type, [facet_id for facet_id, _ in top[facet_type]])
+        result[key] = [
+            {"id": facet_id, "count": count, **labels[facet_id]}
+            for facet_id, count in top[facet_type] if facet_id in labels
+        ]
+    return result
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="從關聯表重新計算 facet_counts")
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        rebuild_counts(db)
+        print(f"已重新計算分面計數（{time.perf_counter() - start:.1f} 秒）")
+    finally:
+        db.close()
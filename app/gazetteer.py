@@ -0,0 +1,89 @@
+"""NBA 球隊與球員詞典（中英文別名），供實體抽取使用
+
+本身是常用詞的簡稱（太陽、國王、保羅、格林等）會在一般文字中誤判，和英文的 Heat、Magic 一樣
+不單獨收錄，改用帶「隊」字或全名的寫法；完整的隊名與球員姓名一律保留。
+"""
+from typing import Dict, List
+
+TEAMS: Dict[str, List[str]] = {
+    "Atlanta Hawks": ["亞特蘭大老鷹", "老鷹", "Hawks"],
+    "Boston Celtics": ["波士頓塞爾提克", "塞爾提克", "綠衫軍", "Celtics"],
+    "Brooklyn Nets": ["布魯克林籃網", "籃網", "Nets"],
+    "Charlotte Hornets": ["夏洛特黃蜂", "黃蜂", "Hornets"],
+    "Chicago Bulls": ["芝加哥公牛", "公牛", "Bulls"],
+    "Cleveland Cavaliers": ["克里夫蘭騎士", "騎士", "Cavaliers", "Cavs"],
+    "Dallas Mavericks": ["達拉斯獨行俠", "獨行俠", "小牛", "Mavericks", "Mavs"],
+    "Denver Nuggets": ["丹佛金塊", "金塊", "Nuggets"],
+    "Detroit Pistons": ["底特律活塞", "活塞", "Pistons"],
+    "Golden State Warriors": ["金州勇士", "勇士", "Warriors"],
+    "Houston Rockets": ["休士頓火箭", "火箭", "Rockets"],
+    "Indiana Pacers": ["印第安納溜馬", "溜馬", "Pacers"],
+    "Los Angeles Clippers": ["洛杉磯快艇", "快艇", "Clippers"],
+    "Los Angeles Lakers": ["洛杉磯湖人", "湖人", "Lakers"],
+    "Memphis Grizzlies": ["曼菲斯灰熊", "灰熊", "Grizzlies"],
+    "Miami Heat": ["邁阿密熱火", "熱火", "Miami Heat"],
+    "Milwaukee Bucks": ["密爾瓦基公鹿", "公鹿", "Bucks"],
+    "Minnesota Timberwolves": ["明尼蘇達灰狼", "灰狼", "Timberwolves"],
+    "New Orleans Pelicans": ["紐奧良鵜鶘", "鵜鶘", "Pelicans"],
+    "New York Knicks": ["紐約尼克", "尼克", "Knicks"],
+    "Oklahoma City Thunder": ["奧克拉荷馬雷霆", "雷霆", "Thunder"],
+    "Orlando Magic": ["奧蘭多魔術", "魔術隊", "Orlando Magic"],
+    "Philadelphia 76ers": ["費城76人", "76人", "76ers", "Sixers"],
+    "Phoenix Suns": ["鳳凰城太陽", "太陽隊", "Suns"],
+    "Portland Trail Blazers": ["波特蘭拓荒者", "拓荒者", "Trail Blazers", "Blazers"],
+    "Sacramento Kings": ["沙加緬度國王", "國王隊", "Sacramento Kings"],
+    "San Antonio Spurs": ["聖安東尼奧馬刺", "馬刺", "Spurs"],
+    "Toronto Raptors": ["多倫多暴龍", "暴龍", "Raptors"],
+    "Utah Jazz": ["猶他爵士", "爵士隊", "Utah Jazz"],
+    "Washington Wizards": ["華盛頓巫師", "巫師", "Wizards"],
+}
+
+PLAYERS: Dict[str, List[str]] = {
+    "LeBron James": ["詹姆斯", "雷霸龍", "LeBron"],
+    "Stephen Curry": ["柯瑞", "Stephen Curry", "Steph Curry"],
+    "Kevin Durant": ["杜蘭特", "Kevin Durant"],
+    "Giannis Antetokounmpo": ["字母哥", "安戴托昆波", "Giannis", "Antetokounmpo"],
+    "Nikola Jokic": ["約基奇", "Jokic", "Jokić"],
+    "Luka Doncic": ["唐西奇", "Doncic", "Dončić"],
+    "Joel Embiid": ["恩比德", "Embiid"],
+    "Jayson Tatum": ["塔圖姆", "Tatum"],
+    "Jaylen Brown": ["杰倫布朗", "Jaylen Brown"],
+    "Shai Gilgeous-Alexander": ["吉爾吉斯亞歷山大", "吉爾吉斯-亞歷山大", "Gilgeous-Alexander", "SGA"],
+    "Anthony Davis": ["一眉", "安東尼戴維斯", "Anthony Davis"],
+    "Anthony Edwards": ["愛德華茲", "Anthony Edwards"],
+    "Devin Booker": ["布克", "Devin Booker"],
+    "Ja Morant": ["莫蘭特", "Ja Morant"],
+    "Kawhi Leonard": ["雷納德", "Kawhi"],
+    "Jimmy Butler": ["巴特勒", "Jimmy Butler"],
+    "Damian Lillard": ["里拉德", "Lillard"],
+    "Kyrie Irving": ["厄文", "Kyrie"],
+    "James Harden": ["哈登", "Harden"],
+    "Victor Wembanyama": ["溫班亞瑪", "Wembanyama", "Wemby"],
+    "Donovan Mitchell": ["米契爾", "Donovan Mitchell"],
+    "Trae Young": ["楊恩", "Trae Young"],
+    "Jalen Brunson": ["布朗森", "Brunson"],
+    "Tyrese Haliburton": ["哈利伯頓", "Haliburton"],
+    "Paul George": ["保羅喬治", "Paul George"],
+    "Zion Williamson": ["錫安", "Zion"],
+    "Karl-Anthony Towns": ["唐斯", "Karl-Anthony Towns"],
+    "Bam Adebayo": ["阿德巴約", "Adebayo"],
+    "De'Aaron Fox": ["福克斯", "De'Aaron Fox"],
+    "Domantas Sabonis": ["沙波尼斯", "Sabonis"],
+    "Jamal Murray": ["穆雷", "Jamal Murray"],
+    "Kristaps Porzingis": ["波辛吉斯", "Porzingis"],
+    "Chris Paul": ["克里斯保羅", "Chris Paul", "CP3"],
+    "Russell Westbrook": ["威斯布魯克", "Westbrook"],
+    "Klay Thompson": ["湯普森", "Klay Thompson"],
+    "Draymond Green": ["追夢格林", "Draymond Green"],
+    "Rudy Gobert": ["戈貝爾", "Gobert"],
+    "Austin Reaves": ["里夫斯", "Austin Reaves"],
+    "Tyrese Maxey": ["馬克西", "Maxey"],
+    "Paolo Banchero": ["班切羅", "Banchero"],
+    "Cade Cunningham": ["康寧漢", "Cade Cunningham"],
+    "Pascal Siakam": ["席亞康", "Siakam"],
+}
+
+GAZETTEER: Dict[str, Dict[str, List[str]]] = {
+    "team": TEAMS,
+    "player": PLAYERS,
+}
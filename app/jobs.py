@@ -0,0 +1,354 @@
+"""背景工作：transactional outbox 與本機的工作執行器
+
+寫入路徑以 enqueue 在同一個交易中新增 outbox_jobs 列，commit 後工作才可見，rollback 時一起消失；
+請求本身不再等待實體抽取之類的後續處理。執行器是每個行程一條背景執行緒，依工作種類領取
+（PostgreSQL 上以 FOR UPDATE SKIP LOCKED，多個 worker 不會領到同一筆）一批工作交給執行緒池，
+並限制每種工作同時執行的批次數。失敗的工作以指數退避重試，超過次數後標記為 failed；
+worker 中止時未完成的工作在租約到期後由其他 worker 重新領取，所以處理函式必須可以重複執行。
+週期性工作以「種類:時段」作為 idempotency key 新增，多個 worker 同時排程也只會執行一次。
+只需要 PostgreSQL 或 SQLite，不需要外部的訊息佇列。
+"""
+import argparse
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import models
+
+ENABLED = os.getenv("JOBS_ENABLED", "1") == "1"
+POLL_INTERVAL = 1.0
+MAX_WORKERS = 4
+RETRY_BASE = 2.0
+RETRY_MAX = 600.0
+# 完成與失敗的工作保留多久（失敗的工作保留較久以便檢查）
+DONE_RETENTION = timedelta(days=1)
+FAILED_RETENTION = timedelta(days=7)
+ERROR_MAX_LENGTH = 2000
+
+Handle = Callable[[Session, List[Dict[str, Any]]], None]
+
+
+class Handler(NamedTuple):
+    fn: Handle
+    batch_size: int
+    concurrency: int
+    max_attempts: int
+    # 領取後多久內未完成視為 worker 已中止
+    lease: float
+
+
+_handlers: Dict[str, Handler] = {}
+# 週期性工作：種類 -> 間隔秒數
+_schedule: Dict[str, float] = {}
+
+
+def handler(kind: str, batch_size: int = 1, concurrency: int = 1, max_attempts: int = 5, lease: float = 300.0):
+    """註冊處理函式，函式以 (db, payloads) 一次處理一批同種類的工作"""
+    def register(fn: Handle) -> Handle:
+        _handlers[kind] = Handler(fn, batch_size, concurrency, max_attempts, lease)
+        return fn
+    return register
+
+
+def periodic(kind: str, interval: float, **options):
+    """註冊每隔 interval 秒執行一次的工作"""
+    def register(fn: Handle) -> Handle:
+        _schedule[kind] = interval
+        return handler(kind, **options)(fn)
+    return register
+
+
+def enqueue(db: Session, kind: str, payload: Optional[Dict[str, Any]] = None, key: Optional[str] = None,
+            delay: float = 0.0):
+    """在目前交易中新增工作（不 commit）；已有相同 key 的工作時略過"""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    db.execute(
+        dialect.insert(models.OutboxJob)
+        .values(kind=kind, payload=payload or {}, idempotency_key=key, status="pending", attempts=0,
+                run_after=datetime.now() + timedelta(seconds=delay), created_at=datetime.now())
+        .on_conflict_do_nothing(index_elements=["idempotency_key"])
+    )
+
+
+def retry_delay(attempts: int) -> float:
+    delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+    return delay * random.uniform(1.0, 1.5)
+
+
+class JobRunner:
+    """領取並執行 outbox 中的工作，同時排程週期性工作"""
+
+    def __init__(self, session_factory: sessionmaker, poll_interval: float = POLL_INTERVAL,
+                 max_workers: int = MAX_WORKERS):
+        self.session_factory = session_factory
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._running: Counter = Counter()
+        self._lock = threading.Lock()
+        self._scheduled: Dict[str, int] = {}
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.completed: Counter = Counter()
+        self.retried: Counter = Counter()
+        self.failed: Counter = Counter()
+
+    def wake(self):
+        """有新工作時提早領取，不必等到下一次輪詢"""
+        self._wakeup.set()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="job-runner", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止領取新工作，並等待執行中的批次完成"""
+        if self._thread is not None:
+            self._stopped.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=True)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                print(f"領取背景工作時出錯: {e}")
+                claimed = 0
+            if not claimed:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def run_once(self) -> int:
+        """排程到期的週期性工作，並為每個還有空位的種類領取一批工作，回傳領取的工作數"""
+        self._schedule_periodic()
+        claimed = 0
+        for kind, spec in _handlers.items():
+            with self._lock:
+                if self._running[kind] >= spec.concurrency:
+                    continue
+                self._running[kind] += 1
+            try:
+                jobs = self._claim(kind, spec)
+            except Exception:
+                # 領取失敗（資料庫錯誤、鎖逾時）時也要歸還名額，否則這個種類會永遠停擺
+                self._release(kind)
+                raise
+            if not jobs:
+                self._release(kind)
+                continue
+            claimed += len(jobs)
+            self._executor.submit(self._execute, kind, spec, jobs)
+        return claimed
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """執行到沒有可領取的工作為止（命令列與測試使用），逾時回傳 False"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            claimed = self.run_once()
+            with self._lock:
+                busy = sum(self._running.values())
+            if not claimed and not busy:
+                return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            if not claimed:
+                time.sleep(0.01)
+
+    def _release(self, kind: str):
+        with self._lock:
+            self._running[kind] -= 1
+
+    def _schedule_periodic(self):
+        due = {}
+        now = time.time()
+        for kind, interval in _schedule.items():
+            slot = int(now // interval)
+            if self._scheduled.get(kind) != slot:
+                due[kind] = slot
+        if not due:
+            return
+        db = self.session_factory()
+        try:
+            for kind, slot in due.items():
+                enqueue(db, kind, {"slot": slot}, key=f"{kind}:{slot}")
+            db.commit()
+        finally:
+            db.close()
+        self._scheduled.update(due)
+
+    def _claim(self, kind: str, spec: Handler) -> List[models.OutboxJob]:
+        now = datetime.now()
+        Job = models.OutboxJob
+        candidates = (
+            select(Job.id)
+            .where(Job.kind == kind)
+            .where(or_(
+                and_(Job.status == "pending", Job.run_after <= now),
+                # 租約過期的工作，原本的 worker 可能已中止
+                and_(Job.status == "running", Job.locked_until < now),
+            ))
+            .order_by(Job.id)
+            .limit(spec.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        db = self.session_factory()
+        try:
+            jobs = db.execute(
+                update(Job)
+                .where(Job.id.in_(candidates.scalar_subquery()))
+                .values(status="running", attempts=Job.attempts + 1, locked_by=self.worker_id,
+                        locked_until=now + timedelta(seconds=spec.lease))
+                .returning(Job.id, Job.payload, Job.attempts)
+            ).all()
+            db.commit()
+            return jobs
+        finally:
+            db.close()
+
+    def _execute(self, kind: str, spec: Handler, jobs):
+        Job = models.OutboxJob
+        ids = [job.id for job in jobs]
+        db = self.session_factory()
+        try:
+            spec.fn(db, [job.payload for job in jobs])
+            db.execute(update(Job).where(Job.id.in_(ids))
+                       .values(status="done", finished_at=datetime.now(), locked_by=None, locked_until=None))
+            db.commit()
+            self.completed[kind] += len(jobs)
+        except Exception:
+            db.rollback()
+            error = traceback.format_exc()[-ERROR_MAX_LENGTH:]
+            print(f"背景工作 {kind} 失敗（{len(jobs)} 筆）: {error.strip().splitlines()[-1]}")
+            now = datetime.now()
+            for job in jobs:
+                if job.attempts >= spec.max_attempts:
+                    values = {"status": "failed", "finished_at": now}
+                    self.failed[kind] += 1
+                else:
+                    values = {"status": "pending", "run_after": now + timedelta(seconds=retry_delay(job.attempts))}
+                    self.retried[kind] += 1
+                db.execute(update(Job).where(Job.id == job.id)
+                           .values(last_error=error, locked_by=None, locked_until=None, **values))
+            db.commit()
+        finally:
+            db.close()
+            self._release(kind)
+            self.wake()
+
+    def snapshot(self, db: Session) -> Dict[str, Any]:
+        Job = models.OutboxJob
+        queue: Dict[str, Dict[str, int]] = {}
+        for kind, status, count in db.execute(
+            select(Job.kind, Job.status, func.count()).group_by(Job.kind, Job.status)
+        ):
+            queue.setdefault(kind, {})[status] = count
+        oldest = db.scalar(select(func.min(Job.run_after)).where(Job.status == "pending"))
+        return {
+            "worker_id": self.worker_id,
+            "running": {kind: count for kind, count in self._running.items() if count},
+            "completed": dict(self.completed),
+            "retried": dict(self.retried),
+            "failed": dict(self.failed),
+            "queue": queue,
+            "oldest_pending": oldest,
+        }
+
+
+_runner: Optional[JobRunner] = None
+
+
+def get_runner() -> JobRunner:
+    global _runner
+    if _runner is None:
+        from .database import SessionLocal
+        _runner = JobRunner(SessionLocal)
+    return _runner
+
+
+def wake():
+    """commit 後呼叫，讓本行程的執行器立即領取剛新增的工作"""
+    if _runner is not None:
+        _runner.wake()
+
+
+# ---- 處理函式 ----
+
+@handler("news.extract_entities", batch_size=100, concurrency=2)
+def extract_entities(db: Session, payloads: List[Dict[str, Any]]):
+    """為新寫入或內容有更新的新聞抽取實體（重複執行時已存在的關聯會被略過）"""
+    from . import extraction
+
+    news_ids = {payload["news_id"] for payload in payloads}
+    news = db.query(models.News.id, models.News.title, models.News.content) \
+        .filter(models.News.id.in_(news_ids)) \
+        .all()
+    extraction.extract_entities_for_news(db, news)
+    # 相關新聞的特徵包含實體，所以在抽取之後才更新；和工作完成標記一起 commit
+    for news_id in sorted(news_ids):
+        enqueue(db, "news.update_related", {"news_id": news_id})
+
+
+@handler("news.update_related", batch_size=500, concurrency=1, lease=900.0)
+def update_related(db: Session, payloads: List[Dict[str, Any]]):
+    """把新寫入或內容有更新的新聞併入相關新聞索引（同一行程內一次只有一批會改寫索引檔）"""
+    from . import related
+
+    news_ids = {payload["news_id"] for payload in payloads}
+    related.update(db, sorted(news_ids), path=related.INDEX_PATH)
+
+
+@periodic("analytics.maintain", interval=3600)
+def maintain_analytics(db: Session, payloads: List[Dict[str, Any]]):
+    """建立未來的瀏覽事件分區並套用保留政策"""
+    from . import analytics
+
+    analytics.maintain(db.get_bind())
+
+
+@periodic("jobs.purge", interval=3600)
+def purge(db: Session, payloads: List[Dict[str, Any]]):
+    """刪除超過保留期限的已完成與失敗工作"""
+    now = datetime.now()
+    Job = models.OutboxJob
+    db.execute(delete(Job).where(or_(
+        and_(Job.status == "done", Job.finished_at < now - DONE_RETENTION),
+        and_(Job.status == "failed", Job.finished_at < now - FAILED_RETENTION),
+    )))
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="在獨立行程中執行背景工作（API 行程可設定 JOBS_ENABLED=0）")
+    parser.add_argument("--drain", action="store_true", help="處理完目前可領取的工作後結束")
+    args = parser.parse_args()
+
+    runner = JobRunner(SessionLocal)
+    if args.drain:
+        runner.drain()
+        runner.stop()
+        print(f"已完成 {sum(runner.completed.values())} 筆，重試 {sum(runner.retried.values())} 筆，"
+              f"失敗 {sum(runner.failed.values())} 筆")
+    else:
+        runner.start()
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            runner.stop()
@@ -1,18 +1,55 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, Response, UploadFile, File
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, UploadFile, File, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
+from typing import Iterable, List, Literal, Optional, Tuple
+from datetime import datetime, timedelta
 from fastapi.middleware.cors import CORSMiddleware
 
-from . import crud, models, schemas
-from .database import get_db
+from . import analytics, crud, diagnostics, export, facets, jobs, models, push, schemas, trending, uploads, warmup
+from .admission import AdmissionMiddleware, stats as admission_stats
+from .compression import CompressionMiddleware, negotiate, response_cache
+from .database import SQLALCHEMY_DATABASE_URL, SessionLocal, engine, get_db
 
-app = FastAPI(title="NBA 新聞網站 API", description="NBA 新聞網站的 API 端點")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    recorder = analytics.get_recorder()
+    recorder.start()
+    push.broadcaster.bind(asyncio.get_running_loop())
+    listener = push.start_listener(SQLALCHEMY_DATABASE_URL)
+    warmup_task = warmup.start(app, engine, SessionLocal)
+    if jobs.ENABLED:
+        jobs.get_runner().start()
+    if trending.ENABLED:
+        trending.get_tracker().start()
+    yield
+    if warmup_task:
+        warmup_task.cancel()
+    if jobs.ENABLED:
+        await run_in_threadpool(jobs.get_runner().stop)
+    if trending.ENABLED:
+        await run_in_threadpool(trending.get_tracker().stop)
+    if listener:
+        listener.stop()
+    recorder.stop()
+
+app = FastAPI(title="NBA 新聞網站 API", description="NBA 新聞網站的 API 端點", lifespan=lifespan)
+
+diagnostics.install(engine)
 
 origins = [
     "http://localhost:4200",
 ]
 
+# 上傳本體超過上限時在讀取途中就回 413
+app.add_middleware(uploads.UploadLimitMiddleware)
+# 必須在 CORS 內層，快取的回應才不會帶著其他來源的 CORS 標頭
+app.add_middleware(CompressionMiddleware)
+# 在 CORS 內層，瀏覽器才讀得到 429/503 回應
+app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -21,27 +58,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """解析 fields 參數：未指定時為卡片欄位，full 為完整新聞"""
+    if not fields:
+        return crud.CARD_FIELDS
+    if fields == "full":
+        return crud.NEWS_FIELDS
+    selected = tuple(dict.fromkeys(["id", *(f.strip() for f in fields.split(",") if f.strip())]))
+    unknown = [f for f in selected if f not in crud.NEWS_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"未知的欄位: {unknown}")
+    return selected
+
+def project_news(items: Iterable[models.News], fields: Tuple[str, ...]) -> List[schemas.NewsFields]:
+    """只序列化選取的欄位，避免觸發未載入欄位的延遲載入"""
+    return [
+        schemas.NewsFields.model_validate({f: getattr(item, f) for f in fields}, from_attributes=True)
+        for item in items
+    ]
+
+FIELDS_DESCRIPTION = "以逗號分隔的欄位；預設為卡片欄位，full 為完整新聞"
+
 @app.get("/")
 async def root():
     return {"message": "NBA 新聞網站 API 運行中"}
 
-@app.get("/news/", response_model=schemas.NewsListResponse)
+@app.get("/health/live")
+async def health_live():
+    """存活檢查：行程能回應即可"""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    """就緒檢查：啟動預熱完成前回 503"""
+    if not warmup.state.ready:
+        response.status_code = 503
+    return warmup.state.as_dict()
+
+@app.get("/news/", response_model=schemas.NewsListResponse, response_model_exclude_unset=True)
 async def read_news(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """獲取新聞列表"""
-    news = crud.get_recent_news(db, limit=limit)
+    selected = parse_fields(fields)
+    news = crud.get_recent_news(db, limit=limit, skip=skip, fields=selected)
     total = db.query(models.News).count()
-    
-      # 設置圖片 URL
-    for item in news:
-        if hasattr(item, 'image') and item.image:
-            item.image_url = f"/news/{item.id}/image"
 
     return {
-        "items": news,
+        "items": project_news(news, selected),
         "total": total,
         "page": skip // limit + 1,
         "size": limit,
@@ -64,6 +131,83 @@ async def read_featured_news(
     """獲取精選新聞"""
     return crud.get_featured_news(db, limit=limit)
 
+@app.get("/news/stream")
+async def stream_news(
+    request: Request,
+    last_event_id: Optional[int] = Header(None)
+):
+    """以 Server-Sent Events 推播新發布的新聞"""
+    subscriber = push.broadcaster.subscribe(last_event_id)
+    
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), push.HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield push.format_sse(event)
+        finally:
+            push.broadcaster.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/export/news")
+async def export_news(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    start: Optional[datetime] = Query(None, description="published_at 下限（含）"),
+    end: Optional[datetime] = Query(None, description="published_at 上限（不含）"),
+    category: Optional[str] = Query(None, description="分類 slug"),
+    tag: Optional[str] = Query(None, description="標籤 slug"),
+    after: Optional[str] = Query(None, description="上次匯出最後一列的 cursor，從下一列繼續"),
+    include_content: bool = Query(True),
+    accept_encoding: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """以串流匯出所有符合條件的新聞（NDJSON 或 CSV），依 published_at 由舊到新"""
+    # 依賴的 session 在開始串流前就會關閉，串流時以它的 bind 另外取得連線
+    bind = db.get_bind()
+    try:
+        cursor = export.decode_cursor(after) if after else None
+    except export.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    query = export.build_query(bind.dialect.name, start=start, end=end, category=category, tag=tag,
+                               after=cursor, include_content=include_content)
+    encoding = negotiate(accept_encoding or "")
+    headers = {"Content-Disposition": f'attachment; filename="news.{format}"', "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    
+    return StreamingResponse(
+        export.stream(bind, query, format, encoding),
+        media_type="application/x-ndjson" if format == "ndjson" else "text/csv; charset=utf-8",
+        headers=headers
+    )
+
+@app.websocket("/ws/news")
+async def websocket_news(websocket: WebSocket, last_event_id: Optional[int] = None):
+    """以 WebSocket 推播新發布的新聞"""
+    await websocket.accept()
+    subscriber = push.broadcaster.subscribe(last_event_id)
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), push.HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "ping"})
+                continue
+            await websocket.send_json(event)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        push.broadcaster.unsubscribe(subscriber)
+
 @app.get("/news/{slug}", response_model=schemas.NewsDetail)
 async def read_news_by_slug(slug: str, db: Session = Depends(get_db)):
     """獲取特定新聞詳情"""
@@ -71,30 +215,47 @@ async def read_news_by_slug(slug: str, db: Session = Depends(get_db)):
     if not news:
         raise HTTPException(status_code=404, detail="新聞不存在")
     
-    # 記錄瀏覽量
-    crud.record_news_view(db, news.id)
+    # 記錄瀏覽量：只放進記憶體緩衝區，view_count 由背景執行緒批次累加
+    analytics.record_view(news.id)
+    if trending.ENABLED:
+        trending.record_view(news)
     
     return news
 
-@app.get("/categories/{category_slug}/news/", response_model=List[schemas.News])
+@app.get("/news/{slug}/related", response_model=List[schemas.News])
+async def read_related_news(
+    slug: str,
+    limit: int = Query(5, ge=1, le=10),
+    db: Session = Depends(get_db)
+):
+    """獲取相關新聞"""
+    return crud.get_related_news(db, slug=slug, limit=limit)
+
+@app.get("/categories/{category_slug}/news/", response_model=List[schemas.NewsFields], response_model_exclude_unset=True)
 async def read_news_by_category(
     category_slug: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """獲取特定分類的新聞"""
-    return crud.get_news_by_category(db, category_slug=category_slug, skip=skip, limit=limit)
+    selected = parse_fields(fields)
+    news = crud.get_news_by_category(db, category_slug=category_slug, skip=skip, limit=limit, fields=selected)
+    return project_news(news, selected)
 
-@app.get("/tags/{tag_slug}/news/", response_model=List[schemas.News])
+@app.get("/tags/{tag_slug}/news/", response_model=List[schemas.NewsFields], response_model_exclude_unset=True)
 async def read_news_by_tag(
     tag_slug: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """獲取特定標籤的新聞"""
-    return crud.get_news_by_tag(db, tag_slug=tag_slug, skip=skip, limit=limit)
+    selected = parse_fields(fields)
+    news = crud.get_news_by_tag(db, tag_slug=tag_slug, skip=skip, limit=limit, fields=selected)
+    return project_news(news, selected)
 
 @app.get("/search/", response_model=schemas.NewsSearchResult)
 async def search_news(
@@ -119,6 +280,30 @@ async def search_news(
         "items": news
     }
 
+@app.get("/facets", response_model=schemas.FacetsResponse, response_model_exclude_none=True)
+async def read_facets(
+    q: Optional[str] = Query(None, min_length=1, description="只計算符合搜尋的新聞"),
+    start: Optional[datetime] = Query(None, description="published_at 下限（含）"),
+    end: Optional[datetime] = Query(None, description="published_at 上限（不含）"),
+    category: Optional[str] = Query(None, description="已選的分類 slug"),
+    tag: List[str] = Query([], description="已選的標籤 slug，可重複"),
+    entity: List[int] = Query([], description="已選的實體 id，可重複"),
+    limit: int = Query(20, ge=1, le=100, description="每種分面最多回傳幾個值"),
+    db: Session = Depends(get_db)
+):
+    """各分類、標籤與實體的新聞數；帶篩選條件時只計算符合條件的新聞"""
+    return facets.get_facets(db, q=q, start=start, end=end, category=category,
+                             tags=tag, entities=entity, limit=limit)
+
+@app.get("/trending/{kind}", response_model=schemas.TrendingResponse, response_model_exclude_none=True)
+async def read_trending(
+    kind: Literal["tags", "entities"],
+    window: Literal["1h", "24h"] = Query("1h", description="統計最近多久的瀏覽"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """最近瀏覽最多的標籤或實體（近似值，count 最多高估 error）"""
+    return {"kind": kind, "window": window, "items": trending.get_tracker().top(kind, window, limit)}
+
 # API 端點: 添加新聞
 @app.post("/news/", response_model=schemas.News)
 async def create_news(
@@ -128,7 +313,7 @@ async def create_news(
     """添加新聞"""
     published_at = news.published_at or datetime.now()
     
-    return crud.add_news(
+    created = crud.add_news(
         db=db,
         title=news.title,
         content=news.content,
@@ -137,6 +322,10 @@ async def create_news(
         category_name=news.category_name,
         tags=news.tags
     )
+    # 球隊與球員實體由背景工作抽取
+    response_cache.clear()
+    
+    return created
 
 @app.post("/news/{news_id}/image", response_model=schemas.News)
 async def upload_news_image(
@@ -150,28 +339,19 @@ async def upload_news_image(
     if not news:
         raise HTTPException(status_code=404, detail="找不到新聞")
     
-    # 讀取圖片數據
-    image_data = await image.read()
-    mime_type = image.content_type or "image/jpeg"
-    
-    # 檢查是否已有圖片
-    existing_image = db.query(models.NewsImage).filter(models.NewsImage.news_id == news_id).first()
-    
-    if existing_image:
-        # 更新現有圖片
-        existing_image.image_data = image_data
-        existing_image.mime_type = mime_type
-    else:
-        # 創建新圖片
-        news_image = models.NewsImage(
-            news_id=news_id,
-            image_data=image_data,
-            mime_type=mime_type,
-            created_at = datetime.now()
-        )
-        db.add(news_image)
-    
-    db.commit()
+    # 分塊讀取暫存檔並驗證，格式以檔頭判斷而不是 content_type
+    try:
+        spooled = await uploads.spool_image(image)
+    except uploads.ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except uploads.InvalidImage as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    
+    changed = await run_in_threadpool(
+        crud.set_news_image, db, news_id, spooled.file, spooled.mime_type, spooled.sha256
+    )
+    if changed:
+        response_cache.clear()
     
     # 返回更新後的新聞
     news = db.query(models.News).filter(models.News.id == news_id).first()
@@ -179,17 +359,45 @@ async def upload_news_image(
     return news
 
 @app.get("/news/{news_id}/image")
-async def get_news_image(news_id: int, db: Session = Depends(get_db)):
+async def get_news_image(
+    news_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
     """獲取新聞圖片"""
     news_image = db.query(models.NewsImage).filter(models.NewsImage.news_id == news_id).first()
     if not news_image:
         raise HTTPException(status_code=404, detail="圖片不存在")
     
+    headers = {}
+    if news_image.sha256:
+        etag = f'"{news_image.sha256}"'
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        headers["ETag"] = etag
     return Response(
         content=news_image.image_data, 
-        media_type=news_image.mime_type
+        media_type=news_image.mime_type,
+        headers=headers
     )
 
+@app.get("/media/{sha256}")
+async def get_media(
+    sha256: str,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """獲取爬蟲下載的媒體檔；內容以雜湊定址，永遠不會改變"""
+    etag = f'"{sha256}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    asset = crud.get_media_asset(db, sha256)
+    if not asset:
+        raise HTTPException(status_code=404, detail="媒體檔不存在")
+    
+    return Response(content=asset.data, media_type=asset.mime_type, headers=headers)
+
 @app.post("/news/{news_id}/entity/", response_model=schemas.News)
 async def add_entity(
     news_id: int,
@@ -214,6 +422,29 @@ async def add_entity(
     
     return news
 
+@app.post("/news/entities/", response_model=schemas.NewsEntityBatchResult)
+async def add_entities_batch(
+    batch: schemas.NewsEntityBatchCreate,
+    db: Session = Depends(get_db)
+):
+    """批次向一或多篇新聞添加實體關聯"""
+    news_ids = {item.news_id for item in batch.items}
+    found = {row.id for row in db.query(models.News.id).filter(models.News.id.in_(news_ids))}
+    missing = sorted(news_ids - found)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"新聞不存在: {missing}")
+    
+    created = crud.add_entities_to_news_batch(
+        db,
+        [(item.news_id, item.name, item.entity_type, item.role, item.metadata) for item in batch.items]
+    )
+    
+    return {
+        "attached": len(created),
+        "skipped": len(batch.items) - len(created),
+        "items": created
+    }
+
 @app.get("/entities/{entity_type}/", response_model=List[schemas.Entity])
 async def read_entities_by_type(
     entity_type: str,
@@ -238,4 +469,59 @@ async def read_news_by_entity(
         entity_type=entity_type,
         skip=skip,
         limit=limit
-    )
\ No newline at end of file
+    )
+
+# 各粒度未指定起始時間時的預設查詢範圍
+ANALYTICS_DEFAULT_WINDOWS = {
+    "minute": timedelta(hours=1),
+    "hour": timedelta(days=1),
+    "day": timedelta(days=30),
+}
+
+@app.get("/analytics/news/{news_id}", response_model=schemas.NewsViewSeries)
+async def read_news_analytics(
+    news_id: int,
+    granularity: Literal["minute", "hour", "day"] = Query("hour"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """獲取新聞的瀏覽量時間序列（只讀取彙總表）"""
+    since = since or datetime.now() - ANALYTICS_DEFAULT_WINDOWS[granularity]
+    points = analytics.get_view_series(db, news_id, granularity, since, until)
+    
+    return {
+        "news_id": news_id,
+        "granularity": granularity,
+        "total": sum(point.views for point in points),
+        "points": points
+    }
+
+@app.get("/admin/admission")
+async def read_admission_stats():
+    """獲取限流與負載卸除的統計"""
+    return admission_stats.snapshot()
+
+@app.get("/admin/jobs")
+async def read_job_stats(db: Session = Depends(get_db)):
+    """獲取背景工作佇列各狀態的數量與本行程執行器的統計"""
+    return jobs.get_runner().snapshot(db)
+
+@app.get("/admin/queries")
+async def read_query_stats(
+    limit: int = Query(20, ge=1, le=200),
+    order: Literal["total", "mean", "max", "count"] = Query("total"),
+):
+    """獲取依總耗時（或平均、最大、次數）排序的查詢統計與最近的慢查詢"""
+    stats = diagnostics.diagnostics
+    return {
+        "since": stats.since,
+        "slow_query_ms": stats.slow_query_ms,
+        "top": stats.top(limit, order),
+        "slow": stats.slow_queries(limit),
+    }
+
+@app.delete("/admin/queries", status_code=204)
+async def reset_query_stats():
+    """清除查詢統計"""
+    diagnostics.diagnostics.reset()
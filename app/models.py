@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, LargeBinary, UniqueConstraint, JSON, Index
+from sqlalchemy import Column, BigInteger, Integer, String, Text, Boolean, DateTime, Float, ForeignKey, LargeBinary, UniqueConstraint, JSON, Index, Sequence, Table
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -7,6 +7,8 @@ from datetime import datetime
 Base = declarative_base()
 
 class News(Base):
+    # PostgreSQL 上依 published_at 按月分區（遷移 e5a7c9d1f346，維護見 app.partitions），
+    # 主鍵為 (id, published_at)，slug 唯一性由 news_slugs 表與觸發器保證
     __tablename__ = "news"
     
     id = Column(Integer, primary_key=True)
@@ -30,9 +32,13 @@ class News(Base):
     
     # Indexes
     __table_args__ = (
-        Index("idx_news_published_at", "published_at"),
+        # 含 id 以支援 (published_at, id) 的 keyset 分頁
+        Index("idx_news_published_at_id", "published_at", "id"),
         Index("idx_news_category_id", "category_id"),
         Index("idx_news_is_featured", "is_featured"),
+        # allocate_slug 以前綴範圍查詢數字後綴，PostgreSQL 非 C 定序時需要 pattern_ops 索引
+        Index("idx_news_slug_pattern", "slug", postgresql_ops={"slug": "varchar_pattern_ops"})
+        .ddl_if(dialect="postgresql"),
     )
     
 class Category(Base):
@@ -99,6 +105,11 @@ class Entity(Base):
     
     # Relationships
     news = relationship("News", secondary="news_entities", back_populates="entities")
+    
+    # Unique constraint
+    __table_args__ = (
+        UniqueConstraint('name', 'entity_type', name='uq_entity_name_type'),
+    )
 
 
 class NewsEntity(Base):
@@ -121,7 +132,112 @@ class NewsImage(Base):
     news_id = Column(Integer, ForeignKey("news.id"), nullable=False)
     image_data = Column(LargeBinary, nullable=False)
     mime_type = Column(String, nullable=False)
+    # 圖片內容的 SHA-256，作為 ETag 並略過內容相同的重複上傳
+    sha256 = Column(String(64), nullable=True)
     created_at = Column(DateTime, default=datetime.now)
     
     # 關聯
-    news = relationship("News", back_populates="image")
\ No newline at end of file
+    news = relationship("News", back_populates="image")
+
+
+class MediaAsset(Base):
+    """以內容雜湊定址的媒體檔（爬蟲下載的文章圖片），相同內容只存一份"""
+    __tablename__ = "media_assets"
+    
+    sha256 = Column(String(64), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    mime_type = Column(String, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    byte_size = Column(Integer, nullable=False)
+    # 第一次下載到此內容的來源網址
+    source_url = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+
+
+class NewsRelated(Base):
+    __tablename__ = "news_related"
+    
+    id = Column(Integer, primary_key=True)
+    news_id = Column(Integer, ForeignKey("news.id", ondelete="CASCADE"), nullable=False)
+    related_id = Column(Integer, ForeignKey("news.id", ondelete="CASCADE"), nullable=False)
+    rank = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+    
+    # Unique constraint
+    __table_args__ = (
+        UniqueConstraint('news_id', 'rank', name='uq_news_related_rank'),
+    )
+
+
+class NewsFingerprint(Base):
+    __tablename__ = "news_fingerprints"
+    
+    id = Column(Integer, primary_key=True)
+    news_id = Column(Integer, ForeignKey("news.id", ondelete="CASCADE"), unique=True, nullable=False)
+    simhash = Column(BigInteger, nullable=False)
+
+
+# 原始瀏覽事件（只新增不修改），在 PostgreSQL 上依 viewed_at 按日分區
+news_view_events = Table(
+    "news_view_events",
+    Base.metadata,
+    Column("news_id", Integer, nullable=False),
+    Column("viewed_at", DateTime, nullable=False),
+    Index("idx_news_view_events_news_id_viewed_at", "news_id", "viewed_at"),
+    postgresql_partition_by="RANGE (viewed_at)",
+)
+
+
+class NewsViewRollup(Base):
+    __tablename__ = "news_view_rollups"
+    
+    id = Column(Integer, primary_key=True)
+    news_id = Column(Integer, ForeignKey("news.id", ondelete="CASCADE"), nullable=False)
+    granularity = Column(String(10), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    views = Column(Integer, nullable=False, default=0)
+    
+    # Unique constraint
+    __table_args__ = (
+        UniqueConstraint('news_id', 'granularity', 'bucket_start', name='uq_news_view_rollup'),
+        Index("idx_news_view_rollups_granularity_bucket", "granularity", "bucket_start"),
+    )
+
+
+class FacetCount(Base):
+    """每個分面值（分類、標籤、實體）的新聞數，在寫入關聯的同一個交易中遞增"""
+    __tablename__ = "facet_counts"
+    
+    facet_type = Column(String(20), primary_key=True)
+    facet_id = Column(Integer, primary_key=True)
+    news_count = Column(Integer, nullable=False, default=0)
+
+
+class OutboxJob(Base):
+    """背景工作佇列（transactional outbox），與觸發它的資料寫入在同一個交易中新增"""
+    __tablename__ = "outbox_jobs"
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # 相同 key 的工作只會存在一筆，重複新增會被略過
+    idempotency_key = Column(String(300), unique=True, nullable=True)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False, default=datetime.now)
+    # 執行中的工作在 locked_until 之後視為 worker 已中止，可被重新領取
+    locked_by = Column(String(100), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("idx_outbox_jobs_kind_status_run_after", "kind", "status", "run_after"),
+    )
+
+
+# 推播事件的 id（app.push），透過 pg_notify 傳給每個 worker，各 worker 的事件編號一致且重啟後不會重來；
+# SQLite 沒有序列，create_all 會略過
+news_event_seq = Sequence("news_event_seq", metadata=Base.metadata)
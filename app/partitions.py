@@ -0,0 +1,196 @@
+"""news 表的按月分區維護：預先建立分區、拆分 default 分區、把冷分區移到壓縮的歸檔層
+
+分區結構由遷移 e5a7c9d1f346 建立（只在 PostgreSQL 上）。每個月一個分區 news_pYYYYMM，
+落在既有分區範圍外的新聞（例如爬到很舊的文章）先進 news_default，之後由 maintain 拆出。
+歸檔是把整個分區改寫成 TOAST 壓縮更積極的新表（可選擇放到另一個 tablespace）再換回去，
+分區仍掛在 news 底下，所以 crud 的查詢不需要知道哪些資料已經歸檔。
+"""
+import argparse
+import os
+from datetime import date, datetime
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+
+PARTITION_PREFIX = "news_p"
+DEFAULT_PARTITION = "news_default"
+ARCHIVED_COMMENT = "archived"
+# 需要 PostgreSQL 14 以上且編譯時啟用 lz4，否則設為 pglz
+ARCHIVE_COMPRESSION = os.getenv("NEWS_ARCHIVE_COMPRESSION", "lz4")
+ARCHIVE_TABLESPACE = os.getenv("NEWS_ARCHIVE_TABLESPACE")
+ARCHIVE_AFTER_MONTHS = 12
+# 設定後 news 上的觸發器不做串聯刪除與 slug 登記，搬移資料列時使用
+MAINTENANCE_SETTING = "news.partition_maintenance"
+# 會被重寫以套用新壓縮方式的欄位
+COMPRESSED_COLUMNS = ("content", "summary")
+# 掛上分區前暫時加上的 CHECK，與分區範圍相同
+BOUNDS_CONSTRAINT = "partition_bounds"
+
+
+class Partition(NamedTuple):
+    name: str
+    month: Optional[date]
+    archived: bool
+    size: int
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARTITION_PREFIX}{month:%Y%m}"
+
+
+def _bounds(month: date) -> str:
+    return f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+
+
+def _add_bounds_check(conn: Connection, table: str, month: date):
+    """在搬入資料前加上與分區範圍相同的 CHECK，之後 ATTACH 不必再掃描整張表驗證"""
+    conn.execute(text(
+        f"ALTER TABLE {table} ADD CONSTRAINT {BOUNDS_CONSTRAINT} CHECK (published_at IS NOT NULL "
+        f"AND published_at >= '{month.isoformat()}' AND published_at < '{add_months(month, 1).isoformat()}')"
+    ))
+
+
+def _attach(conn: Connection, name: str, month: date):
+    conn.execute(text(f"ALTER TABLE news ATTACH PARTITION {name} FOR VALUES {_bounds(month)}"))
+    # 分區範圍本身已保證這個條件
+    conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {BOUNDS_CONSTRAINT}"))
+
+
+def list_partitions(conn: Connection) -> List[Partition]:
+    rows = conn.execute(text(
+        "SELECT c.relname, obj_description(c.oid, 'pg_class'), pg_total_relation_size(c.oid) "
+        "FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'news' "
+        "ORDER BY c.relname"
+    )).all()
+    partitions = []
+    for name, comment, size in rows:
+        try:
+            month = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m").date()
+        except ValueError:
+            month = None
+        partitions.append(Partition(name, month, comment == ARCHIVED_COMMENT, size))
+    return partitions
+
+
+def _start_maintenance(conn: Connection):
+    conn.execute(text("SELECT set_config(:name, 'on', true)"), {"name": MAINTENANCE_SETTING})
+
+
+def ensure_partition(conn: Connection, month: date):
+    """建立該月的分區；default 分區中已有該月的資料時一併搬入"""
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return
+    upper = add_months(month, 1)
+    _start_maintenance(conn)
+    # default 分區有這個範圍的資料列時不能直接 PARTITION OF，先建獨立的表搬入資料再掛上
+    conn.execute(text(f"CREATE TABLE {name} (LIKE news INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    _add_bounds_check(conn, name, month)
+    moved = conn.execute(text(
+        f"WITH moved AS ("
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE published_at >= :lower AND published_at < :upper RETURNING *"
+        f") INSERT INTO {name} SELECT * FROM moved"
+    ), {"lower": month, "upper": upper}).rowcount
+    _attach(conn, name, month)
+    print(f"已建立分區 {name}" + (f"，從 {DEFAULT_PARTITION} 搬入 {moved} 筆" if moved else ""))
+
+
+def split_default(conn: Connection):
+    """把 default 分區中的資料拆到各自的月分區"""
+    months = conn.execute(text(
+        f"SELECT DISTINCT date_trunc('month', published_at)::date FROM {DEFAULT_PARTITION}"
+    )).scalars().all()
+    for month in sorted(months):
+        ensure_partition(conn, month)
+
+
+def archive_partition(conn: Connection, partition: Partition, tablespace: Optional[str] = ARCHIVE_TABLESPACE):
+    """以較積極的 TOAST 壓縮重寫分區，換回原位並標記為已歸檔"""
+    name = partition.name
+    staging = f"{name}_archiving"
+    columns = [column.name for column in models.News.__table__.columns]
+    values = [f"{c} || ''" if c in COMPRESSED_COLUMNS else c for c in columns]
+
+    # 擋住寫入但不擋讀取，直到換上新表
+    conn.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+    conn.execute(text(
+        f"CREATE TABLE {staging} (LIKE news INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"WITH (fillfactor = 100, toast_tuple_target = 128)"
+        + (f" TABLESPACE {tablespace}" if tablespace else "")
+    ))
+    for column in COMPRESSED_COLUMNS:
+        conn.execute(text(f"ALTER TABLE {staging} ALTER COLUMN {column} SET COMPRESSION {ARCHIVE_COMPRESSION}"))
+    # 複製時逐列檢查範圍，換回原位時不必在持有 news 的鎖時掃描整張表
+    _add_bounds_check(conn, staging, partition.month)
+    # 直接複製會保留原本已壓縮的值，串接空字串讓每個值以新的壓縮方式重新存入
+    conn.execute(text(
+        f"INSERT INTO {staging} ({', '.join(columns)}) SELECT {', '.join(values)} FROM {name}"
+    ))
+    conn.execute(text(f"ALTER TABLE news DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    conn.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+    _attach(conn, name, partition.month)
+    conn.execute(text(f"COMMENT ON TABLE {name} IS '{ARCHIVED_COMMENT}'"))
+    size = conn.execute(text("SELECT pg_total_relation_size(CAST(:name AS regclass))"), {"name": name}).scalar()
+    print(f"已歸檔分區 {name}：{partition.size / 1024 / 1024:.1f} MB -> {size / 1024 / 1024:.1f} MB")
+
+
+def maintain(engine: Engine, today: Optional[date] = None, months_ahead: int = 3,
+             archive_after: int = ARCHIVE_AFTER_MONTHS, tablespace: Optional[str] = ARCHIVE_TABLESPACE):
+    """預先建立未來的分區、拆分 default 分區，並歸檔超過 archive_after 個月的分區"""
+    if engine.dialect.name != "postgresql":
+        print("只有 PostgreSQL 的 news 表是分區表，略過")
+        return
+    current = month_start(today or date.today())
+    with engine.begin() as conn:
+        for offset in range(months_ahead + 1):
+            ensure_partition(conn, add_months(current, offset))
+        split_default(conn)
+
+    cutoff = add_months(current, -archive_after)
+    with engine.connect() as conn:
+        partitions = list_partitions(conn)
+    # 每個分區各自一個交易，縮短持有鎖的時間
+    for partition in partitions:
+        if partition.month is not None and partition.month < cutoff and not partition.archived:
+            with engine.begin() as conn:
+                archive_partition(conn, partition, tablespace)
+                conn.execute(text(f"ANALYZE {partition.name}"))
+
+
+def print_partitions(engine: Engine):
+    with engine.connect() as conn:
+        for partition in list_partitions(conn):
+            status = "已歸檔" if partition.archived else ""
+            print(f"{partition.name:<16} {partition.size / 1024 / 1024:>10.1f} MB  {status}")
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="news 分區維護：建立分區、拆分 default 分區、歸檔冷分區")
+    parser.add_argument("--months-ahead", type=int, default=3, help="預先建立幾個月後的分區")
+    parser.add_argument("--archive-after", type=int, default=ARCHIVE_AFTER_MONTHS, help="超過幾個月的分區移到歸檔層")
+    parser.add_argument("--tablespace", default=ARCHIVE_TABLESPACE, help="歸檔分區使用的 tablespace")
+    parser.add_argument("--list", action="store_true", help="只列出分區與大小")
+    args = parser.parse_args()
+    if args.list:
+        print_partitions(engine)
+    else:
+        maintain(engine, months_ahead=args.months_ahead, archive_after=args.archive_after,
+                 tablespace=args.tablespace)
@@ -0,0 +1,210 @@
+"""新文章推播：行程內廣播器，可選擇透過 PostgreSQL LISTEN/NOTIFY 讓多個 worker 互通
+
+每個訂閱者有一個固定長度的佇列。發布永遠不會被慢速的訂閱者阻塞：佇列滿時清空該訂閱者
+的佇列並只放入一個 resync 事件，讓客戶端重新呼叫 /news/ 取得最新列表。
+
+事件 id 供 SSE 的 Last-Event-ID 重連補送使用，必須在每個 worker 上相同且重啟後不會變小：
+透過 pg_notify 推播時由發送端從 news_event_seq 序列取號並放進通知內容；只有單一行程時
+以微秒時間戳記編號。
+"""
+import asyncio
+import json
+import os
+import select
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Set
+
+from sqlalchemy import func, make_url
+from sqlalchemy.orm import Session
+
+from . import models
+
+QUEUE_SIZE = 64
+REPLAY_SIZE = 256
+HEARTBEAT_INTERVAL = 15.0
+NOTIFY_CHANNEL = "news_events"
+# 啟用後事件改由 pg_notify 發送，每個 worker 的監聽執行緒再轉發給本機訂閱者
+PG_NOTIFY_ENABLED = os.getenv("PUSH_PG_NOTIFY", "0") == "1"
+
+Event = Dict[str, Any]
+
+
+class Subscriber:
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflows = 0
+
+    def offer(self, event: Event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflows += 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"id": event["id"], "type": "resync", "data": {}})
+
+
+class Broadcaster:
+    """把事件扇出給所有連線中的客戶端"""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE, replay_size: int = REPLAY_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+        self._recent: Deque[Event] = deque(maxlen=replay_size)
+        self._last_id = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """指定負責扇出的事件迴圈"""
+        self._loop = loop
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscriber:
+        """建立訂閱；帶上 last_event_id 時先補送之後的事件"""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self.queue_size)
+        if last_event_id is not None:
+            for event in self._recent:
+                if event["id"] > last_event_id:
+                    subscriber.offer(event)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event_type: str, data: Dict[str, Any], event_id: Optional[int] = None):
+        """可從任何執行緒呼叫；實際扇出一律在事件迴圈上執行
+
+        event_id 由 pg_notify 的發送端決定；未指定時以微秒時間戳記編號
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(event_type, data, event_id)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, event_type, data, event_id)
+
+    def _fan_out(self, event_type: str, data: Dict[str, Any], event_id: Optional[int] = None):
+        if event_id is None:
+            # 同一微秒內的事件依序加一，id 仍然遞增
+            event_id = max(self._last_id + 1, time.time_ns() // 1000)
+        self._last_id = max(self._last_id, event_id)
+        event = {"id": event_id, "type": event_type, "data": data}
+        self._recent.append(event)
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            subscriber.offer(event)
+
+
+broadcaster = Broadcaster()
+
+
+def news_event_data(news: models.News) -> Dict[str, Any]:
+    return {
+        "id": news.id,
+        "slug": news.slug,
+        "title": news.title,
+        "summary": (news.summary or "")[:200],
+        "published_at": news.published_at.isoformat() if news.published_at else None,
+        "category_id": news.category_id,
+    }
+
+
+def announce(db: Session, event_type: str, data: Dict[str, Any]):
+    """在新聞寫入並 commit 之後呼叫，data 由 news_event_data 在 commit 前取得"""
+    if PG_NOTIFY_ENABLED and db.get_bind().dialect.name == "postgresql":
+        event_id = db.scalar(models.news_event_seq.next_value().select())
+        payload = json.dumps({"id": event_id, "type": event_type, "data": data}, ensure_ascii=False)
+        db.execute(func.pg_notify(NOTIFY_CHANNEL, payload).select())
+        db.commit()
+    else:
+        broadcaster.publish(event_type, data)
+
+
+def format_sse(event: Event) -> str:
+    data = json.dumps(event["data"], ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+class NotifyListener:
+    """以獨立的連線 LISTEN（psycopg2 或 psycopg 3），收到通知後交給本機廣播器"""
+
+    def __init__(self, dsn: str, target: Broadcaster = broadcaster, driver: str = "psycopg2"):
+        self.dsn = dsn
+        self.target = target
+        self.driver = driver
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="push-notify-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _dispatch(self, payload: str):
+        message = json.loads(payload)
+        self.target.publish(message["type"], message["data"], message.get("id"))
+
+    def _listen_psycopg2(self):
+        import psycopg2
+
+        conn = psycopg2.connect(self.dsn)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            while not self._stopped.is_set():
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._dispatch(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+    def _listen_psycopg(self):
+        import psycopg
+
+        with psycopg.connect(self.dsn, autocommit=True) as conn:
+            conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            while not self._stopped.is_set():
+                # timeout 需要 psycopg 3.2 以上；逾時後產生器結束，回頭檢查是否該停止
+                for notify in conn.notifies(timeout=1.0):
+                    self._dispatch(notify.payload)
+
+    def _run(self):
+        listen = self._listen_psycopg if self.driver == "psycopg" else self._listen_psycopg2
+        while not self._stopped.is_set():
+            try:
+                listen()
+            except Exception as e:
+                print(f"LISTEN 連線中斷，稍後重試: {e}")
+                self._stopped.wait(1.0)
+
+
+def start_listener(dsn: str) -> Optional[NotifyListener]:
+    if not PG_NOTIFY_ENABLED or not dsn.startswith("postgresql"):
+        return None
+    # 兩種驅動都不接受 SQLAlchemy 的 driver 名稱，依 URL 選驅動後改回 libpq 的 postgresql://
+    url = make_url(dsn)
+    listener = NotifyListener(
+        url.set(drivername="postgresql").render_as_string(hide_password=False),
+        driver=url.get_driver_name(),
+    )
+    listener.start()
+    return listener
@@ -0,0 +1,253 @@
+"""相關新聞預先計算：以 TF-IDF、標籤與實體重疊度計算每篇新聞的 top-K 鄰居
+
+全量重建會重新計算 IDF 並覆寫整張 news_related 表；增量模式只為新文章計算向量，
+沿用既有 IDF，並在新文章分數更高時更新舊文章的鄰居列表。
+"""
+import argparse
+import math
+import os
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .text import tokenize
+
+TOP_K = 10
+TEXT_DIM = 1 << 18
+TAG_DIM = 1 << 12
+ENTITY_DIM = 1 << 14
+TEXT_WEIGHT = 0.6
+TAG_WEIGHT = 0.2
+ENTITY_WEIGHT = 0.2
+BLOCK_SIZE = 1024
+# 每個相似度區塊的最大元素數，避免文章數很多時一次配置過大的稠密矩陣
+MAX_BLOCK_CELLS = 1 << 24
+
+INDEX_PATH = os.getenv("RELATED_INDEX_PATH", "data/related_index.npz")
+
+
+def _hash(token: str, dim: int) -> int:
+    # 不使用內建 hash()，確保不同行程間的特徵位置一致
+    return zlib.crc32(token.encode("utf-8")) % dim
+
+
+def _normalize(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+
+def _term_matrix(docs: List[Counter], dim: int) -> sparse.csr_matrix:
+    rows, cols, data = [], [], []
+    for row, counts in enumerate(docs):
+        for col, tf in counts.items():
+            rows.append(row)
+            cols.append(col)
+            data.append(tf)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(docs), dim), dtype=np.float64)
+
+
+class RelatedIndex:
+    """持久化的文章特徵矩陣（已加權、L2 正規化）"""
+
+    def __init__(self, news_ids: np.ndarray, features: sparse.csr_matrix, idf: np.ndarray):
+        self.news_ids = news_ids
+        self.features = features
+        self.idf = idf
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH) -> Optional["RelatedIndex"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            features = sparse.csr_matrix(
+                (data["data"], data["indices"], data["indptr"]), shape=tuple(data["shape"])
+            )
+            return cls(data["news_ids"], features, data["idf"])
+
+    def save(self, path: str = INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(
+            tmp,
+            news_ids=self.news_ids,
+            data=self.features.data,
+            indices=self.features.indices,
+            indptr=self.features.indptr,
+            shape=np.array(self.features.shape),
+            idf=self.idf,
+        )
+        os.replace(tmp, path)
+
+
+def _load_documents(db: Session, news_ids: Optional[Iterable[int]] = None):
+    """讀取文章文字與標籤、實體 id"""
+    query = select(models.News.id, models.News.title, models.News.content).order_by(models.News.id)
+    tag_query = select(models.NewsTag.news_id, models.NewsTag.tag_id)
+    entity_query = select(models.NewsEntity.news_id, models.NewsEntity.entity_id)
+    if news_ids is not None:
+        news_ids = list(news_ids)
+        query = query.where(models.News.id.in_(news_ids))
+        tag_query = tag_query.where(models.NewsTag.news_id.in_(news_ids))
+        entity_query = entity_query.where(models.NewsEntity.news_id.in_(news_ids))
+
+    tags = defaultdict(Counter)
+    for news_id, tag_id in db.execute(tag_query):
+        tags[news_id][_hash(f"t{tag_id}", TAG_DIM)] = 1
+    entities = defaultdict(Counter)
+    for news_id, entity_id in db.execute(entity_query):
+        entities[news_id][_hash(f"e{entity_id}", ENTITY_DIM)] = 1
+
+    ids, texts, tag_docs, entity_docs = [], [], [], []
+    for news_id, title, content in db.execute(query):
+        ids.append(news_id)
+        texts.append(Counter(_hash(t, TEXT_DIM) for t in tokenize(f"{title}\n{content}")))
+        tag_docs.append(tags[news_id])
+        entity_docs.append(entities[news_id])
+    return np.array(ids, dtype=np.int64), texts, tag_docs, entity_docs
+
+
+def _features(texts, tag_docs, entity_docs, idf: np.ndarray) -> sparse.csr_matrix:
+    tf = _term_matrix(texts, TEXT_DIM)
+    tf.data = 1.0 + np.log(tf.data)
+    text = _normalize(tf @ sparse.diags(idf))
+    tag = _normalize(_term_matrix(tag_docs, TAG_DIM))
+    entity = _normalize(_term_matrix(entity_docs, ENTITY_DIM))
+    # 拼接後的內積即為三種 cosine 相似度的加權和
+    combined = sparse.hstack([
+        text * math.sqrt(TEXT_WEIGHT),
+        tag * math.sqrt(TAG_WEIGHT),
+        entity * math.sqrt(ENTITY_WEIGHT),
+    ], format="csr")
+    combined.eliminate_zeros()
+    return combined
+
+
+def _top_k(query: sparse.csr_matrix, query_ids: np.ndarray, index: RelatedIndex,
+           k: int) -> Dict[int, List[Tuple[int, float]]]:
+    """分塊計算相似度並取每列的 top-K（排除自己）"""
+    result = {}
+    features_t = index.features.T.tocsc()
+    step = max(1, min(BLOCK_SIZE, MAX_BLOCK_CELLS // max(len(index.news_ids), 1)))
+    for start in range(0, query.shape[0], step):
+        block = (query[start:start + step] @ features_t).toarray()
+        block_ids = query_ids[start:start + step]
+        block[block_ids[:, None] == index.news_ids[None, :]] = 0.0
+        kk = min(k, block.shape[1])
+        if kk == 0:
+            continue
+        top = np.argpartition(-block, kk - 1, axis=1)[:, :kk]
+        for row, news_id in enumerate(block_ids):
+            cols = top[row][np.argsort(-block[row, top[row]])]
+            result[int(news_id)] = [
+                (int(index.news_ids[c]), float(block[row, c])) for c in cols if block[row, c] > 0
+            ]
+    return result
+
+
+def _write_neighbors(db: Session, neighbors: Dict[int, List[Tuple[int, float]]]):
+    # 沒有鄰居時也要 commit，全量重建對 news_related 的清空才會生效
+    ids = list(neighbors)
+    for start in range(0, len(ids), BLOCK_SIZE):
+        chunk = ids[start:start + BLOCK_SIZE]
+        db.execute(delete(models.NewsRelated).where(models.NewsRelated.news_id.in_(chunk)))
+        rows = [
+            {"news_id": news_id, "related_id": related_id, "score": score, "rank": rank}
+            for news_id in chunk
+            for rank, (related_id, score) in enumerate(neighbors[news_id], start=1)
+        ]
+        if rows:
+            db.execute(insert(models.NewsRelated), rows)
+    db.commit()
+
+
+def rebuild(db: Session, k: int = TOP_K, path: str = INDEX_PATH) -> RelatedIndex:
+    """全量重建特徵矩陣與 news_related 表"""
+    ids, texts, tag_docs, entity_docs = _load_documents(db)
+    df = np.zeros(TEXT_DIM)
+    for counts in texts:
+        df[list(counts)] += 1
+    idf = np.log((1 + len(ids)) / (1 + df)) + 1.0
+
+    index = RelatedIndex(ids, _features(texts, tag_docs, entity_docs, idf), idf)
+    db.execute(delete(models.NewsRelated))
+    _write_neighbors(db, _top_k(index.features, ids, index, k))
+    index.save(path)
+    return index
+
+
+def update(db: Session, news_ids: Optional[Iterable[int]] = None, k: int = TOP_K,
+           path: str = INDEX_PATH) -> RelatedIndex:
+    """增量更新：為新文章計算鄰居，並把新文章併入舊文章的 top-K
+
+    未指定 news_ids 時處理所有尚未進入索引的文章；沒有既有索引時改為全量重建。
+    """
+    index = RelatedIndex.load(path)
+    if index is None:
+        return rebuild(db, k, path)
+
+    if news_ids is None:
+        known = int(index.news_ids.max()) if len(index.news_ids) else 0
+        news_ids = db.scalars(select(models.News.id).where(models.News.id > known)).all()
+    ids, texts, tag_docs, entity_docs = _load_documents(db, news_ids)
+    if not len(ids):
+        return index
+
+    # 已在索引中的文章（例如標籤有變動）以新向量取代
+    keep = ~np.isin(index.news_ids, ids)
+    new_features = _features(texts, tag_docs, entity_docs, index.idf)
+    index = RelatedIndex(
+        np.concatenate([index.news_ids[keep], ids]),
+        sparse.vstack([index.features[keep], new_features], format="csr"),
+        index.idf,
+    )
+    neighbors = _top_k(new_features, ids, index, k)
+
+    # 新文章若比舊文章現有的第 K 名更相似，則重新排序舊文章的鄰居
+    current = defaultdict(list)
+    affected = {related_id for pairs in neighbors.values() for related_id, _ in pairs} - set(neighbors)
+    if affected:
+        for row in db.execute(
+            select(models.NewsRelated.news_id, models.NewsRelated.related_id, models.NewsRelated.score)
+            .where(models.NewsRelated.news_id.in_(affected))
+        ):
+            current[row.news_id].append((row.related_id, row.score))
+        for news_id, pairs in list(neighbors.items()):
+            for related_id, score in pairs:
+                if related_id in affected:
+                    current[related_id].append((news_id, score))
+        for news_id in affected:
+            merged = {}
+            for related_id, score in current[news_id]:
+                merged[related_id] = max(score, merged.get(related_id, 0.0))
+            neighbors[news_id] = sorted(merged.items(), key=lambda p: -p[1])[:k]
+
+    _write_neighbors(db, neighbors)
+    index.save(path)
+    return index
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="預先計算相關新聞")
+    parser.add_argument("--rebuild", action="store_true", help="全量重建（預設為增量更新）")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--index-path", default=INDEX_PATH)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            index = rebuild(db, args.top_k, args.index_path)
+        else:
+            index = update(db, k=args.top_k, path=args.index_path)
+        print(f"索引中共有 {len(index.news_ids)} 篇新聞")
+    finally:
+        db.close()
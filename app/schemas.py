@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -70,6 +70,8 @@ class EntityCreate(EntityBase):
 
 class Entity(EntityBase):
     id: int
+    # ORM 的欄位叫 meta_info（metadata 是 SQLAlchemy 的保留屬性）
+    metadata: Optional[Dict[str, Any]] = Field(None, validation_alias=AliasChoices("meta_info", "metadata"))
     
     class Config:
         orm_mode = True
@@ -88,6 +90,21 @@ class NewsEntity(NewsEntityBase):
         orm_mode = True
 
 
+class NewsEntityLinkCreate(EntityBase):
+    news_id: int
+    role: str
+
+
+class NewsEntityBatchCreate(BaseModel):
+    items: List[NewsEntityLinkCreate]
+
+
+class NewsEntityBatchResult(BaseModel):
+    attached: int
+    skipped: int
+    items: List[NewsEntity]
+
+
 class NewsBase(BaseModel):
     title: str
     slug: str
@@ -131,6 +148,25 @@ class News(NewsBase):
         orm_mode = True
 
 
+class NewsFields(BaseModel):
+    """依 fields 參數投影的新聞，未選取的欄位不會出現在回應中"""
+    id: int
+    title: Optional[str] = None
+    slug: Optional[str] = None
+    content: Optional[str] = None
+    summary: Optional[str] = None
+    published_at: Optional[datetime] = None
+    thumbnail_url: Optional[str] = None
+    is_featured: Optional[bool] = None
+    category_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    category: Optional[Category] = None
+    tags: Optional[List[Tag]] = None
+    metrics: Optional[NewsMetrics] = None
+    image_url: Optional[str] = None
+
+
 class NewsDetail(News):
     entities: List[Entity] = []
 
@@ -141,9 +177,53 @@ class NewsSearchResult(BaseModel):
 
 
 class NewsListResponse(BaseModel):
-    items: List[News]
+    items: List[NewsFields]
     total: int
     page: int
     size: int
     pages: int
 
+
+class NewsViewPoint(BaseModel):
+    bucket_start: datetime
+    views: int
+
+
+class NewsViewSeries(BaseModel):
+    news_id: int
+    granularity: str
+    total: int
+    points: List[NewsViewPoint]
+
+
+class FacetValue(BaseModel):
+    id: int
+    name: str
+    # 分類與標籤有 slug，實體有 entity_type
+    slug: Optional[str] = None
+    entity_type: Optional[str] = None
+    count: int
+
+
+class FacetsResponse(BaseModel):
+    total: int
+    categories: List[FacetValue]
+    tags: List[FacetValue]
+    entities: List[FacetValue]
+
+
+class TrendingItem(BaseModel):
+    id: int
+    name: str
+    # 標籤有 slug，實體有 entity_type
+    slug: Optional[str] = None
+    entity_type: Optional[str] = None
+    # 瀏覽次數的上界，實際次數至少是 count - error
+    count: int
+    error: int
+
+
+class TrendingResponse(BaseModel):
+    kind: str
+    window: str
+    items: List[TrendingItem]
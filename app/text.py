@@ -0,0 +1,18 @@
+"""文字處理共用工具"""
+import re
+from typing import List
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """英數字取整個單字，中文取字元 bigram"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if run[0].isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
@@ -0,0 +1,333 @@
+"""熱門標籤與實體：以 Space-Saving 摘要在記憶體中串流統計最近的瀏覽
+
+每次閱讀新聞時，把該篇新聞的標籤與實體各計一次。計數先累積在待處理的 Counter（O(1)），
+每秒併入目前時間桶的 Space-Saving 摘要；每個摘要最多保留 CAPACITY 個項目，計數的高估量
+不超過記錄在 error 中的值，記憶體用量與項目總數無關。1 小時視窗以 5 分鐘為一桶、24 小時視窗
+以 1 小時為一桶，過期的桶直接丟棄。
+
+Space-Saving 摘要可以合併：每個 worker 定期把自己的時間桶寫成快照（SNAPSHOT_DIR 下一個行程一個檔案），
+查詢時合併本行程與其他 worker 快照中同一視窗的桶，結果快取 REFRESH_INTERVAL 秒，每次請求只需
+取前 k 名。重新啟動的 worker 把舊行程的快照當成其他 worker 讀入，重啟前的計數不會遺失也不會重複。
+"""
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from . import models
+
+ENABLED = os.getenv("TRENDING_ENABLED", "1") == "1"
+SNAPSHOT_DIR = os.getenv("TRENDING_SNAPSHOT_DIR", "data/trending")
+SNAPSHOT_INTERVAL = 30.0
+FOLD_INTERVAL = 1.0
+REFRESH_INTERVAL = 5.0
+CAPACITY = 200
+KINDS = ("tags", "entities")
+
+
+class Window(NamedTuple):
+    bucket_seconds: int
+    buckets: int
+
+
+WINDOWS = {"1h": Window(300, 12), "24h": Window(3600, 24)}
+
+
+class SpaceSaving:
+    """最多保留 capacity 個項目的 Space-Saving 摘要；count 是上界，count - error 是下界"""
+
+    __slots__ = ("capacity", "counts", "errors")
+
+    def __init__(self, capacity: int = CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[int, int] = {}
+        self.errors: Dict[int, int] = {}
+
+    def floor(self) -> int:
+        """不在摘要中的項目可能的最大計數"""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def add(self, key: int, count: int = 1):
+        if key in self.counts:
+            self.counts[key] += count
+            return
+        if len(self.counts) >= self.capacity:
+            # 取代計數最小的項目，新項目繼承它的計數作為誤差
+            victim = min(self.counts, key=self.counts.__getitem__)
+            floor = self.counts.pop(victim)
+            del self.errors[victim]
+        else:
+            floor = 0
+        self.counts[key] = floor + count
+        self.errors[key] = floor
+
+    @classmethod
+    def merge(cls, sketches: Iterable["SpaceSaving"], capacity: int = CAPACITY) -> "SpaceSaving":
+        """合併多個摘要：某個摘要中沒有的項目以該摘要的 floor 計入上界與誤差，再保留前 capacity 名"""
+        sketches = [sketch for sketch in sketches if sketch.counts]
+        floors = [sketch.floor() for sketch in sketches]
+        keys = set().union(*(sketch.counts for sketch in sketches))
+        counts, errors = Counter(), Counter()
+        for sketch, floor in zip(sketches, floors):
+            for key in keys:
+                if key in sketch.counts:
+                    counts[key] += sketch.counts[key]
+                    errors[key] += sketch.errors[key]
+                else:
+                    counts[key] += floor
+                    errors[key] += floor
+        merged = cls(capacity)
+        for key, count in counts.most_common(capacity):
+            merged.counts[key] = count
+            merged.errors[key] = errors[key]
+        return merged
+
+    def top(self, k: int) -> List[Tuple[int, int, int]]:
+        """[(key, count, error)]，依計數由大到小"""
+        keys = sorted(self.counts, key=lambda key: (-self.counts[key], key))[:k]
+        return [(key, self.counts[key], self.errors[key]) for key in keys]
+
+    def to_json(self) -> Dict[str, List[int]]:
+        return {str(key): [count, self.errors[key]] for key, count in self.counts.items()}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, List[int]], capacity: int = CAPACITY) -> "SpaceSaving":
+        sketch = cls(capacity)
+        for key, (count, error) in data.items():
+            sketch.counts[int(key)] = count
+            sketch.errors[int(key)] = error
+        return sketch
+
+
+# 各視窗的時間桶：{桶編號: 摘要}
+Buckets = Dict[int, SpaceSaving]
+
+
+class TrendingTracker:
+    """本行程的熱門統計，並合併其他 worker 的快照"""
+
+    def __init__(self, snapshot_dir: str = SNAPSHOT_DIR, capacity: int = CAPACITY):
+        self.snapshot_dir = snapshot_dir
+        self.capacity = capacity
+        self.snapshot_path = os.path.join(snapshot_dir, f"worker-{os.getpid()}.json")
+        self._pending: Dict[str, Counter] = {kind: Counter() for kind in KINDS}
+        self._buckets: Dict[Tuple[str, str], Buckets] = {(kind, window): {} for kind in KINDS for window in WINDOWS}
+        # 項目的顯示資訊，記錄瀏覽時順便取得，查詢時不需要讀資料庫；併入時刪除已不在任何摘要中的項目
+        self.labels: Dict[str, Dict[int, Dict[str, Any]]] = {kind: {} for kind in KINDS}
+        self._peers: Dict[Tuple[str, str], List[Buckets]] = {}
+        # 其他 worker 的快照：路徑 -> (修改時間, 內容)
+        self._peer_files: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # 合併後依計數排序的結果：(kind, window) -> (時間, [(key, count, error)])
+        self._cache: Dict[Tuple[str, str], Tuple[float, List[Tuple[int, int, int]]]] = {}
+        # _lock 保護 record 會寫入的 _pending、labels 與 views；_buckets_lock 保護時間桶、其他 worker 的快照與合併結果，
+        # 併入、合併與寫快照都在其中進行（可重入：top 與 snapshot 內會呼叫 fold）
+        self._lock = threading.Lock()
+        self._buckets_lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.views = 0
+
+    def record(self, tags: Iterable[Tuple[int, Dict[str, Any]]], entities: Iterable[Tuple[int, Dict[str, Any]]]):
+        """記錄一次瀏覽（O(標籤數 + 實體數)，不碰資料庫）"""
+        with self._lock:
+            self.views += 1
+            for kind, items in (("tags", tags), ("entities", entities)):
+                pending, labels = self._pending[kind], self.labels[kind]
+                for key, label in items:
+                    pending[key] += 1
+                    if key not in labels:
+                        labels[key] = label
+
+    def fold(self, now: Optional[float] = None):
+        """把待處理的計數併入目前的時間桶，並丟棄過期的桶"""
+        now = now or time.time()
+        with self._buckets_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {kind: Counter() for kind in KINDS}
+            for (kind, window), buckets in self._buckets.items():
+                spec = WINDOWS[window]
+                current = int(now // spec.bucket_seconds)
+                counts = pending[kind]
+                if counts:
+                    sketch = buckets.get(current)
+                    if sketch is None:
+                        sketch = buckets[current] = SpaceSaving(self.capacity)
+                    # 由多到少加入，摘要已滿時被替換的是這一秒內較少見的項目
+                    for key, count in counts.most_common():
+                        sketch.add(key, count)
+                for index in [index for index in buckets if index <= current - spec.buckets]:
+                    del buckets[index]
+            live = {kind: self._keys(kind, peers=True) for kind in KINDS}
+            with self._lock:
+                # 尚未併入的計數也要保留標籤
+                for kind, labels in self.labels.items():
+                    keys = live[kind] | self._pending[kind].keys()
+                    for key in [key for key in labels if key not in keys]:
+                        del labels[key]
+
+    def _keys(self, kind: str, peers: bool) -> set:
+        """本行程（peers 為 True 時包括其他 worker）所有時間桶摘要中的項目，呼叫端需持有 _buckets_lock"""
+        sources = [buckets for (name, _), buckets in self._buckets.items() if name == kind]
+        if peers:
+            sources += [buckets for (name, _), peer in self._peers.items() if name == kind for buckets in peer]
+        return {key for buckets in sources for sketch in buckets.values() for key in sketch.counts}
+
+    def top(self, kind: str, window: str, k: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """視窗內最熱門的 k 個項目；合併結果快取 REFRESH_INTERVAL 秒，命中時只需取前 k 名
+
+        快取的結果建立後不再修改，命中時不必取鎖；未命中時在 _buckets_lock 內併入並合併
+        """
+        now = now or time.time()
+        cached = self._cache.get((kind, window))
+        if cached is None or now - cached[0] >= REFRESH_INTERVAL:
+            with self._buckets_lock:
+                self.fold(now)
+                spec = WINDOWS[window]
+                oldest = int(now // spec.bucket_seconds) - spec.buckets + 1
+                sources = [self._buckets[(kind, window)]] + self._peers.get((kind, window), [])
+                merged = SpaceSaving.merge(
+                    (sketch for buckets in sources for index, sketch in buckets.items() if index >= oldest),
+                    self.capacity,
+                )
+                cached = (now, [item for item in merged.top(self.capacity) if item[0] in self.labels[kind]])
+                self._cache[(kind, window)] = cached
+        # 快取建立後項目可能已移出所有摘要，標籤也被刪除，這時略過
+        labels = self.labels[kind]
+        items = [(key, count, error, labels.get(key)) for key, count, error in cached[1][:k]]
+        return [{"id": key, "count": count, "error": error, **label}
+                for key, count, error, label in items if label is not None]
+
+    # ---- 快照 ----
+
+    def snapshot(self):
+        """把本行程的時間桶寫入快照檔（先寫暫存檔再改名，其他 worker 不會讀到一半的檔案）
+
+        只寫入本行程摘要中項目的標籤，其他 worker 的標籤由它們自己的快照提供
+        """
+        with self._buckets_lock:
+            self.fold()
+            buckets_json = {
+                f"{kind}:{window}": {str(index): sketch.to_json() for index, sketch in buckets.items()}
+                for (kind, window), buckets in self._buckets.items()
+            }
+            own = {kind: self._keys(kind, peers=False) for kind in KINDS}
+        with self._lock:
+            labels_json = {kind: {str(key): labels[key] for key in own[kind] if key in labels}
+                           for kind, labels in self.labels.items()}
+        data = {"written_at": time.time(), "buckets": buckets_json, "labels": labels_json}
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        # 多個執行緒可能同時寫快照，暫存檔依執行緒區分，不會互相改名
+        tmp = f"{self.snapshot_path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.snapshot_path)
+
+    def _parse_snapshot(self, data: Dict[str, Any]) -> Dict[Tuple[str, str], Buckets]:
+        with self._lock:
+            for kind, labels in data["labels"].items():
+                for key, label in labels.items():
+                    self.labels[kind].setdefault(int(key), label)
+        result = {}
+        for name, buckets in data["buckets"].items():
+            kind, window = name.split(":")
+            result[(kind, window)] = {
+                int(index): SpaceSaving.from_json(sketch, self.capacity) for index, sketch in buckets.items()
+            }
+        return result
+
+    def restore(self):
+        """行程 id 與上次相同時（例如容器重啟），讀回自己的快照"""
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._buckets_lock:
+            for key, buckets in self._parse_snapshot(data).items():
+                if key in self._buckets:
+                    self._buckets[key] = buckets
+            self.fold()
+            self._cache.clear()
+
+    def load_peers(self):
+        """讀入其他 worker（包括重啟前的本 worker）有變動的快照，並刪除早已過期的快照"""
+        longest = max(spec.bucket_seconds * spec.buckets for spec in WINDOWS.values())
+        changed = False
+        paths = set(glob.glob(os.path.join(self.snapshot_dir, "worker-*.json"))) - {self.snapshot_path}
+        for path in paths:
+            try:
+                mtime = os.path.getmtime(path)
+                if time.time() - mtime > longest:
+                    os.remove(path)
+                    continue
+                if path in self._peer_files and self._peer_files[path][0] == mtime:
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            self._peer_files[path] = (mtime, data)
+            changed = True
+        for path in set(self._peer_files) - paths:
+            del self._peer_files[path]
+            changed = True
+        if not changed:
+            return
+        # 在 _buckets_lock 內讀入標籤並換上新的快照，併入時不會先刪掉還沒換上的標籤
+        with self._buckets_lock:
+            peers: Dict[Tuple[str, str], List[Buckets]] = {}
+            for _, data in self._peer_files.values():
+                for key, buckets in self._parse_snapshot(data).items():
+                    peers.setdefault(key, []).append(buckets)
+            self._peers = peers
+            self._cache.clear()
+
+    # ---- 背景執行緒 ----
+
+    def start(self):
+        if self._thread is None:
+            self.restore()
+            self.load_peers()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="trending", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+            self.snapshot()
+
+    def _run(self):
+        last_snapshot = time.monotonic()
+        while not self._stopped.wait(FOLD_INTERVAL):
+            try:
+                self.fold()
+                if time.monotonic() - last_snapshot >= SNAPSHOT_INTERVAL:
+                    self.snapshot()
+                    self.load_peers()
+                    last_snapshot = time.monotonic()
+            except Exception as e:
+                print(f"更新熱門統計時出錯: {e}")
+
+
+_tracker: Optional[TrendingTracker] = None
+
+
+def get_tracker() -> TrendingTracker:
+    global _tracker
+    if _tracker is None:
+        _tracker = TrendingTracker()
+    return _tracker
+
+
+def record_view(news: models.News):
+    """在讀取新聞詳情時呼叫，news 的 tags 與 entities 在回應時本來就會載入"""
+    get_tracker().record(
+        ((tag.id, {"name": tag.name, "slug": tag.slug}) for tag in news.tags),
+        ((entity.id, {"name": entity.name, "entity_type": entity.entity_type}) for entity in news.entities),
+    )
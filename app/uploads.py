@@ -0,0 +1,265 @@
+"""圖片上傳：限制請求大小、分塊讀取並計算雜湊、以檔頭判斷格式，解碼驗證交給執行緒池
+
+上傳的檔案由 Starlette 寫入暫存檔（超過 1 MB 即落地），這裡以固定大小的區塊讀取，
+每個上傳佔用的記憶體與檔案大小無關。UploadLimitMiddleware 在讀取請求本體時就計算位元組數，
+超過上限立刻回 413，不必等整個檔案傳完。格式只看魔術位元組，不信任客戶端的 Content-Type；
+有安裝 Pillow 時完整解碼驗證，否則檢查檔頭的尺寸與檔尾標記。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import struct
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, NamedTuple, Optional, Pattern, Tuple
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(5 * 1024 * 1024)))
+# 解碼後的像素上限，避免小檔案解壓成巨大點陣圖
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))
+CHUNK_SIZE = 64 * 1024
+# multipart 邊界與欄位標頭所需的額外空間
+MULTIPART_OVERHEAD = 16 * 1024
+UPLOAD_PATHS = [re.compile(r"^/news/[^/]+/image$")]
+
+# 同時驗證的圖片數量有上限，大量上傳時不會同時解碼太多張
+_verifier = ThreadPoolExecutor(max_workers=int(os.getenv("IMAGE_VERIFY_WORKERS", "2")),
+                               thread_name_prefix="image-verify")
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+class SpooledImage(NamedTuple):
+    file: BinaryIO
+    size: int
+    sha256: str
+    mime_type: str
+    width: int
+    height: int
+
+
+def sniff(header: bytes) -> Optional[str]:
+    """依魔術位元組判斷圖片格式"""
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _read(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) < size:
+        raise InvalidImage("圖片檔案不完整")
+    return data
+
+
+def _jpeg_size(file: BinaryIO) -> Tuple[int, int]:
+    file.seek(2)
+    while True:
+        marker = file.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise InvalidImage("JPEG 區段損毀")
+        if marker[1] in (0x01, 0xFF) or 0xD0 <= marker[1] <= 0xD7:
+            continue
+        if marker[1] in (0xD9, 0xDA):
+            # 在影像資料或檔尾之前沒有找到 SOF 區段
+            raise InvalidImage("JPEG 缺少影像尺寸")
+        (length,) = struct.unpack(">H", _read(file, 2))
+        if length < 2:
+            raise InvalidImage("JPEG 區段損毀")
+        if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">xHH", _read(file, 5))
+            return width, height
+        file.seek(length - 2, os.SEEK_CUR)
+
+
+def _png_has_data(file: BinaryIO) -> bool:
+    """依序走過區段標頭（不讀區段內容），確認在 IEND 之前有 IDAT"""
+    file.seek(8)
+    while True:
+        length, chunk = struct.unpack(">I4s", _read(file, 8))
+        if chunk == b"IDAT":
+            return True
+        if chunk == b"IEND":
+            return False
+        file.seek(length + 4, os.SEEK_CUR)
+
+
+def _structural_check(file: BinaryIO, mime_type: str, size: int) -> Tuple[int, int]:
+    """不解碼像素，只檢查檔頭尺寸與檔尾標記，擋下截斷或偽造副檔名的檔案"""
+    file.seek(0)
+    header = file.read(32)
+    file.seek(max(0, size - 12))
+    trailer = file.read()
+    if mime_type == "image/png":
+        # 簽章 8 + IHDR 區段 25 + IEND 區段 12
+        if size < 45 or header[12:16] != b"IHDR" or b"IEND" not in trailer:
+            raise InvalidImage("PNG 檔案不完整")
+        if not _png_has_data(file):
+            raise InvalidImage("PNG 缺少影像資料")
+        return struct.unpack(">II", header[16:24])
+    if mime_type == "image/gif":
+        # 檔頭 6 + 邏輯畫面描述 7 + 至少一個區塊 + 檔尾
+        if size < 14 or not trailer.endswith(b"\x3b"):
+            raise InvalidImage("GIF 檔案不完整")
+        return struct.unpack("<HH", header[6:10])
+    if mime_type == "image/webp":
+        if len(header) < 30:
+            raise InvalidImage("WebP 檔案不完整")
+        if struct.unpack("<I", header[4:8])[0] + 8 != size:
+            raise InvalidImage("WebP 檔案長度不符")
+        chunk = header[12:16]
+        if chunk == b"VP8X":
+            return (int.from_bytes(header[24:27], "little") + 1,
+                    int.from_bytes(header[27:30], "little") + 1)
+        if chunk == b"VP8 ":
+            file.seek(26)
+            width, height = struct.unpack("<HH", _read(file, 4))
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = int.from_bytes(header[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        raise InvalidImage("無法辨識的 WebP 格式")
+    if b"\xff\xd9" not in trailer:
+        raise InvalidImage("JPEG 檔案不完整")
+    return _jpeg_size(file)
+
+
+@lru_cache(maxsize=None)
+def _pillow():
+    """Pillow 只有驗證上傳時才需要，延後到第一次使用時才載入；未安裝時回傳 None，只做結構檢查"""
+    try:
+        from PIL import Image
+    except ImportError:  # pragma: no cover - 依安裝環境而定
+        return None
+    return Image
+
+
+def verify(file: BinaryIO, mime_type: str, size: int) -> Tuple[int, int]:
+    """在執行緒池中執行：確認檔案能被解碼並回傳尺寸"""
+    Image = _pillow()
+    if Image is None:
+        try:
+            width, height = _structural_check(file, mime_type, size)
+        except (struct.error, OSError) as e:
+            raise InvalidImage(f"圖片檔案損毀: {e}") from e
+    else:
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+                if width * height <= MAX_IMAGE_PIXELS:
+                    image.verify()
+        except Exception as e:
+            raise InvalidImage(f"圖片無法解碼: {e}") from e
+    if width <= 0 or height <= 0:
+        raise InvalidImage("圖片尺寸無效")
+    if width * height > MAX_IMAGE_PIXELS:
+        raise InvalidImage(f"圖片像素過多（{width}x{height}）")
+    return width, height
+
+
+async def spool_image(upload: UploadFile, max_bytes: int = MAX_IMAGE_BYTES) -> SpooledImage:
+    """分塊讀過上傳的暫存檔，同時計算 SHA-256 與判斷格式，再交給執行緒池驗證"""
+    digest = hashlib.sha256()
+    size = 0
+    header = b""
+    await upload.seek(0)
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if len(header) < 16:
+            header += chunk[:16]
+        size += len(chunk)
+        if size > max_bytes:
+            raise ImageTooLarge(f"圖片超過 {max_bytes} 位元組上限")
+        digest.update(chunk)
+    mime_type = sniff(header)
+    if mime_type is None:
+        raise InvalidImage("不支援的圖片格式")
+    loop = asyncio.get_running_loop()
+    width, height = await loop.run_in_executor(_verifier, verify, upload.file, mime_type, size)
+    upload.file.seek(0)
+    return SpooledImage(upload.file, size, digest.hexdigest(), mime_type, width, height)
+
+
+async def _too_large(send: Send, max_bytes: int):
+    body = json.dumps({"detail": f"請求超過 {max_bytes} 位元組上限"}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """上傳路由的請求本體超過上限時回 413；有 Content-Length 時不讀本體就拒絕"""
+
+    def __init__(self, app: ASGIApp, max_bytes: int = MAX_IMAGE_BYTES + MULTIPART_OVERHEAD,
+                 paths: List[Pattern] = UPLOAD_PATHS):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (scope["type"] != "http" or scope["method"] != "POST"
+                or not any(pattern.match(scope["path"]) for pattern in self.paths)):
+            await self.app(scope, receive, send)
+            return
+        length = Headers(scope=scope).get("content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await _too_large(send, self.max_bytes)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message: Message):
+            nonlocal started
+            # 表單解析失敗會被 FastAPI 轉成 400，本體超過上限時改回 413
+            if exceeded:
+                if message["type"] == "http.response.start" and not started:
+                    started = True
+                    await _too_large(send, self.max_bytes)
+                return
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if not started:
+                await _too_large(send, self.max_bytes)
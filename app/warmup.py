@@ -0,0 +1,143 @@
+"""啟動預熱：開好連線池、設定 mapper、建立序列化器並預先填好熱門路由的快取
+
+預熱在 lifespan 啟動後於背景執行，伺服器可以先接受連線；/health/ready 在預熱完成前回 503，
+負載平衡器與滾動部署會等 worker 真正熱好才導入流量。資料庫暫時無法連線時每隔幾秒重試。
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import configure_mappers, sessionmaker
+
+from . import crud, dedup, extraction, facets
+from .cache import slug_cache
+
+ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+RETRY_INTERVAL = 5.0
+# 以行程內的 ASGI 請求走過一次完整路徑：路由、驗證、序列化、SQL 編譯快取與回應快取
+WARM_PATHS = [
+    "/news/hot/",
+    "/news/featured/",
+    "/news/?limit=10",
+    "/news/?limit=10&fields=full",
+]
+WARM_TEXT = "預熱用的內容，" * 20
+
+_imported_at = time.monotonic()
+
+
+class WarmupState:
+    def __init__(self):
+        self.ready = False
+        self.attempts = 0
+        self.steps: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.ready_after: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "steps_ms": self.steps,
+            "error": self.error,
+            "ready_after_s": self.ready_after,
+        }
+
+
+state = WarmupState()
+
+
+def _timed(name: str, fn: Callable, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    state.steps[name] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def open_pool(engine: Engine):
+    """同時開滿連線池的常駐連線，關閉後留在池中供請求使用"""
+    size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    with ThreadPoolExecutor(max_workers=size) as executor:
+        connections = list(executor.map(lambda _: engine.connect(), range(size)))
+    for conn in connections:
+        conn.exec_driver_sql("SELECT 1")
+        conn.close()
+
+
+def prime_caches(session_factory: sessionmaker):
+    """載入熱門與精選新聞的 slug、近似重複索引、分面 bitmap 與實體抽取器，並載入延後匯入的模組"""
+    db = session_factory()
+    try:
+        for news in crud.get_hot_news(db, 50) + crud.get_featured_news(db, 50):
+            slug_cache.put(news.slug, news.id)
+        dedup.get_index(db)
+        facets.get_index(db)
+    finally:
+        db.close()
+    extraction.get_extractor()
+    dedup.simhash(WARM_TEXT)
+
+
+async def _asgi_get(app, path: str) -> Optional[int]:
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"warmup"), (b"accept-encoding", b"br, gzip")],
+        "client": ("127.0.0.1", 0),
+        "server": ("warmup", 80),
+    }
+    status = None
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def warm_up(app, engine: Engine, session_factory: sessionmaker):
+    while True:
+        state.attempts += 1
+        try:
+            await asyncio.to_thread(_timed, "configure_mappers", configure_mappers)
+            await asyncio.to_thread(_timed, "open_pool", open_pool, engine)
+            await asyncio.to_thread(_timed, "prime_caches", prime_caches, session_factory)
+            _timed("openapi", app.openapi)
+            start = time.perf_counter()
+            for path in WARM_PATHS:
+                status = await _asgi_get(app, path)
+                if status != 200:
+                    raise RuntimeError(f"{path} 回應 {status}")
+            state.steps["warm_requests"] = round((time.perf_counter() - start) * 1000, 1)
+            break
+        except Exception as e:
+            state.error = str(e)
+            print(f"預熱失敗，{RETRY_INTERVAL:.0f} 秒後重試: {e}")
+            await asyncio.sleep(RETRY_INTERVAL)
+    state.error = None
+    state.ready = True
+    state.ready_after = round(time.monotonic() - _imported_at, 3)
+    print(f"預熱完成，載入模組後 {state.ready_after} 秒可服務: {state.steps}")
+
+
+def start(app, engine: Engine, session_factory: sessionmaker) -> Optional[asyncio.Task]:
+    if not ENABLED:
+        state.ready = True
+        return None
+    return asyncio.create_task(warm_up(app, engine, session_factory))
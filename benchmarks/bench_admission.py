@@ -0,0 +1,91 @@
+"""准入控制在過載下的延遲基準測試
+
+以一個模擬慢查詢的 ASGI 應用代替 /search/，比較有無 AdmissionMiddleware 時在大量並行請求下
+被接受請求的延遲，以及被拒絕請求回應得有多快：
+    python -m benchmarks.bench_admission --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import re
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+from app.admission import AdmissionMiddleware, MemoryBucketStore, Rule
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def make_backend(service_time: float, capacity: int):
+    """同時只能服務 capacity 個請求的後端，模擬資料庫連線池"""
+    pool = asyncio.Semaphore(capacity)
+
+    async def app(scope, receive, send):
+        async with pool:
+            await asyncio.sleep(service_time)
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", b"2")]})
+        await send({"type": "http.response.body", "body": b"[]"})
+
+    return app
+
+
+async def run(app, concurrency: int, requests: int, clients: int):
+    latencies = {}
+    statuses = Counter()
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker(client: httpx.AsyncClient):
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.get("/search/", params={"q": "湖人"},
+                                        headers={"x-forwarded-for": f"10.0.0.{i % clients}"})
+            latencies.setdefault(response.status_code, []).append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    for status in sorted(latencies):
+        values = latencies[status]
+        print(f"  {status}: {statuses[status]:>6} 次，p50 {statistics.median(values) * 1000:7.1f} ms，"
+              f"p99 {_percentile(values, 99) * 1000:7.1f} ms")
+    print(f"  總耗時 {elapsed:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=20, help="模擬的客戶端 IP 數")
+    parser.add_argument("--service-time", type=float, default=0.01, help="每個請求佔用後端的秒數")
+    parser.add_argument("--capacity", type=int, default=4, help="後端可同時服務的請求數")
+    args = parser.parse_args()
+
+    import app.admission as admission
+    admission.TRUST_PROXY = True
+    rules = [Rule("search", re.compile(r"^/search/$"), ("GET",), rate=50, burst=100,
+                  max_concurrency=args.capacity)]
+
+    print("無准入控制：")
+    asyncio.run(run(make_backend(args.service_time, args.capacity),
+                    args.concurrency, args.requests, args.clients))
+    print("有准入控制：")
+    guarded = AdmissionMiddleware(make_backend(args.service_time, args.capacity), rules=rules,
+                                  store=MemoryBucketStore())
+    asyncio.run(run(guarded, args.concurrency, args.requests, args.clients))
+
+
+if __name__ == "__main__":
+    main()
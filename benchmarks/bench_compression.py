@@ -0,0 +1,79 @@
+"""各路由回應壓縮的位元組節省與 CPU 成本
+
+用法:
+    python -m benchmarks.bench_compression --articles 200 --length 2000
+"""
+import argparse
+import time
+
+from fastapi.testclient import TestClient
+
+from app import database
+from app.main import app
+from app.compression import COMPRESSORS, response_cache
+from benchmarks.common import seed_articles, sqlite_session
+
+ROUTES = [
+    "/news/?limit=20",
+    "/news/hot/",
+    "/news/featured/",
+    "/categories/nba/news/?limit=20",
+    "/tags/tag1/news/?limit=20",
+    "/search/?q=湖人&limit=20",
+    "/news/news-1",
+]
+
+
+def _best_time(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=200)
+    parser.add_argument("--length", type=int, default=2000, help="每篇文章的字數")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    _, Session = sqlite_session()
+    db = Session()
+    seed_articles(db, args.articles, args.length)
+    db.close()
+
+    def override():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[database.get_db] = override
+    client = TestClient(app)
+
+    print(f"{'路由':<34}{'原始':>10}" + "".join(f"{name:>22}" for name in COMPRESSORS))
+    for route in ROUTES:
+        body = client.get(route, headers={"Accept-Encoding": "identity"}).content
+        cells = []
+        for name, compress in COMPRESSORS.items():
+            size = len(compress(body))
+            cost = _best_time(lambda: compress(body), args.repeat)
+            cells.append(f"{size:>8} ({1 - size / len(body):>4.0%}) {cost * 1000:>6.2f}ms")
+        print(f"{route:<34}{len(body):>10}" + "".join(f"{cell:>22}" for cell in cells))
+
+    # 快取命中時直接送出已壓縮的位元組
+    route = ROUTES[0]
+    response_cache.clear()
+    for encoding in COMPRESSORS:
+        miss = _best_time(lambda: (response_cache.clear(), client.get(route, headers={"Accept-Encoding": encoding})), 5)
+        client.get(route, headers={"Accept-Encoding": encoding})
+        hit = _best_time(lambda: client.get(route, headers={"Accept-Encoding": encoding}), args.repeat)
+        print(f"{route} {encoding}: 未命中 {miss * 1000:.2f} ms，命中已壓縮快取 {hit * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""實體抽取吞吐量基準測試
+
+用法:
+    python -m benchmarks.bench_extraction --articles 5000 --length 1500
+"""
+import argparse
+import random
+import time
+
+from app.extraction import EntityExtractor
+from app.gazetteer import GAZETTEER
+
+FILLER = "本季例行賽進入最後階段球隊在主場以些微差距擊敗對手替補群表現亮眼教練賽後表示防守是關鍵"
+
+
+def make_article(rng: random.Random, length: int, aliases):
+    parts = []
+    size = 0
+    while size < length:
+        chunk = FILLER[rng.randrange(len(FILLER) // 2):]
+        if rng.random() < 0.3:
+            chunk += rng.choice(aliases)
+        parts.append(chunk)
+        size += len(chunk)
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=5000)
+    parser.add_argument("--length", type=int, default=1500, help="每篇文章的字數")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    aliases = [alias for entries in GAZETTEER.values() for names in entries.values() for alias in names]
+    articles = [
+        (make_article(rng, 40, aliases), make_article(rng, args.length, aliases))
+        for _ in range(args.articles)
+    ]
+
+    start = time.perf_counter()
+    extractor = EntityExtractor()
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    links = sum(len(extractor.extract(title, content)) for title, content in articles)
+    elapsed = time.perf_counter() - start
+
+    chars = sum(len(t) + len(c) for t, c in articles)
+    print(f"自動機建立: {build_time * 1000:.1f} ms")
+    print(f"文章數: {args.articles}，總字數: {chars}")
+    print(f"耗時: {elapsed:.3f} s，{args.articles / elapsed:.0f} 篇/秒，{chars / elapsed / 1e6:.2f} M 字/秒")
+    print(f"平均每篇實體數: {links / args.articles:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""列表頁卡片投影與完整新聞的比較：ORM 載入時間與 JSON 大小
+
+用法:
+    python -m benchmarks.bench_projection --articles 500 --length 4000 --limit 50
+"""
+import argparse
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+
+from app import crud, database
+from app.compression import response_cache
+from app.main import app
+from benchmarks.common import seed_articles, sqlite_session
+
+
+def _timed(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=500)
+    parser.add_argument("--length", type=int, default=4000, help="每篇文章的字數")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    _, Session = sqlite_session()
+    db = Session()
+    seed_articles(db, args.articles, args.length)
+    db.close()
+
+    def override():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[database.get_db] = override
+    client = TestClient(app)
+
+    def crud_load(fields):
+        session = Session()
+        try:
+            crud.get_recent_news(session, limit=args.limit, fields=fields)
+        finally:
+            session.close()
+
+    def request(fields):
+        response_cache.clear()
+        query = f"/news/?limit={args.limit}" + (f"&fields={fields}" if fields else "")
+        return client.get(query, headers={"Accept-Encoding": "identity"})
+
+    print(f"{args.articles} 篇文章，每篇 {args.length} 字，每頁 {args.limit} 篇")
+    results = {}
+    for label, fields, query_fields in [("完整", None, "full"), ("卡片", crud.CARD_FIELDS, None)]:
+        load = _timed(lambda: crud_load(fields), args.repeat)
+        total = _timed(lambda: request(query_fields), args.repeat)
+        size = len(request(query_fields).content)
+        results[label] = (load, total, size)
+        print(f"{label}: crud 載入 {load * 1000:.2f} ms，完整請求 {total * 1000:.2f} ms，JSON {size} bytes")
+
+    full, card = results["完整"], results["卡片"]
+    print(f"改善倍數: 載入 {full[0] / card[0]:.1f}x，請求 {full[1] / card[1]:.1f}x，JSON {full[2] / card[2]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
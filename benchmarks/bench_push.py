@@ -0,0 +1,130 @@
+"""推播扇出的連線數擴展基準測試
+
+行程內模式直接測量廣播器：
+    python -m benchmarks.bench_push --subscribers 100 1000 10000
+
+伺服器模式對執行中的 API 開啟 N 條 SSE 連線，發布一篇新聞後量測每條連線收到事件的延遲：
+    python -m benchmarks.bench_push --url http://127.0.0.1:8000 --connections 1000
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+import urllib.request
+import uuid
+from urllib.parse import urlparse
+
+from app.push import Broadcaster
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def bench_in_process(subscribers: int, events: int):
+    broadcaster = Broadcaster()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    subs = [broadcaster.subscribe() for _ in range(subscribers)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    memory = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    latencies = []
+
+    async def consume(sub):
+        for _ in range(events):
+            event = await sub.queue.get()
+            latencies.append(time.perf_counter() - event["data"]["sent"])
+
+    consumers = [asyncio.create_task(consume(sub)) for sub in subs]
+    fan_out = []
+    for _ in range(events):
+        start = time.perf_counter()
+        broadcaster.publish("created", {"sent": start})
+        fan_out.append(time.perf_counter() - start)
+        await asyncio.sleep(0)
+    await asyncio.gather(*consumers)
+
+    print(f"訂閱者 {subscribers:>6}: 每個訂閱者記憶體 {memory / subscribers:.0f} B，"
+          f"扇出 p50 {statistics.median(fan_out) * 1000:.2f} ms，"
+          f"送達延遲 p50 {_percentile(latencies, 50) * 1000:.2f} ms / p99 {_percentile(latencies, 99) * 1000:.2f} ms")
+
+
+async def _open_sse(host: str, port: int, ready: asyncio.Event, marker: str, received: list):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /news/stream HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+    await writer.drain()
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    ready.set()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b"data:") and marker.encode() in line:
+                received.append(time.perf_counter())
+                return
+    finally:
+        writer.close()
+
+
+def _post_news(url: str, title: str):
+    body = json.dumps({
+        "title": title,
+        "content": f"推播基準測試 {title}",
+        "category_name": "benchmark",
+    }).encode()
+    request = urllib.request.Request(f"{url}/news/", data=body, headers={"Content-Type": "application/json"})
+    urllib.request.urlopen(request).read()
+
+
+async def bench_server(url: str, connections: int, timeout: float):
+    parsed = urlparse(url)
+    marker = f"bench-{uuid.uuid4().hex[:8]}"
+    received = []
+    readies = [asyncio.Event() for _ in range(connections)]
+
+    start = time.perf_counter()
+    tasks = [
+        asyncio.create_task(_open_sse(parsed.hostname, parsed.port or 80, ready, marker, received))
+        for ready in readies
+    ]
+    await asyncio.gather(*(ready.wait() for ready in readies))
+    connect_time = time.perf_counter() - start
+
+    sent = time.perf_counter()
+    await asyncio.to_thread(_post_news, url, marker)
+    await asyncio.wait(tasks, timeout=timeout)
+    for task in tasks:
+        task.cancel()
+
+    latencies = [t - sent for t in received]
+    print(f"連線數 {connections}：建立連線 {connect_time:.2f} s，收到事件 {len(received)}/{connections}")
+    if latencies:
+        print(f"延遲 p50 {_percentile(latencies, 50) * 1000:.1f} ms / p99 {_percentile(latencies, 99) * 1000:.1f} ms "
+              f"/ max {max(latencies) * 1000:.1f} ms（包含 POST /news/ 本身）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--url", help="對執行中的伺服器測試 SSE 連線")
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench_server(args.url.rstrip("/"), args.connections, args.timeout))
+    else:
+        for subscribers in args.subscribers:
+            asyncio.run(bench_in_process(subscribers, args.events))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""API 行程的啟動時間基準測試
+
+--importtime 以 `python -X importtime` 列出載入 app.main 時累計耗時最多的模組；
+否則分別以有無預熱（WARMUP_ENABLED）啟動 uvicorn，量測第一個回應、/health/ready 轉為 200，
+以及 /news/hot/ 延遲首次低於 --fast-ms 所需的時間：
+    python -m benchmarks.bench_startup --importtime
+    DATABASE_URL=sqlite:////tmp/seed.db python -m benchmarks.bench_startup --runs 3
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def importtime(top: int):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    rows.sort(reverse=True)
+    print(f"{'累計 ms':>9} {'自身 ms':>9}  模組")
+    for cumulative_us, self_us, name in rows[:top]:
+        print(f"{cumulative_us / 1000:9.1f} {self_us / 1000:9.1f}  {name}")
+
+
+def _wait(client: httpx.Client, path: str, deadline: float, check) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            start = time.perf_counter()
+            response = client.get(path)
+            if check(response, time.perf_counter() - start):
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{path} 逾時")
+
+
+def startup(port: int, warmup: bool, fast_ms: float, timeout: float):
+    env = dict(os.environ, WARMUP_ENABLED="1" if warmup else "0", RATE_LIMIT_ENABLED="0")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                                "--log-level", "warning"], env=env)
+    deadline = start + timeout
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            first = _wait(client, "/health/live", deadline, lambda r, _: r.status_code == 200)
+            ready = _wait(client, "/health/ready", deadline, lambda r, _: r.status_code == 200)
+            fast = _wait(client, "/news/hot/", deadline,
+                         lambda r, elapsed: r.status_code == 200 and elapsed * 1000 < fast_ms)
+    finally:
+        process.terminate()
+        process.wait()
+    return first - start, ready - start, fast - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--importtime", action="store_true", help="只列出載入模組的耗時")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fast-ms", type=float, default=20.0, help="視為已熱的 /news/hot/ 延遲")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    if args.importtime:
+        importtime(args.top)
+        return
+
+    for warmup in (False, True):
+        results = [startup(args.port, warmup, args.fast_ms, args.timeout) for _ in range(args.runs)]
+        first, ready, fast = (statistics.median(column) for column in zip(*results))
+        print(f"{'有' if warmup else '無'}預熱：第一個回應 {first * 1000:7.1f} ms，"
+              f"就緒 {ready * 1000:7.1f} ms，第一個快速回應 {fast * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
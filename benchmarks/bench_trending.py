@@ -0,0 +1,93 @@
+"""熱門統計的準確度與成本：Space-Saving 摘要（單一行程與多個 worker 合併）對照精確計數
+
+以 Zipf 分布產生瀏覽，每次瀏覽帶數個標籤，量測 record 的吞吐量、top 的延遲（合併後快取命中與未命中），
+以及前 k 名與精確計數的重疊率、計數誤差是否落在 [count - error, count] 之內：
+    python -m benchmarks.bench_trending --views 200000 --items 20000
+    python -m benchmarks.bench_trending --workers 4 --capacity 100
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+from app import trending
+from app.trending import SpaceSaving, TrendingTracker
+
+
+def make_stream(views: int, items: int, per_view: int, skew: float, seed: int = 1):
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) ** skew for i in range(items)]
+    keys = rng.choices(range(items), weights, k=views * per_view)
+    return [keys[i:i + per_view] for i in range(0, len(keys), per_view)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--views", type=int, default=200_000)
+    parser.add_argument("--items", type=int, default=20_000, help="不同標籤的數量")
+    parser.add_argument("--per-view", type=int, default=3, help="每篇新聞的標籤數")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf 指數")
+    parser.add_argument("--capacity", type=int, default=trending.CAPACITY)
+    parser.add_argument("--workers", type=int, default=4, help="模擬的 worker 數（以快照合併）")
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    stream = make_stream(args.views, args.items, args.per_view, args.skew)
+    exact = Counter(key for keys in stream for key in keys)
+    expected = [key for key, _ in exact.most_common(args.k)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        trackers = []
+        for worker in range(args.workers):
+            tracker = TrendingTracker(directory, args.capacity)
+            tracker.snapshot_path = os.path.join(directory, f"worker-{worker}.json")
+            trackers.append(tracker)
+
+        started = time.perf_counter()
+        for i, keys in enumerate(stream):
+            tracker = trackers[i % args.workers]
+            tracker.record([(key, {"name": str(key)}) for key in keys], ())
+            # 背景執行緒每秒併入一次，這裡每 1000 次瀏覽併入一次
+            if i % 1000 == 999:
+                tracker.fold()
+        for tracker in trackers:
+            tracker.fold()
+        elapsed = time.perf_counter() - started
+        print(f"{args.views} 次瀏覽、{args.items} 個標籤、{args.workers} 個 worker，摘要容量 {args.capacity}")
+        print(f"記錄：{args.views / elapsed:,.0f} 次瀏覽/秒（{elapsed / args.views * 1e6:.1f} 微秒/次，含併入）")
+
+        for tracker in trackers[1:]:
+            tracker.snapshot()
+        main_tracker = trackers[0]
+        started = time.perf_counter()
+        main_tracker.load_peers()
+        loaded = time.perf_counter() - started
+
+        started = time.perf_counter()
+        top = main_tracker.top("tags", "1h", args.k)
+        miss = time.perf_counter() - started
+        repeat = 10_000
+        started = time.perf_counter()
+        for _ in range(repeat):
+            main_tracker.top("tags", "1h", args.k)
+        hit = (time.perf_counter() - started) / repeat
+        print(f"讀入 {args.workers - 1} 個快照 {loaded * 1000:.1f} ms，"
+              f"top {args.k}：合併 {miss * 1000:.2f} ms，快取命中 {hit * 1e6:.1f} 微秒")
+
+    single = SpaceSaving(args.capacity)
+    for keys in stream:
+        for key in keys:
+            single.add(key)
+    for label, results in (("單一摘要", [(key, count, error) for key, count, error in single.top(args.k)]),
+                           ("合併摘要", [(item["id"], item["count"], item["error"]) for item in top])):
+        overlap = len({key for key, _, _ in results} & set(expected)) / args.k
+        bounded = sum(count - error <= exact[key] <= count for key, count, error in results)
+        worst = max((count - exact[key]) / exact[key] for key, count, _ in results)
+        print(f"{label}：前 {args.k} 名重疊 {overlap:.0%}，誤差界內 {bounded}/{len(results)}，"
+              f"最大高估 {worst:.2%}")
+
+
+if __name__ == "__main__":
+    main()
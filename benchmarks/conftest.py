@@ -0,0 +1,97 @@
+"""pytest-benchmark 回歸測試的資料集與用戶端
+
+每個資料集以 scripts/seed_data.py 的批次寫入建立，依 --bench-sizes 指定的規模各跑一次；
+指定 --bench-postgres（或 BENCH_DATABASE_URL）時另外對 PostgreSQL 再跑一輪。
+"""
+import os
+
+# 必須在匯入 app.main 之前設定：基準測試量的是處理請求本身，不是限流或回應快取
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("RESPONSE_CACHE_TTL", "0")
+
+from typing import NamedTuple
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import dedup, facets, models
+from app.cache import slug_cache
+from scripts.seed_data import seed
+
+
+class Dataset(NamedTuple):
+    backend: str
+    size: int
+    engine: Engine
+    Session: sessionmaker
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("nba-news benchmarks")
+    group.addoption("--bench-sizes", default="1000,10000", help="以逗號分隔的資料集新聞數")
+    group.addoption("--bench-postgres", default=os.getenv("BENCH_DATABASE_URL"),
+                    help="另外對這個 PostgreSQL 資料庫執行（既有資料表會被清除）")
+
+
+def pytest_generate_tests(metafunc):
+    if "dataset" not in metafunc.fixturenames:
+        return
+    sizes = [int(size) for size in metafunc.config.getoption("--bench-sizes").split(",")]
+    backends = ["sqlite"] + (["postgresql"] if metafunc.config.getoption("--bench-postgres") else [])
+    params = [(backend, size) for backend in backends for size in sizes]
+    metafunc.parametrize("dataset", params, ids=[f"{b}-{s}" for b, s in params],
+                         indirect=True, scope="session")
+
+
+@pytest.fixture(scope="session")
+def dataset(request):
+    backend, size = request.param
+    if backend == "sqlite":
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    else:
+        engine = create_engine(request.config.getoption("--bench-postgres"))
+        models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    seed(engine, articles=size, batch=10_000, tags=200, entities=300, tags_per_article=4,
+         entities_per_article=3, image_ratio=0.05, days=365, paragraphs=6, fingerprints=False, seed_value=42)
+
+    # 行程內的指紋索引與 slug 快取屬於前一個資料集，換資料集時重設
+    dedup.reset()
+    facets.reset()
+    slug_cache.clear()
+
+    yield Dataset(backend, size, engine, sessionmaker(bind=engine, autoflush=False))
+    if backend == "postgresql":
+        models.Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(dataset):
+    session = dataset.Session()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(dataset):
+    from fastapi.testclient import TestClient
+
+    from app import database, main
+
+    def override():
+        session = dataset.Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    main.app.dependency_overrides[database.get_db] = override
+    # 不使用 with，避免 lifespan 啟動連到正式資料庫的背景工作
+    yield TestClient(main.app)
+    main.app.dependency_overrides.pop(database.get_db, None)
@@ -0,0 +1,433 @@
+"""依情境組合對執行中的 API 施加負載，輸出每條路由的延遲與吞吐量報告
+
+啟動時先從 API 取得一批新聞、標籤與實體作為請求參數，之後依權重抽取情境；
+熱門新聞與標籤以 Zipf 分布抽取，接近真實流量。兩種模式：
+    # 封閉模式：固定 50 個並行使用者
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --concurrency 50 --duration 60
+    # 開放模式：每秒 200 個請求（依預定送出時間計算延遲，不受伺服器變慢影響）
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 --rate 200 --duration 60 --report report.json
+
+搭配 scripts/seed_data.py 的資料使用；伺服器需以 RATE_LIMIT_ENABLED=0 啟動，否則大部分請求會被限流。
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import accumulate
+from typing import Awaitable, Callable, Dict, List, NamedTuple
+from urllib.parse import urlparse
+
+import httpx
+
+from benchmarks.common import SENTENCES, make_text
+from scripts.seed_data import TOPICS, make_png
+
+
+class Catalog(NamedTuple):
+    news: List[Dict]
+    image_ids: List[int]
+    tags: List[str]
+    categories: List[str]
+    entities: List[Dict]
+    terms: List[str]
+    media: List[str]
+
+
+async def discover(client: httpx.AsyncClient, pages: int, media: List[str] = ()) -> Catalog:
+    """從 API 取得請求參數；列表依時間排序，越前面的新聞在 Zipf 抽樣中越熱門
+
+    爬蟲下載的媒體檔沒有列表 API，雜湊由 --media-file 提供（例如 SELECT sha256 FROM media_assets 的結果）。
+    """
+    news, image_ids, tags, categories = [], [], {}, {}
+    for page in range(pages):
+        response = await client.get("/news/", params={
+            "limit": 100, "skip": page * 100, "fields": "id,slug,published_at,tags,category,image_url",
+        })
+        response.raise_for_status()
+        items = response.json()["items"]
+        if not items:
+            break
+        for item in items:
+            news.append(item)
+            if item.get("image_url"):
+                image_ids.append(item["id"])
+            for tag in item.get("tags") or []:
+                tags[tag["slug"]] = tags.get(tag["slug"], 0) + 1
+            if item.get("category"):
+                categories[item["category"]["slug"]] = True
+    if not news:
+        raise SystemExit("API 沒有任何新聞，請先執行 scripts/seed_data.py")
+    entities = []
+    for entity_type in ("team", "player"):
+        response = await client.get(f"/entities/{entity_type}/")
+        if response.status_code == 200:
+            entities.extend(response.json()[:200])
+    terms = TOPICS + [entity["name"] for entity in entities[:30]]
+    return Catalog(news, image_ids, sorted(tags, key=tags.get, reverse=True), list(categories), entities, terms,
+                   list(media))
+
+
+@lru_cache(maxsize=None)
+def _zipf_cum_weights(n: int, exponent: float) -> List[float]:
+    return list(accumulate(1.0 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def zipf_choice(rng: random.Random, items: List, exponent: float = 1.1):
+    """從排序過的清單依 Zipf 分布抽取（越前面越常被抽到）"""
+    return rng.choices(items, cum_weights=_zipf_cum_weights(len(items), exponent))[0]
+
+
+Scenario = Callable[[httpx.AsyncClient, Catalog, random.Random], Awaitable[int]]
+
+
+async def _get(client, path, **params) -> int:
+    return (await client.get(path, params=params)).status_code
+
+
+async def home(client, catalog, rng):
+    return await _get(client, "/")
+
+
+async def news_list(client, catalog, rng):
+    return await _get(client, "/news/", limit=20, skip=rng.choice([0, 0, 0, 20, 40]))
+
+
+async def news_list_full(client, catalog, rng):
+    return await _get(client, "/news/", limit=20, fields="full")
+
+
+async def hot(client, catalog, rng):
+    return await _get(client, "/news/hot/")
+
+
+async def featured(client, catalog, rng):
+    return await _get(client, "/news/featured/")
+
+
+async def article(client, catalog, rng):
+    return await _get(client, f"/news/{zipf_choice(rng, catalog.news)['slug']}")
+
+
+async def related(client, catalog, rng):
+    return await _get(client, f"/news/{zipf_choice(rng, catalog.news)['slug']}/related")
+
+
+async def category(client, catalog, rng):
+    return await _get(client, f"/categories/{rng.choice(catalog.categories)}/news/", limit=20)
+
+
+async def tag(client, catalog, rng):
+    return await _get(client, f"/tags/{zipf_choice(rng, catalog.tags)}/news/", limit=20)
+
+
+async def search(client, catalog, rng):
+    return await _get(client, "/search/", q=rng.choice(catalog.terms), limit=10)
+
+
+async def entity_list(client, catalog, rng):
+    return await _get(client, f"/entities/{rng.choice(['team', 'player'])}/")
+
+
+async def entity_news(client, catalog, rng):
+    if not catalog.entities:
+        return await entity_list(client, catalog, rng)
+    entity = zipf_choice(rng, catalog.entities)
+    return await _get(client, f"/entities/{entity['entity_type']}/{entity['name']}/news/")
+
+
+async def analytics(client, catalog, rng):
+    return await _get(client, f"/analytics/news/{zipf_choice(rng, catalog.news)['id']}",
+                      granularity=rng.choice(["minute", "hour", "day"]))
+
+
+async def image(client, catalog, rng):
+    if not catalog.image_ids:
+        return await home(client, catalog, rng)
+    return await _get(client, f"/news/{rng.choice(catalog.image_ids)}/image")
+
+
+async def media(client, catalog, rng):
+    if not catalog.media:
+        # 沒有提供雜湊時量測找不到媒體檔的查詢
+        return await _get(client, f"/media/{rng.getrandbits(256):064x}")
+    return await _get(client, f"/media/{zipf_choice(rng, catalog.media)}")
+
+
+async def facets(client, catalog, rng):
+    params = rng.choice([
+        {},
+        {"category": rng.choice(catalog.categories)},
+        {"tag": zipf_choice(rng, catalog.tags)} if catalog.tags else {},
+        {"q": rng.choice(catalog.terms)},
+    ])
+    return await _get(client, "/facets", **params)
+
+
+async def trending(client, catalog, rng):
+    return await _get(client, f"/trending/{rng.choice(['tags', 'entities'])}", window=rng.choice(["1h", "24h"]))
+
+
+async def export(client, catalog, rng):
+    """匯出一篇熱門新聞發布當天的新聞，整個回應讀完才算完成"""
+    start = datetime.fromisoformat(zipf_choice(rng, catalog.news)["published_at"]).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    return await _get(client, "/export/news", format=rng.choice(["ndjson", "csv"]), include_content="false",
+                      start=start.isoformat(), end=(start + timedelta(days=1)).isoformat())
+
+
+async def admission(client, catalog, rng):
+    return await _get(client, "/admin/admission")
+
+
+async def create(client, catalog, rng):
+    response = await client.post("/news/", json={
+        "title": f"{rng.choice(SENTENCES)[:16]} {rng.getrandbits(48):x}",
+        "content": make_text(rng, 1200),
+        "summary": make_text(rng, 80),
+        "category_name": rng.choice(["NBA", "球隊", "交易"]),
+        "tags": [rng.choice(TOPICS) for _ in range(3)],
+    })
+    return response.status_code
+
+
+async def upload_image(client, catalog, rng):
+    news_id = zipf_choice(rng, catalog.news)["id"]
+    files = {"image": ("thumb.png", make_png(rng, 160, 90), "image/png")}
+    return (await client.post(f"/news/{news_id}/image", files=files)).status_code
+
+
+async def attach_entity(client, catalog, rng):
+    if not catalog.entities:
+        return await entity_list(client, catalog, rng)
+    entity = rng.choice(catalog.entities)
+    response = await client.post(
+        f"/news/{zipf_choice(rng, catalog.news)['id']}/entity/",
+        params={"role": "mentioned"},
+        json={"name": entity["name"], "entity_type": entity["entity_type"]},
+    )
+    return response.status_code
+
+
+async def attach_entities(client, catalog, rng):
+    if not catalog.entities:
+        return await entity_list(client, catalog, rng)
+    items = [
+        {"news_id": rng.choice(catalog.news)["id"], "name": entity["name"],
+         "entity_type": entity["entity_type"], "role": "mentioned"}
+        for entity in rng.sample(catalog.entities, min(5, len(catalog.entities)))
+    ]
+    return (await client.post("/news/entities/", json={"items": items})).status_code
+
+
+async def stream(client, catalog, rng):
+    """SSE：量到收到回應標頭為止"""
+    async with client.stream("GET", "/news/stream") as response:
+        return response.status_code
+
+
+async def websocket(client, catalog, rng):
+    """WebSocket：量到握手完成為止"""
+    import websockets
+
+    url = urlparse(str(client.base_url))
+    scheme = "wss" if url.scheme == "https" else "ws"
+    async with websockets.connect(f"{scheme}://{url.netloc}/ws/news"):
+        return 101
+
+
+# 情境與權重，涵蓋 app/main.py 中除了健康檢查與 /admin/jobs、/admin/queries 以外的每一條路由
+SCENARIOS: Dict[str, tuple] = {
+    "GET /": (home, 1),
+    "GET /news/": (news_list, 20),
+    "GET /news/?fields=full": (news_list_full, 2),
+    "GET /news/hot/": (hot, 8),
+    "GET /news/featured/": (featured, 5),
+    "GET /news/{slug}": (article, 25),
+    "GET /news/{slug}/related": (related, 5),
+    "GET /categories/{slug}/news/": (category, 5),
+    "GET /tags/{slug}/news/": (tag, 8),
+    "GET /search/": (search, 5),
+    "GET /facets": (facets, 3),
+    "GET /trending/{kind}": (trending, 3),
+    "GET /entities/{type}/": (entity_list, 1),
+    "GET /entities/{type}/{name}/news/": (entity_news, 3),
+    "GET /analytics/news/{id}": (analytics, 2),
+    "GET /news/{id}/image": (image, 3),
+    "GET /media/{sha256}": (media, 3),
+    "GET /export/news": (export, 0.2),
+    "GET /admin/admission": (admission, 0.2),
+    "POST /news/": (create, 1),
+    "POST /news/{id}/image": (upload_image, 0.3),
+    "POST /news/{id}/entity/": (attach_entity, 0.3),
+    "POST /news/entities/": (attach_entities, 0.3),
+    "GET /news/stream": (stream, 0.2),
+    "WS /ws/news": (websocket, 0.2),
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    def record(self, name: str, latency: float, status: int):
+        if not self.recording:
+            return
+        self.latencies[name].append(latency)
+        self.statuses[name][status] += 1
+        if status == 0 or status >= 500:
+            self.errors[name] += 1
+
+
+async def _execute(name: str, client, catalog, rng, recorder: Recorder, started: float):
+    scenario = SCENARIOS[name][0]
+    try:
+        status = await scenario(client, catalog, rng)
+    except Exception:
+        status = 0
+    recorder.record(name, time.perf_counter() - started, status)
+
+
+def _pick(rng: random.Random, names: List[str], weights: List[float]) -> str:
+    return rng.choices(names, weights)[0]
+
+
+async def run_closed(client, catalog, recorder, names, weights, concurrency, duration, seed):
+    deadline = time.perf_counter() + duration
+
+    async def user(index: int):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < deadline:
+            await _execute(_pick(rng, names, weights), client, catalog, rng, recorder, time.perf_counter())
+
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+
+
+async def run_open(client, catalog, recorder, names, weights, rate, duration, seed):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    scheduled = start
+    tasks = set()
+    while scheduled < start + duration:
+        scheduled += rng.expovariate(rate)
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # 延遲從預定送出時間算起，避免協調遺漏（coordinated omission）
+        task = asyncio.create_task(_execute(_pick(rng, names, weights), client, catalog,
+                                            random.Random(rng.random()), recorder, scheduled))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def summarize(recorder: Recorder, duration: float) -> Dict:
+    routes = {}
+    for name in SCENARIOS:
+        values = recorder.latencies.get(name)
+        if not values:
+            continue
+        routes[name] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(name, 0),
+            "statuses": dict(recorder.statuses[name]),
+            "rps": len(values) / duration,
+            "p50_ms": statistics.median(values) * 1000,
+            "p90_ms": _percentile(values, 90) * 1000,
+            "p99_ms": _percentile(values, 99) * 1000,
+            "max_ms": max(values) * 1000,
+        }
+    everything = [v for values in recorder.latencies.values() for v in values]
+    total = {
+        "requests": len(everything),
+        "errors": sum(recorder.errors.values()),
+        "rps": len(everything) / duration,
+        "p50_ms": statistics.median(everything) * 1000 if everything else None,
+        "p99_ms": _percentile(everything, 99) * 1000 if everything else None,
+    }
+    return {"routes": routes, "total": total}
+
+
+def print_report(summary: Dict):
+    print(f"{'路由':<36} {'請求':>7} {'錯誤':>5} {'rps':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for name, row in summary["routes"].items():
+        print(f"{name:<36} {row['requests']:>7} {row['errors']:>5} {row['rps']:>8.1f} "
+              f"{row['p50_ms']:>8.1f} {row['p90_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}")
+    total = summary["total"]
+    if total["requests"]:
+        print(f"合計 {total['requests']} 個請求、{total['errors']} 個錯誤，{total['rps']:.1f} rps，"
+              f"p50 {total['p50_ms']:.1f} ms，p99 {total['p99_ms']:.1f} ms")
+
+
+async def main_async(args):
+    names = [name for name in SCENARIOS if not args.only or any(o in name for o in args.only)]
+    weights = [SCENARIOS[name][1] for name in names]
+    if args.read_only:
+        keep = [i for i, name in enumerate(names) if not name.startswith("POST")]
+        names, weights = [names[i] for i in keep], [weights[i] for i in keep]
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        media_hashes = []
+        if args.media_file:
+            with open(args.media_file, encoding="utf-8") as f:
+                media_hashes = [line.strip() for line in f if line.strip()]
+        catalog = await discover(client, args.discover_pages, media_hashes)
+        print(f"取得 {len(catalog.news)} 篇新聞、{len(catalog.tags)} 個標籤、{len(catalog.entities)} 個實體")
+
+        recorder = Recorder()
+        if args.rate:
+            run = lambda duration: run_open(client, catalog, recorder, names, weights, args.rate, duration, args.seed)
+        else:
+            run = lambda duration: run_closed(client, catalog, recorder, names, weights,
+                                              args.concurrency, duration, args.seed)
+        if args.warmup:
+            await run(args.warmup)
+        recorder.recording = True
+        started = time.perf_counter()
+        await run(args.duration)
+        elapsed = time.perf_counter() - started
+
+    summary = summarize(recorder, elapsed)
+    print_report(summary)
+    if args.report:
+        config = {k: v for k, v in vars(args).items() if k != "report"}
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "config": config, **summary},
+                      f, ensure_ascii=False, indent=2)
+        print(f"報告已寫入 {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=20, help="封閉模式的並行使用者數")
+    parser.add_argument("--rate", type=float, help="開放模式每秒請求數（指定時忽略 --concurrency）")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--warmup", type=float, default=5.0, help="先跑幾秒不記錄")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP 連線池大小")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--discover-pages", type=int, default=10, help="啟動時讀取幾頁新聞作為請求參數")
+    parser.add_argument("--media-file", help="每行一個媒體檔的 sha256，供 GET /media/{sha256} 情境使用")
+    parser.add_argument("--only", nargs="+", help="只執行名稱包含這些字串的情境")
+    parser.add_argument("--read-only", action="store_true", help="不執行寫入類情境")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--report", help="把結果寫成 JSON 檔，方便比較不同版本")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""crud 熱路徑的基準測試"""
+import itertools
+import random
+from datetime import datetime
+
+import pytest
+
+from app import analytics, crud, facets
+from benchmarks.common import make_text
+
+
+def test_add_news(benchmark, db):
+    rng = random.Random(7)
+    counter = itertools.count()
+
+    def setup():
+        i = next(counter)
+        kwargs = {
+            "title": f"基準測試新聞 {i} {rng.getrandbits(32):x}",
+            "content": make_text(rng, 1500),
+            "summary": make_text(rng, 80),
+            "published_at": datetime.now(),
+            "category_name": "NBA",
+            "tags": ["三分球0", "防守1", f"基準測試{i % 5}"],
+        }
+        return (db,), kwargs
+
+    benchmark.pedantic(crud.add_news, setup=setup, rounds=30, iterations=1)
+
+
+def test_get_hot_news(benchmark, db):
+    result = benchmark(crud.get_hot_news, db, 5)
+    assert len(result) == 5
+
+
+@pytest.mark.parametrize("tag_slug", ["topic-0", "topic-150"], ids=["head", "tail"])
+def test_get_news_by_tag(benchmark, db, tag_slug):
+    benchmark(crud.get_news_by_tag, db, tag_slug, limit=20, fields=crud.CARD_FIELDS)
+
+
+@pytest.mark.parametrize("term", ["防守", "查無此詞"], ids=["common", "missing"])
+def test_search_news(benchmark, db, term):
+    benchmark(crud.search_news, db, term, limit=10)
+
+
+def test_flush_views(benchmark, dataset):
+    """背景執行緒寫入 1000 次瀏覽：原始事件、彙總與 news_metrics.view_count"""
+    recorder = analytics.ViewRecorder(dataset.engine)
+    rng = random.Random(7)
+
+    def setup():
+        for _ in range(1000):
+            recorder.record(rng.randint(1, dataset.size))
+
+    benchmark.pedantic(recorder.flush, setup=setup, rounds=20, iterations=1)
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"tags": ["topic-0"]},
+    {"tags": ["topic-0", "topic-1"], "entities": [1]},
+    {"start": datetime(2025, 1, 1, 12), "category": "teams"},
+], ids=["unfiltered", "tag", "drilldown", "range"])
+def test_get_facets(benchmark, db, filters):
+    facets.get_index(db)
+    result = benchmark(facets.get_facets, db, limit=20, **filters)
+    assert result["total"] > 0
@@ -0,0 +1,64 @@
+"""透過 TestClient 的完整請求基準測試（路由、驗證、序列化與中介層都包含在內）"""
+import itertools
+import random
+
+import pytest
+
+from app import models
+from benchmarks.common import make_text
+from scripts.seed_data import make_png
+
+
+@pytest.mark.parametrize("path", [
+    "/",
+    "/news/?limit=20",
+    "/news/?limit=20&fields=full",
+    "/news/hot/",
+    "/news/featured/",
+    "/tags/topic-0/news/?limit=20",
+    "/search/?q=防守",
+])
+def test_get(benchmark, client, path):
+    response = benchmark(client.get, path)
+    assert response.status_code == 200
+
+
+def test_get_news_by_slug(benchmark, client, dataset):
+    response = benchmark(client.get, f"/news/seed-{dataset.size // 2}")
+    assert response.status_code == 200
+
+
+def test_download_image(benchmark, client, db):
+    news_id = db.query(models.NewsImage.news_id).limit(1).scalar()
+    response = benchmark(client.get, f"/news/{news_id}/image")
+    assert response.status_code == 200
+
+
+def test_upload_image(benchmark, client, dataset):
+    image = make_png(random.Random(3), 320, 180)
+    news_id = dataset.size // 3
+
+    def upload():
+        return client.post(f"/news/{news_id}/image", files={"image": ("thumb.png", image, "image/png")})
+
+    response = benchmark(upload)
+    assert response.status_code == 200
+
+
+def test_create_news(benchmark, client):
+    rng = random.Random(11)
+    counter = itertools.count()
+
+    def setup():
+        i = next(counter)
+        body = {
+            "title": f"湖人擊敗勇士 基準測試 {i} {rng.getrandbits(32):x}",
+            "content": make_text(rng, 1500),
+            "summary": make_text(rng, 80),
+            "category_name": "NBA",
+            "tags": ["三分球0", f"基準測試{i % 5}"],
+        }
+        return ("/news/",), {"json": body}
+
+    response = benchmark.pedantic(client.post, setup=setup, rounds=30, iterations=1)
+    assert response.status_code == 200
@@ -0,0 +1,171 @@
+"""原始頁面封存：抓取到的 HTML 以 WARC 格式寫入壓縮的分段檔，並記錄每筆的位移索引
+
+每筆 WARC resource 記錄各自壓縮成獨立的 zstd frame（未安裝 zstandard 時為 gzip member，即一般的
+.warc.gz），所以只要知道位移與長度就能單獨解壓任何一筆，整個檔案仍可被標準工具依序讀取。
+分段檔超過 SEGMENT_BYTES 時換下一個檔案；每個分段旁有一個 CDXJ 索引（每行「url 時間 {json}」），
+記錄該筆的 offset、length 與抓取策略。解析規則改變時由 reextract.py 讀取封存重新擷取，不需要重新抓取。
+"""
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # 未安裝時改寫 .warc.gz
+    zstandard = None
+
+ARCHIVE_DIR = os.getenv("CRAWLER_ARCHIVE_DIR", "archive")
+SEGMENT_BYTES = int(os.getenv("CRAWLER_ARCHIVE_SEGMENT_MB", "1024")) * 1024 * 1024
+ZSTD_LEVEL = 6
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class IndexEntry(NamedTuple):
+    url: str
+    fetched_at: str
+    segment: str
+    offset: int
+    length: int
+    strategy: str
+
+
+def _warc_record(url: str, html: str, fetched_at: datetime, strategy: str) -> bytes:
+    payload = html.encode()
+    digest = hashlib.sha1(payload).hexdigest()
+    headers = [
+        "WARC/1.1",
+        "WARC-Type: resource",
+        f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>",
+        f"WARC-Date: {fetched_at.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        f"WARC-Target-URI: {url}",
+        f"WARC-Payload-Digest: sha1:{digest}",
+        f"WARC-Fetch-Strategy: {strategy}",
+        "Content-Type: text/html; charset=utf-8",
+        f"Content-Length: {len(payload)}",
+    ]
+    return "\r\n".join(headers).encode() + b"\r\n\r\n" + payload + b"\r\n\r\n"
+
+
+def _compress(record: bytes) -> bytes:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(record)
+    return gzip.compress(record, mtime=0)
+
+
+def parse_record(data: bytes) -> Tuple[Dict[str, str], str]:
+    """解壓一筆記錄，回傳 (WARC 標頭, HTML)"""
+    if data[:4] == ZSTD_MAGIC:
+        # 寫入時一定帶有內容大小，可以直接解壓
+        record = zstandard.ZstdDecompressor().decompress(data)
+    elif data[:2] == GZIP_MAGIC:
+        record = gzip.decompress(data)
+    else:
+        raise ValueError("無法辨識的記錄壓縮格式")
+    head, _, body = record.partition(b"\r\n\r\n")
+    lines = head.decode().split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:])
+    length = int(headers["Content-Length"])
+    return headers, body[:length].decode()
+
+
+class ArchiveWriter:
+    """把抓取到的頁面附加到目前的分段檔，並寫入索引（可在多個協程與執行緒間共用）"""
+
+    def __init__(self, directory: str = ARCHIVE_DIR, segment_bytes: int = SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.records = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self._lock = threading.Lock()
+        self._segment = None
+        self._index = None
+        self._segment_name = ""
+        self._offset = 0
+
+    def _open_segment(self):
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        suffix = ".warc.zst" if zstandard is not None else ".warc.gz"
+        # 加上行程 id，多個爬蟲行程可以寫入同一個目錄
+        self._segment_name = f"pages-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}{suffix}"
+        self._segment = open(os.path.join(self.directory, self._segment_name), "ab")
+        self._index = open(os.path.join(self.directory, self._segment_name + ".cdxj"), "a", encoding="utf-8")
+        self._offset = self._segment.tell()
+
+    def write(self, url: str, html: str, strategy: str, fetched_at: Optional[datetime] = None):
+        fetched_at = fetched_at or datetime.now(timezone.utc)
+        record = _warc_record(url, html, fetched_at, strategy)
+        data = _compress(record)
+        with self._lock:
+            if self._segment is None or self._offset >= self.segment_bytes:
+                self._open_segment()
+            self._segment.write(data)
+            # 先寫入記錄再寫索引，中途中止時索引不會指向不完整的記錄
+            self._segment.flush()
+            entry = {"offset": self._offset, "length": len(data), "strategy": strategy}
+            self._index.write(f"{url} {fetched_at.astimezone(timezone.utc):%Y%m%d%H%M%S} "
+                              f"{json.dumps(entry)}\n")
+            self._index.flush()
+            self._offset += len(data)
+            self.records += 1
+            self.raw_bytes += len(record)
+            self.stored_bytes += len(data)
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "records": self.records,
+            "raw_mb": round(self.raw_bytes / 1024 / 1024, 2),
+            "stored_mb": round(self.stored_bytes / 1024 / 1024, 2),
+            "ratio": round(self.raw_bytes / self.stored_bytes, 2) if self.stored_bytes else 0.0,
+        }
+
+    def close(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = self._index = None
+
+
+def iter_index(directory: str = ARCHIVE_DIR) -> Iterator[IndexEntry]:
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".cdxj"):
+            continue
+        segment = name[:-len(".cdxj")]
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            for line in f:
+                url, timestamp, entry = line.rstrip("\n").split(" ", 2)
+                entry = json.loads(entry)
+                yield IndexEntry(url, timestamp, segment, entry["offset"], entry["length"], entry["strategy"])
+
+
+def latest_entries(directory: str = ARCHIVE_DIR) -> Dict[str, IndexEntry]:
+    """每個網址最後一次抓取的記錄"""
+    latest: Dict[str, IndexEntry] = {}
+    for entry in iter_index(directory):
+        current = latest.get(entry.url)
+        if current is None or entry.fetched_at >= current.fetched_at:
+            latest[entry.url] = entry
+    return latest
+
+
+class SegmentReader:
+    """以 mmap 讀取分段檔，依位移取出單筆記錄而不需要讀入整個檔案"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, offset: int, length: int) -> Tuple[Dict[str, str], str]:
+        return parse_record(self._map[offset:offset + length])
+
+    def close(self):
+        self._map.close()
+        self._file.close()
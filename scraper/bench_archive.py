@@ -0,0 +1,49 @@
+"""封存與離線重新擷取的基準測試：把 fixture 文章頁寫入暫存的封存目錄，再以不同的行程數重新擷取
+
+印出封存的寫入速度與壓縮比，以及每種行程數的每秒頁數（--dry-run，不寫入 MongoDB）：
+    python bench_archive.py --articles 20000 --paragraphs 20 --workers 1,4,8
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+import fixture_server
+from archive import ArchiveWriter
+from reextract import run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=20000)
+    parser.add_argument("--paragraphs", type=int, default=20, help="每篇文章額外的段落數")
+    parser.add_argument("--workers", default="1,4", help="以逗號分隔的行程數")
+    parser.add_argument("--segment-mb", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    directory = tempfile.mkdtemp(prefix="archive-")
+    try:
+        writer = ArchiveWriter(directory, segment_bytes=args.segment_mb * 1024 * 1024)
+        start = time.perf_counter()
+        for i in range(args.articles):
+            extra = "".join(f"<p>{rng.choice(fixture_server.PARAGRAPHS)}</p>" for _ in range(args.paragraphs))
+            html = fixture_server.story_page(i).replace("</div></body>", extra + "</div></body>")
+            writer.write(f"https://tw-nba.udn.com/nba/story/6754/{i}", html, "http")
+        writer.close()
+        elapsed = time.perf_counter() - start
+        summary = writer.summary()
+        print(f"封存 {args.articles} 頁: {args.articles / elapsed:.0f} 頁/秒，原始 {summary['raw_mb']} MB，"
+              f"壓縮後 {summary['stored_mb']} MB（{summary['ratio']} 倍）")
+
+        for workers in (int(n) for n in args.workers.split(",")):
+            totals = run(directory, workers, chunk=500, pattern=r"/story/", dry_run=True)
+            print(f"{workers} 個行程: {totals['valid'] / totals['seconds']:.0f} 頁/秒"
+                  f"（成功 {totals['valid']}，失敗 {totals['invalid'] + totals['errors']}）")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
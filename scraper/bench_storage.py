@@ -0,0 +1,81 @@
+"""文章儲存的大小與延遲基準測試：比較第 1 版（每次重新連線、find_one 再寫入、全文存兩次）
+與第 2 版（共用連線、單次 upsert、只存段落並壓縮）
+
+在暫存的集合中各寫入 --articles 篇文章兩次（新增與更新），印出每次儲存的延遲與集合大小，結束後刪除集合：
+    python bench_storage.py --articles 2000 --paragraphs 20
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime
+
+from pymongo import MongoClient
+
+import fixture_server
+from main_content import parse_article
+from migrate_articles import collection_stats, print_stats
+from storage import DB_NAME, MONGO_URI, get_database, save_article
+
+
+def make_articles(count: int, paragraphs: int):
+    rng = random.Random(1)
+    articles = []
+    for i in range(count):
+        html = fixture_server.story_page(i)
+        extra = "".join(f"<p>{rng.choice(fixture_server.PARAGRAPHS)}</p>" for _ in range(paragraphs))
+        articles.append(parse_article(html.replace("</div></body>", extra + "</div></body>"),
+                                      f"https://tw-nba.udn.com/nba/story/6754/{i}"))
+    return articles
+
+
+def save_v1(name: str, article) -> None:
+    """第 1 版的 save_article"""
+    client = MongoClient(MONGO_URI)
+    try:
+        collection = client[DB_NAME][name]
+        if collection.find_one({"url": article.url}):
+            collection.update_one({"url": article.url}, {"$set": article.model_dump()})
+        else:
+            collection.insert_one(article.model_dump())
+    finally:
+        client.close()
+
+
+def run(label: str, save, articles) -> dict:
+    latencies = []
+    for _ in range(2):
+        for article in articles:
+            article.updated_at = datetime.now()
+            start = time.perf_counter()
+            save(article)
+            latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"{label}: 儲存 p50 {statistics.median(latencies) * 1000:.2f} ms，"
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=2000)
+    parser.add_argument("--paragraphs", type=int, default=20, help="每篇文章額外的段落數")
+    args = parser.parse_args()
+
+    articles = make_articles(args.articles, args.paragraphs)
+    db = get_database()
+    v1, v2 = "bench_articles_v1", "bench_articles_v2"
+    try:
+        run("第 1 版", lambda article: save_v1(v1, article), articles)
+        # 第 2 版的 url 唯一索引
+        db[v2].create_index("url", unique=True)
+        run("第 2 版", lambda article: save_article(db[v2], article), articles)
+        print_stats("第 1 版", collection_stats(db, v1))
+        print_stats("第 2 版", collection_stats(db, v2))
+    finally:
+        db.drop_collection(v1)
+        db.drop_collection(v2)
+
+
+if __name__ == "__main__":
+    main()
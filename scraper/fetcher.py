@@ -0,0 +1,159 @@
+"""抓取層：先以共用連線池的 HTTP 客戶端抓取，解析結果驗證失敗才改用無頭瀏覽器
+
+UDN 的列表與文章頁都是伺服器端渲染，絕大多數頁面不需要瀏覽器。HTTP 客戶端在整個爬取過程中
+共用（keep-alive、連線重用、gzip/br 解壓，有安裝 h2 時使用 HTTP/2）；瀏覽器只在需要時才啟動，
+並在後續的備援請求間重用。每種策略的成功率與延遲都會記錄下來。抓取到的原始 HTML 會寫入
+archive.py 的封存檔，解析規則改變時可以離線重新擷取。
+"""
+import asyncio
+import os
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from archive import ArchiveWriter
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:  # 未安裝 h2 時使用 HTTP/1.1 keep-alive
+    HTTP2 = False
+
+MAX_CONNECTIONS = int(os.getenv("CRAWLER_MAX_CONNECTIONS", "20"))
+TIMEOUT = float(os.getenv("CRAWLER_TIMEOUT", "15"))
+ARCHIVE_ENABLED = os.getenv("CRAWLER_ARCHIVE", "1") == "1"
+USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/124.0 Safari/537.36")
+
+
+class StrategyStats:
+    def __init__(self):
+        self.attempts = 0
+        self.successes = 0
+        self.errors = 0
+        self.invalid = 0
+        self.latencies: List[float] = []
+
+    def as_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "errors": self.errors,
+            "invalid": self.invalid,
+            "success_rate": round(self.successes / self.attempts, 3) if self.attempts else 0.0,
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+        }
+
+
+class Fetcher:
+    """依序嘗試各策略（預設 http 再 browser），回傳第一個通過驗證的解析結果"""
+
+    def __init__(self, strategies: Tuple[str, ...] = ("http", "browser"), max_connections: int = MAX_CONNECTIONS,
+                 archive: Optional[ArchiveWriter] = None):
+        self.strategies = strategies
+        self.max_connections = max_connections
+        self.archive = archive
+        self.stats: Dict[str, StrategyStats] = defaultdict(StrategyStats)
+        self.escalations = 0
+        self._client: Optional[httpx.AsyncClient] = None
+        self._crawler = None
+        self._crawler_lock = asyncio.Lock()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                headers={"User-Agent": USER_AGENT, "Accept-Language": "zh-TW,zh;q=0.9"},
+                timeout=TIMEOUT,
+                follow_redirects=True,
+            )
+        return self._client
+
+    async def _fetch_http(self, url: str, target_elements: List[str]) -> str:
+        response = await self.client.get(url)
+        response.raise_for_status()
+        return response.text
+
+    async def _fetch_browser(self, url: str, target_elements: List[str]) -> str:
+        async with self._crawler_lock:
+            if self._crawler is None:
+                from crawl4ai import AsyncWebCrawler
+                self._crawler = AsyncWebCrawler()
+                await self._crawler.start()
+        from crawl4ai import CrawlerRunConfig
+        result = await self._crawler.arun(url=url, config=CrawlerRunConfig(target_elements=target_elements))
+        if not result.success:
+            raise RuntimeError(result.error_message)
+        return result.html
+
+    async def fetch(self, url: str, parse: Callable[[str, str], Any], validate: Callable[[Any], bool],
+                    target_elements: Optional[List[str]] = None) -> Tuple[Optional[Any], Optional[str]]:
+        """回傳 (解析結果, 使用的策略)；所有策略都失敗時回傳 (None, None)"""
+        fetchers = {"http": self._fetch_http, "browser": self._fetch_browser}
+        for index, name in enumerate(self.strategies):
+            fetch = fetchers[name]
+            stats = self.stats[name]
+            stats.attempts += 1
+            start = time.perf_counter()
+            try:
+                html = await fetch(url, target_elements or [])
+                if self.archive is not None:
+                    # 驗證失敗的頁面也封存，之後修正解析規則時可能就能擷取
+                    self.archive.write(url, html, name)
+                parsed = parse(html, url)
+            except Exception as e:
+                stats.errors += 1
+                print(f"[{name}] 抓取 {url} 時出錯: {e}")
+                parsed = None
+            else:
+                if validate(parsed):
+                    stats.successes += 1
+                    stats.latencies.append(time.perf_counter() - start)
+                    return parsed, name
+                stats.invalid += 1
+            if index + 1 < len(self.strategies):
+                self.escalations += 1
+        return None, None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "strategies": {name: stats.as_dict() for name, stats in self.stats.items()},
+            "escalations": self.escalations,
+            "http2": HTTP2,
+            "archive": self.archive.summary() if self.archive is not None else None,
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._crawler is not None:
+            await self._crawler.close()
+            self._crawler = None
+        if self.archive is not None:
+            self.archive.close()
+
+
+_fetcher: Optional[Fetcher] = None
+
+
+def get_fetcher() -> Fetcher:
+    """整個爬取行程共用同一個 Fetcher，連線池與瀏覽器才能跨請求重用"""
+    global _fetcher
+    if _fetcher is None:
+        fallback = os.getenv("CRAWLER_BROWSER_FALLBACK", "1") == "1"
+        _fetcher = Fetcher(strategies=("http", "browser") if fallback else ("http",),
+                           archive=ArchiveWriter() if ARCHIVE_ENABLED else None)
+    return _fetcher
+
+
+def set_fetcher(fetcher: Fetcher):
+    global _fetcher
+    _fetcher = fetcher
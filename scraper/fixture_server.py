@@ -0,0 +1,160 @@
+"""本機測試用的 UDN 頁面伺服器：產生與正式網站結構相同的列表頁與文章頁
+
+每 --js-every 篇文章有一篇只回傳需要執行 JavaScript 的空殼頁面，用來驗證 HTTP 抓取失敗時
+會改用瀏覽器；/photos/ 提供少數幾種內容重複的圖片，部分圖片的第一次請求回 503 以驗證重試，
+/photos/truncated.gif 是只有檔頭的截斷圖片。
+HTML 回應依 Accept-Encoding 以 gzip 壓縮，並支援 keep-alive：
+    python fixture_server.py --port 8900
+    UDN_BASE_URL=http://127.0.0.1:8900 python seed_url.py
+"""
+import argparse
+import gzip
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LIST_PAGE_SIZE = 20
+# 文章圖片只有幾種不同內容，模擬重複使用的球隊與球員照片
+DISTINCT_PHOTOS = 5
+PARAGRAPHS = [
+    "湖人今天在主場以 118 比 109 擊敗勇士，詹姆斯繳出 32 分 11 籃板 9 助攻的全能數據。",
+    "勇士全場三分球 42 投僅 13 中，柯瑞在第四節關鍵時刻連續失手。",
+    "湖人總教練賽後表示，球隊的防守輪轉比上一場更積極，替補群也打出應有的水準。",
+    "兩隊下週將在舊金山再度交手，勇士能否扳回一城備受關注。",
+]
+
+
+def list_page(page: int) -> str:
+    links = "\n".join(
+        f'<li><a href="/nba/story/6754/{page * 1000 + i}">湖人新聞 {page}-{i}</a></li>'
+        for i in range(LIST_PAGE_SIZE)
+    )
+    return f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>NBA 最新</title></head><body>
+<nav><a href="https://tw-nba.udn.com/nba/story/7002/1">熱門</a></nav>
+<div id="news_list"><ul>
+{links}
+</ul></div></body></html>"""
+
+
+def story_page(story_id: int) -> str:
+    paragraphs = "\n".join(f"<p>{text}</p>" for text in PARAGRAPHS)
+    return f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>新聞 {story_id}</title></head><body>
+<header><div class="logo"><h1>udn NBA TAIWAN</h1></div><p>最新 NBA 新聞</p></header>
+<div id="story" class="area">
+<h1 class="story_art_title">湖人擊敗勇士 詹姆斯全能演出 {story_id}</h1>
+<div class="shareBar__info--author"><span>2025-03-30 12:34</span> 記者／台北報導</div>
+<figure><img src="/photos/{story_id}.png" title="詹姆斯" alt="詹姆斯切入上籃"></figure>
+{paragraphs}
+</div></body></html>"""
+
+
+def photo(seed: int, width: int = 320, height: int = 180) -> bytes:
+    """產生單色的 PNG"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    pixel = bytes([seed * 50 % 256, seed * 90 % 256, seed * 130 % 256])
+    raw = b"".join(b"\x00" + pixel * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+def shell_page(story_id: int) -> str:
+    return f"""<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>
+<div id="app"></div><script src="/static/story.js" data-id="{story_id}"></script></body></html>"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    js_every = 10
+    # 每 flaky_every 張圖片的第一次請求回 503，用來驗證重試；retry_after 不為 None 時附上 Retry-After
+    flaky_every = 7
+    retry_after = None
+    # 每張圖片回應前等待的秒數，用來觀察並行數
+    photo_delay = 0.0
+    attempts: dict = {}
+    # 圖片請求的並行數：in_flight 與 max_in_flight
+    photo_stats: dict = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path == "/photos/truncated.gif":
+            self._send(b"GIF89a;", "image/gif")
+            return
+        if match := re.fullmatch(r"/photos/(\d+)\.png", self.path):
+            photo_id = int(match.group(1))
+            with self.lock:
+                self.attempts[photo_id] = self.attempts.get(photo_id, 0) + 1
+                stats = self.photo_stats
+                stats["in_flight"] = stats.get("in_flight", 0) + 1
+                stats["max_in_flight"] = max(stats.get("max_in_flight", 0), stats["in_flight"])
+            try:
+                time.sleep(self.photo_delay)
+                if self.flaky_every and photo_id % self.flaky_every == 0 and self.attempts[photo_id] == 1:
+                    self.send_response(503)
+                    if self.retry_after is not None:
+                        self.send_header("Retry-After", str(self.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self._send(photo(photo_id % DISTINCT_PHOTOS), "image/png")
+            finally:
+                with self.lock:
+                    stats["in_flight"] -= 1
+            return
+        if match := re.fullmatch(r"/nba/cate/6754/0/newest/(\d+)", self.path):
+            body = list_page(int(match.group(1)))
+        elif match := re.fullmatch(r"/nba/story/\d+/(\d+)", self.path):
+            story_id = int(match.group(1))
+            body = shell_page(story_id) if self.js_every and story_id % self.js_every == 0 else story_page(story_id)
+        else:
+            self.send_error(404)
+            return
+        self._send(body.encode(), "text/html; charset=utf-8")
+
+    def _send(self, data: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        if content_type.startswith("text/") and "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data, mtime=0)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = 0, js_every: int = 10, **options) -> ThreadingHTTPServer:
+    """在背景執行緒啟動伺服器；port 為 0 時由系統分配，實際位址見 server.server_address
+
+    options 可覆寫 FixtureHandler 的 flaky_every、retry_after 與 photo_delay；
+    圖片請求的次數與並行數記錄在 server.RequestHandlerClass.attempts / photo_stats
+    """
+    handler = type("Handler", (FixtureHandler,), {"js_every": js_every, "attempts": {}, "photo_stats": {},
+                                                  "lock": threading.Lock(), **options})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--js-every", type=int, default=10, help="每幾篇文章有一篇需要瀏覽器（0 表示沒有）")
+    args = parser.parse_args()
+    server = serve(args.port, args.js_every)
+    print(f"fixture 伺服器: http://127.0.0.1:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""媒體階段：並行下載文章圖片，依內容雜湊去重後批次寫入 API 的 media_assets
+
+同一張球隊或球員照片常出現在多篇文章（甚至在不同網址），以 SHA-256 定址後只存一份，
+API 以 /media/{sha256} 提供。下載有總並行上限與每個主機的上限，逾時、連線錯誤與 429/5xx
+以指數退避重試；格式依檔頭判斷並驗證尺寸，與 API 的圖片上傳使用相同的檢查。
+"""
+import asyncio
+import hashlib
+import io
+import os
+import random
+import sys
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import crud, uploads  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+
+CONCURRENCY = int(os.getenv("MEDIA_CONCURRENCY", "16"))
+PER_HOST = int(os.getenv("MEDIA_PER_HOST", "4"))
+RETRIES = 3
+BACKOFF = 0.5
+MAX_RETRY_AFTER = 30.0
+BATCH_SIZE = 50
+# 資料庫無法寫入時最多保留多少批待寫入的圖片，超過時丟棄最舊的，之後再遇到時重新下載
+MAX_PENDING_BATCHES = 20
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class MediaInfo(NamedTuple):
+    sha256: str
+    mime_type: str
+    width: int
+    height: int
+    byte_size: int
+
+
+class TransientError(Exception):
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.retry_after = retry_after
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after", "")
+    return min(float(value), MAX_RETRY_AFTER) if value.isdigit() else None
+
+
+class MediaStage:
+    def __init__(self, client: httpx.AsyncClient, session_factory=SessionLocal, concurrency: int = CONCURRENCY,
+                 per_host: int = PER_HOST, retries: int = RETRIES, batch_size: int = BATCH_SIZE):
+        self.client = client
+        self.session_factory = session_factory
+        self.retries = retries
+        self.batch_size = batch_size
+        self.stats = Counter()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._hosts: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(per_host))
+        # 同一個網址只下載一次，並行的請求共用同一個 task
+        self._by_url: Dict[str, asyncio.Task] = {}
+        self._seen: set = set()
+        self._pending: List[dict] = []
+        self._flush_lock = asyncio.Lock()
+
+    async def get(self, url: str) -> Optional[MediaInfo]:
+        task = self._by_url.get(url)
+        if task is None:
+            task = self._by_url[url] = asyncio.ensure_future(self._ingest(url))
+        else:
+            self.stats["url_hits"] += 1
+        return await task
+
+    async def _download_once(self, url: str) -> Tuple[bytes, str]:
+        async with self.client.stream("GET", url) as response:
+            if response.status_code in TRANSIENT_STATUS:
+                raise TransientError(response.status_code, _retry_after(response))
+            response.raise_for_status()
+            length = response.headers.get("content-length", "")
+            if length.isdigit() and int(length) > uploads.MAX_IMAGE_BYTES:
+                raise uploads.ImageTooLarge(f"圖片超過 {uploads.MAX_IMAGE_BYTES} 位元組上限")
+            digest = hashlib.sha256()
+            chunks = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > uploads.MAX_IMAGE_BYTES:
+                    raise uploads.ImageTooLarge(f"圖片超過 {uploads.MAX_IMAGE_BYTES} 位元組上限")
+                digest.update(chunk)
+                chunks.append(chunk)
+        return b"".join(chunks), digest.hexdigest()
+
+    async def _download(self, url: str) -> Tuple[bytes, str]:
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            try:
+                # 先取得主機的名額再佔用全域名額，等待慢主機的請求不會擋住其他主機
+                async with self._hosts[host], self._slots:
+                    return await self._download_once(url)
+            except (TransientError, httpx.TimeoutException, httpx.TransportError) as e:
+                if attempt == self.retries:
+                    raise
+                self.stats["retries"] += 1
+                delay = getattr(e, "retry_after", None) or BACKOFF * 2 ** attempt * (0.5 + random.random())
+                # 退避期間不佔用並行名額
+                await asyncio.sleep(delay)
+
+    async def _ingest(self, url: str) -> Optional[MediaInfo]:
+        try:
+            data, sha256 = await self._download(url)
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"下載圖片 {url} 時出錯: {e}")
+            return None
+        self.stats["downloaded"] += 1
+        self.stats["bytes"] += len(data)
+        mime_type = uploads.sniff(data[:16])
+        try:
+            if mime_type is None:
+                raise uploads.InvalidImage("不支援的圖片格式")
+            width, height = await asyncio.to_thread(uploads.verify, io.BytesIO(data), mime_type, len(data))
+        except Exception as e:
+            # 任何驗證錯誤都只讓這張圖片無效，文章照常保存
+            self.stats["invalid"] += 1
+            print(f"圖片 {url} 無效: {e}")
+            return None
+
+        info = MediaInfo(sha256, mime_type, width, height, len(data))
+        if sha256 in self._seen:
+            self.stats["deduped"] += 1
+            return info
+        self._seen.add(sha256)
+        self._pending.append({
+            "sha256": sha256, "data": data, "mime_type": mime_type, "width": width, "height": height,
+            "byte_size": len(data), "source_url": url,
+        })
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        return info
+
+    def _write(self, rows: List[dict]) -> int:
+        db = self.session_factory()
+        try:
+            # 先查出已存在的雜湊，已存過的圖片不必再把內容送到資料庫
+            existing = crud.existing_media_hashes(db, [row["sha256"] for row in rows])
+            return crud.add_media_assets(db, [row for row in rows if row["sha256"] not in existing])
+        finally:
+            db.close()
+
+    async def flush(self) -> bool:
+        """寫入待處理的圖片；失敗時放回佇列留待下次，錯誤不會傳給剛好湊滿一批的文章"""
+        async with self._flush_lock:
+            rows, self._pending = self._pending, []
+            if not rows:
+                return True
+            try:
+                stored = await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                print(f"寫入 {len(rows)} 張圖片時出錯: {e}")
+                self._pending = rows + self._pending
+                overflow = len(self._pending) - self.batch_size * MAX_PENDING_BATCHES
+                if overflow > 0:
+                    for row in self._pending[:overflow]:
+                        self._seen.discard(row["sha256"])
+                        self._by_url.pop(row["source_url"], None)
+                    del self._pending[:overflow]
+                    self.stats["dropped"] += overflow
+                return False
+            self.stats["stored"] += stored
+            self.stats["already_stored"] += len(rows) - stored
+            return True
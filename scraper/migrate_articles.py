@@ -0,0 +1,99 @@
+"""把 articles 集合中的第 1 版文件轉換成精簡的第 2 版格式，並建立索引
+
+同一個 url 有多份文件時（舊的 find_one 後 insert_one 在並行時會重複寫入）只保留最後更新的一份；
+seed_urls 也一樣，但優先保留已完成的一份，避免重新爬取。之後才能建立兩個集合 url 的唯一索引。
+轉換前後印出集合的文件大小與索引大小；磁碟空間要在 --compact 執行 compact 之後才會釋放：
+    python migrate_articles.py --dry-run
+    python migrate_articles.py --batch 500 --compact
+"""
+import argparse
+
+from pymongo import DESCENDING, ReplaceOne
+from pymongo.database import Database
+
+from storage import ARTICLE_COLLECTION, URL_COLLECTION, ensure_indexes, from_document, get_database, to_document
+
+# 同一個 url 的文件依這個順序排列，只保留第一份
+KEEP_ORDER = {
+    ARTICLE_COLLECTION: [{"$sort": {"updated_at": DESCENDING}}],
+    URL_COLLECTION: [
+        {"$addFields": {"_completed": {"$eq": ["$status", "completed"]}}},
+        {"$sort": {"_completed": DESCENDING, "updated_at": DESCENDING}},
+    ],
+}
+
+
+def collection_stats(db: Database, name: str) -> dict:
+    stats = db.command("collStats", name)
+    return {key: stats.get(key, 0) for key in ("count", "size", "avgObjSize", "storageSize", "totalIndexSize")}
+
+
+def print_stats(label: str, stats: dict):
+    print(f"{label}: {stats['count']} 篇，資料 {stats['size'] / 1024 / 1024:.2f} MB"
+          f"（平均 {stats['avgObjSize']} B），磁碟 {stats['storageSize'] / 1024 / 1024:.2f} MB，"
+          f"索引 {stats['totalIndexSize'] / 1024 / 1024:.2f} MB")
+
+
+def remove_duplicates(db: Database, name: str, dry_run: bool) -> int:
+    collection = db[name]
+    removed = 0
+    duplicates = collection.aggregate(KEEP_ORDER[name] + [
+        {"$group": {"_id": "$url", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    for group in duplicates:
+        stale = group["ids"][1:]
+        removed += len(stale)
+        if not dry_run:
+            collection.delete_many({"_id": {"$in": stale}})
+    return removed
+
+
+def migrate(db: Database, batch: int, dry_run: bool) -> int:
+    collection = db[ARTICLE_COLLECTION]
+    converted = 0
+    operations = []
+    for doc in collection.find({"_v": {"$exists": False}}, batch_size=batch):
+        document = to_document(from_document(doc))
+        document["crawled_at"] = doc.get("crawled_at")
+        operations.append(ReplaceOne({"_id": doc["_id"]}, document))
+        if len(operations) >= batch:
+            converted += _flush(collection, operations, dry_run)
+            operations = []
+    converted += _flush(collection, operations, dry_run)
+    return converted
+
+
+def _flush(collection, operations, dry_run: bool) -> int:
+    if operations and not dry_run:
+        collection.bulk_write(operations, ordered=False)
+    if operations:
+        print(f"已轉換 {len(operations)} 篇")
+    return len(operations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="只統計，不寫入")
+    parser.add_argument("--compact", action="store_true", help="轉換後執行 compact 釋放磁碟空間")
+    args = parser.parse_args()
+
+    db = get_database()
+    print_stats("轉換前", collection_stats(db, ARTICLE_COLLECTION))
+    removed = remove_duplicates(db, ARTICLE_COLLECTION, args.dry_run)
+    print(f"重複的文章: {removed} 篇")
+    removed = remove_duplicates(db, URL_COLLECTION, args.dry_run)
+    print(f"重複的 URL: {removed} 個")
+    converted = migrate(db, args.batch, args.dry_run)
+    print(f"轉換為第 2 版: {converted} 篇")
+    if args.dry_run:
+        return
+    ensure_indexes(db)
+    if args.compact:
+        db.command("compact", ARTICLE_COLLECTION)
+    print_stats("轉換後", collection_stats(db, ARTICLE_COLLECTION))
+
+
+if __name__ == "__main__":
+    main()
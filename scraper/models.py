@@ -7,6 +7,10 @@ class ImageInfo(BaseModel):
     url: str = Field(..., description="圖片URL")
     title: str = Field(default="", description="圖片標題")
     alt: str = Field(default="", description="圖片替代文字")
+    sha256: Optional[str] = Field(default=None, description="圖片內容雜湊，對應 API 的 /media/{sha256}")
+    mime_type: Optional[str] = Field(default=None, description="依檔頭判斷的圖片格式")
+    width: Optional[int] = Field(default=None, description="圖片寬度")
+    height: Optional[int] = Field(default=None, description="圖片高度")
 
 class SeedUrl(BaseModel):
     """種子URL的模型"""
@@ -28,7 +32,8 @@ class SeedUrl(BaseModel):
 class ArticleContent(BaseModel):
     """文章內容的模型"""
     title: str = Field(..., description="文章標題")
-    time: str = Field(..., description="發布時間")
+    time: str = Field(..., description="發布時間（頁面上的原始字串）")
+    published_at: Optional[datetime] = Field(default=None, description="解析後的發布時間")
     url: str = Field(..., description="文章URL")
     image: ImageInfo = Field(..., description="文章圖片資訊")
     content: str = Field(..., description="文章完整內容")
@@ -41,6 +46,7 @@ class ArticleContent(BaseModel):
             "example": {
                 "title": "NBA新聞標題",
                 "time": "2025/03/30 12:34",
+                "published_at": "2025-03-30T12:34:00",
                 "url": "https://tw-nba.udn.com/nba/story/7002/8640845",
                 "image": {
                     "url": "https://example.com/image.jpg",
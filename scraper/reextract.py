@@ -0,0 +1,147 @@
+"""離線重新擷取：從 archive.py 的封存檔讀取原始 HTML，以目前的 parse_article 重新解析並批次寫回
+
+每個網址只取最後一次抓取的記錄。記錄依分段檔與位移排序後切成小批，交給行程池平行處理；
+每個子行程以 mmap 開啟分段檔，只解壓需要的記錄。結果以 bulk_write 批次 upsert 到 articles，
+圖片只更新網址、標題與替代文字，已下載的圖片雜湊與尺寸保留；原本驗證失敗、現在能擷取的文章
+會新增並把 seed_urls 標記為 completed。不需要網路：
+    python reextract.py --dry-run
+    python reextract.py --workers 8 --chunk 500
+"""
+import argparse
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from archive import ARCHIVE_DIR, IndexEntry, SegmentReader, latest_entries
+
+# 每個子行程開啟過的分段檔
+_readers: Dict[str, SegmentReader] = {}
+
+
+def _reader(path: str) -> SegmentReader:
+    reader = _readers.get(path)
+    if reader is None:
+        reader = _readers[path] = SegmentReader(path)
+    return reader
+
+
+def extract_chunk(path: str, entries: List[Tuple[str, int, int, str]]):
+    """在子行程中解析一批記錄，回傳 (文件列表, 統計)"""
+    from main_content import parse_article, validate_article
+    from storage import to_document
+
+    reader = _reader(path)
+    documents = []
+    stats = Counter()
+    for url, offset, length, fetched_at in entries:
+        try:
+            _, html = reader.read(offset, length)
+            article = parse_article(html, url)
+        except Exception as e:
+            stats["errors"] += 1
+            print(f"重新擷取 {url} 時出錯: {e}")
+            continue
+        stats["bytes"] += len(html)
+        if not validate_article(article):
+            stats["invalid"] += 1
+            continue
+        stats["valid"] += 1
+        # 索引中的時間是 UTC，文章的 crawled_at 與其他欄位一樣使用本地時間
+        fetched = datetime(int(fetched_at[:4]), int(fetched_at[4:6]), int(fetched_at[6:8]), int(fetched_at[8:10]),
+                           int(fetched_at[10:12]), int(fetched_at[12:14]), tzinfo=timezone.utc)
+        article.crawled_at = fetched.astimezone().replace(tzinfo=None)
+        documents.append((url, article.crawled_at, to_document(article)))
+    return documents, stats
+
+
+def make_chunks(entries: Dict[str, IndexEntry], directory: str, chunk: int, pattern: str):
+    """依分段檔與位移排序後切塊，子行程讀取 mmap 時大致是循序的"""
+    by_segment = defaultdict(list)
+    matcher = re.compile(pattern)
+    for entry in entries.values():
+        if matcher.search(entry.url):
+            by_segment[entry.segment].append(entry)
+    for segment, items in sorted(by_segment.items()):
+        items.sort(key=lambda entry: entry.offset)
+        path = os.path.join(directory, segment)
+        for start in range(0, len(items), chunk):
+            yield path, [(e.url, e.offset, e.length, e.fetched_at) for e in items[start:start + chunk]]
+
+
+def write_documents(db, documents) -> int:
+    from pymongo import UpdateOne
+
+    from storage import ARTICLE_COLLECTION, URL_COLLECTION, stale_fields
+
+    operations = []
+    for url, crawled_at, doc in documents:
+        image = doc.pop("image")
+        fields = {**doc, **{f"image.{key}": image.get(key, "") for key in ("url", "title", "alt")}}
+        operations.append(UpdateOne({"url": url},
+                                    {"$set": fields, "$unset": stale_fields(doc),
+                                     "$setOnInsert": {"crawled_at": crawled_at}},
+                                    upsert=True))
+    if not operations:
+        return 0
+    db[ARTICLE_COLLECTION].bulk_write(operations, ordered=False)
+    db[URL_COLLECTION].bulk_write([
+        UpdateOne({"url": url, "status": {"$ne": "completed"}},
+                  {"$set": {"status": "completed", "updated_at": datetime.now()}})
+        for url, _, _ in documents
+    ], ordered=False)
+    return len(operations)
+
+
+def run(directory: str, workers: int, chunk: int, pattern: str, dry_run: bool) -> Counter:
+    started = time.perf_counter()
+    entries = latest_entries(directory)
+    print(f"封存中有 {len(entries)} 個網址（讀取索引 {time.perf_counter() - started:.1f} 秒）")
+
+    db = None
+    if not dry_run:
+        from storage import get_database
+        db = get_database()
+
+    totals = Counter()
+    report_every, next_report = 10_000, 10_000
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(extract_chunk, path, items)
+                   for path, items in make_chunks(entries, directory, chunk, pattern)]
+        for future in as_completed(futures):
+            documents, stats = future.result()
+            totals.update(stats)
+            if db is not None:
+                totals["written"] += write_documents(db, documents)
+            done = totals["valid"] + totals["invalid"] + totals["errors"]
+            if done >= next_report:
+                print(f"已處理 {done} 頁（{done / (time.perf_counter() - started):.0f} 頁/秒）")
+                next_report += report_every
+    totals["seconds"] = time.perf_counter() - started
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=500, help="每個子行程工作的記錄數")
+    parser.add_argument("--pattern", default=r"/story/", help="只處理符合此正規表示式的網址")
+    parser.add_argument("--dry-run", action="store_true", help="只解析並統計，不寫入 MongoDB")
+    args = parser.parse_args()
+
+    totals = run(args.archive_dir, args.workers, args.chunk, args.pattern, args.dry_run)
+    pages = totals["valid"] + totals["invalid"] + totals["errors"]
+    seconds = totals["seconds"]
+    print(f"重新擷取 {pages} 頁：成功 {totals['valid']}，驗證失敗 {totals['invalid']}，錯誤 {totals['errors']}，"
+          f"寫入 {totals['written']} 篇")
+    if pages:
+        print(f"耗時 {seconds:.1f} 秒，{pages / seconds:.0f} 頁/秒，"
+              f"{totals['bytes'] / 1024 / 1024 / seconds:.1f} MB/秒 HTML")
+
+
+if __name__ == "__main__":
+    main()
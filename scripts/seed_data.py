@@ -0,0 +1,218 @@
+"""種子資料：產生大量合成中文新聞，供本機重現 crud 在正式規模下的效能
+
+標籤與實體依 Zipf 分布指派（少數熱門標籤出現在大部分新聞中），瀏覽數同樣是長尾分布，
+部分新聞附上圖片。PostgreSQL 上以 COPY 批次寫入，SQLite 上以 executemany 寫入：
+    python scripts/seed_data.py --articles 2000000 --batch 20000
+    DATABASE_URL=sqlite:///./seed.db python scripts/seed_data.py --articles 10000 --create-tables
+"""
+import argparse
+import csv
+import hashlib
+import io
+import os
+import random
+import struct
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence
+
+import numpy as np
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import dedup, facets, models
+from app.database import copy_from
+from app.gazetteer import GAZETTEER
+from benchmarks.common import make_text
+
+CATEGORIES = [("NBA", "nba"), ("球隊", "teams"), ("交易", "trades"), ("傷病", "injuries"),
+              ("季後賽", "playoffs"), ("選秀", "draft")]
+TOPICS = ["三分球", "防守", "季後賽", "交易", "傷病", "新秀", "總冠軍", "明星賽", "MVP", "自由球員"]
+# 預先產生的段落數；每篇新聞從中抽取數段拼成內文，避免逐字產生文字成為瓶頸
+PARAGRAPH_POOL = 4096
+PARAGRAPH_LENGTH = 200
+IMAGE_POOL = 32
+
+
+def zipf_weights(n: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def zipf_sample(rng: np.random.Generator, weights: np.ndarray, rows: int, k: int) -> List[List[int]]:
+    """每列抽 k 個不重複的索引（多抽幾個再去重，熱門項目重複的機率高）"""
+    draws = rng.choice(len(weights), size=(rows, k * 2 + 2), p=weights)
+    result = []
+    for row in draws:
+        picked = list(dict.fromkeys(row.tolist()))[:k]
+        result.append(picked)
+    return result
+
+
+def make_png(rng: random.Random, width: int, height: int) -> bytes:
+    """產生隨機雜訊的 PNG（不可壓縮，大小接近真實縮圖）"""
+    raw = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return "\\x" + value.hex()
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return value
+
+
+def bulk_write(conn: Connection, table, columns: Sequence[str], rows: List[tuple]):
+    """PostgreSQL 用 COPY，其他資料庫用 executemany"""
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([_csv_value(v) for v in row])
+        buf.seek(0)
+        copy_from(conn, f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    else:
+        conn.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+def _get_or_create(conn: Connection, model, rows: List[Dict], key: Sequence[str]) -> List[int]:
+    """依 key 取得既有資料列的 id，不存在的先寫入"""
+    table = model.__table__
+    columns = [table.c[k] for k in key]
+    existing = {tuple(r[1:]): r[0] for r in conn.execute(select(table.c.id, *columns))}
+    missing = [row for row in rows if tuple(row[k] for k in key) not in existing]
+    if missing:
+        conn.execute(insert(table), missing)
+        existing = {tuple(r[1:]): r[0] for r in conn.execute(select(table.c.id, *columns))}
+    return [existing[tuple(row[k] for k in key)] for row in rows]
+
+
+def seed(engine, articles: int, batch: int, tags: int, entities: int, tags_per_article: int,
+         entities_per_article: int, image_ratio: float, days: int, paragraphs: int,
+         fingerprints: bool, seed_value: int):
+    rng = random.Random(seed_value)
+    nprng = np.random.default_rng(seed_value)
+
+    entity_rows = [{"name": name, "entity_type": entity_type, "meta_info": {"aliases": aliases}}
+                   for entity_type, entries in GAZETTEER.items() for name, aliases in entries.items()]
+    for i in range(len(entity_rows), entities):
+        entity_rows.append({"name": f"球員{i}", "entity_type": "player", "meta_info": None})
+
+    with engine.begin() as conn:
+        category_ids = _get_or_create(conn, models.Category,
+                                      [{"name": n, "slug": s} for n, s in CATEGORIES], ["name"])
+        tag_ids = _get_or_create(conn, models.Tag, [
+            {"name": f"{TOPICS[i % len(TOPICS)]}{i}", "slug": f"topic-{i}"} for i in range(tags)
+        ], ["name"])
+        entity_ids = _get_or_create(conn, models.Entity, entity_rows[:entities], ["name", "entity_type"])
+        first_id = (conn.execute(select(func.max(models.News.id))).scalar() or 0) + 1
+
+    pool = [make_text(rng, PARAGRAPH_LENGTH) for _ in range(PARAGRAPH_POOL)]
+    images = [make_png(rng, rng.choice([160, 240, 320]), rng.choice([90, 135, 180])) for _ in range(IMAGE_POOL)]
+    images = [(image, hashlib.sha256(image).hexdigest()) for image in images]
+    tag_weights = zipf_weights(len(tag_ids), 1.1)
+    entity_weights = zipf_weights(len(entity_ids), 1.0)
+    newest = datetime.now()
+    span = timedelta(days=days).total_seconds()
+
+    started = time.perf_counter()
+    for offset in range(0, articles, batch):
+        count = min(batch, articles - offset)
+        ids = range(first_id + offset, first_id + offset + count)
+        # id 越大越新，與 API 依 published_at 排序的順序一致
+        ages = np.sort(nprng.random(count) * span)[::-1]
+        lengths = nprng.integers(max(1, paragraphs // 2), paragraphs * 2, size=count)
+        tag_picks = zipf_sample(nprng, tag_weights, count, tags_per_article)
+        entity_picks = zipf_sample(nprng, entity_weights, count, entities_per_article)
+        views = np.minimum(nprng.zipf(1.5, count) * 10, 10_000_000)
+
+        news_rows, tag_rows, entity_rows_, metric_rows, image_rows, fingerprint_rows = [], [], [], [], [], []
+        for i, news_id in enumerate(ids):
+            content = "".join(pool[p] for p in nprng.integers(0, len(pool), size=lengths[i]))
+            published_at = newest - timedelta(seconds=float(ages[i]))
+            news_rows.append((
+                news_id, f"{pool[news_id % len(pool)][:24]} {news_id}", f"seed-{news_id}", content,
+                content[:120], published_at, f"https://example.com/images/{news_id}.jpg",
+                rng.random() < 0.02, category_ids[news_id % len(category_ids)], published_at, published_at,
+            ))
+            tag_rows.extend((news_id, tag_ids[t]) for t in tag_picks[i])
+            entity_rows_.extend((news_id, entity_ids[e], "main" if j == 0 else "mentioned")
+                                for j, e in enumerate(entity_picks[i]))
+            metric_rows.append((news_id, int(views[i]), published_at))
+            if rng.random() < image_ratio:
+                image, digest = rng.choice(images)
+                image_rows.append((news_id, image, "image/png", digest, published_at))
+            if fingerprints:
+                fingerprint = dedup.simhash(content)
+                if fingerprint is not None:
+                    fingerprint_rows.append((news_id, dedup.to_signed(fingerprint)))
+
+        with engine.begin() as conn:
+            bulk_write(conn, models.News.__table__,
+                       ["id", "title", "slug", "content", "summary", "published_at", "thumbnail_url",
+                        "is_featured", "category_id", "created_at", "updated_at"], news_rows)
+            bulk_write(conn, models.NewsTag.__table__, ["news_id", "tag_id"], tag_rows)
+            bulk_write(conn, models.NewsEntity.__table__, ["news_id", "entity_id", "role"], entity_rows_)
+            bulk_write(conn, models.NewsMetrics.__table__, ["news_id", "view_count", "last_updated"], metric_rows)
+            bulk_write(conn, models.NewsImage.__table__,
+                       ["news_id", "image_data", "mime_type", "sha256", "created_at"], image_rows)
+            bulk_write(conn, models.NewsFingerprint.__table__, ["news_id", "simhash"], fingerprint_rows)
+
+        done = offset + count
+        elapsed = time.perf_counter() - started
+        print(f"已寫入 {done}/{articles} 篇新聞（{done / elapsed:.0f} 篇/秒）")
+
+    # 批次寫入繞過了 crud，分面計數一次重新計算
+    with Session(engine) as db:
+        facets.rebuild_counts(db)
+
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            # 明確指定了 id，要把序列推進到目前最大值
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('news', 'id'), (SELECT max(id) FROM news))"))
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("ANALYZE"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=10_000, help="每個交易寫入的新聞數")
+    parser.add_argument("--tags", type=int, default=2000)
+    parser.add_argument("--entities", type=int, default=1000)
+    parser.add_argument("--tags-per-article", type=int, default=4)
+    parser.add_argument("--entities-per-article", type=int, default=3)
+    parser.add_argument("--image-ratio", type=float, default=0.05, help="附圖片的新聞比例")
+    parser.add_argument("--days", type=int, default=730, help="發布時間分布在最近幾天內")
+    parser.add_argument("--paragraphs", type=int, default=6, help="每篇新聞的平均段落數（每段約 200 字）")
+    parser.add_argument("--fingerprints", action="store_true", help="同時計算並寫入 SimHash 指紋（較慢）")
+    parser.add_argument("--create-tables", action="store_true", help="以 models 建立資料表（不經過 Alembic）")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app.database import engine
+    if args.create_tables:
+        models.Base.metadata.create_all(engine)
+    seed(engine, args.articles, args.batch, args.tags, args.entities, args.tags_per_article,
+         args.entities_per_article, args.image_ratio, args.days, args.paragraphs, args.fingerprints, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""測試共用的資料庫與用戶端：每個測試一個記憶體中的 SQLite，不連正式資料庫"""
+import os
+import sys
+
+# 必須在匯入 app.main 之前設定
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("RESPONSE_CACHE_TTL", "0")
+os.environ.setdefault("TRENDING_ENABLED", "0")
+
+# 爬蟲的模組以扁平方式互相匯入
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scraper"))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+
+
+@pytest.fixture
+def Session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(Session):
+    session = Session()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client(Session):
+    from fastapi.testclient import TestClient
+
+    from app import database, main
+
+    def override():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    main.app.dependency_overrides[database.get_db] = override
+    # 不使用 with，避免 lifespan 啟動連到正式資料庫的背景工作
+    yield TestClient(main.app)
+    main.app.dependency_overrides.pop(database.get_db, None)
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app import analytics, models
+
+
+def test_flush_adds_buffered_views_to_view_count(Session):
+    """瀏覽數在背景寫入時累加到 news_metrics.view_count，請求路徑不碰資料庫"""
+    with Session() as db:
+        for news_id in (1, 2):
+            db.add(models.News(id=news_id, title=f"新聞 {news_id}", slug=f"news-{news_id}", content="內容",
+                               published_at=datetime(2025, 3, 30)))
+        db.add(models.NewsMetrics(news_id=1, view_count=5))
+        db.commit()
+
+    recorder = analytics.ViewRecorder(Session.kw["bind"])
+    for news_id in (1, 1, 2):
+        recorder.record(news_id, datetime(2025, 3, 30, 12))
+    assert recorder.flush() == 3
+    recorder.record(2, datetime(2025, 3, 30, 13))
+    assert recorder.flush() == 1
+
+    with Session() as db:
+        counts = dict(db.execute(select(models.NewsMetrics.news_id, models.NewsMetrics.view_count)).all())
+    assert counts == {1: 7, 2: 2}
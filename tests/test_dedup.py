@@ -0,0 +1,74 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert, update
+
+from app import dedup, models
+
+
+@pytest.fixture
+def fingerprints(Session, monkeypatch):
+    monkeypatch.setattr(dedup, "REFRESH_INTERVAL", 0)
+    with Session() as db:
+        db.execute(insert(models.NewsFingerprint),
+                   [{"news_id": news_id, "simhash": news_id << 20} for news_id in range(1, 4)])
+        db.commit()
+    dedup.reset()
+    yield Session
+    dedup.reset()
+
+
+def test_full_reload_runs_off_the_request_path(fingerprints, monkeypatch):
+    """整份重新載入在背景執行緒進行，期間的查詢不必等待，本行程的寫入會重播到新索引"""
+    with fingerprints() as db:
+        assert len(dedup.get_index(db)) == 3
+
+        load = dedup._load
+        release = threading.Event()
+
+        def slow_load(db, index):
+            if threading.current_thread().name == "fingerprint-reload":
+                assert release.wait(10)
+            load(db, index)
+
+        monkeypatch.setattr(dedup, "_load", slow_load)
+        monkeypatch.setattr(dedup, "FULL_RELOAD_INTERVAL", 0)
+        # 只有整份重新載入才看得到改寫的指紋
+        db.execute(update(models.NewsFingerprint).where(models.NewsFingerprint.news_id == 2)
+                   .values(simhash=123 << 40))
+        db.commit()
+
+        old = dedup.get_index(db)
+        reloader = dedup._reloader
+        assert reloader.is_alive()
+        dedup.index_fingerprint(50, 7 << 30)
+        assert dedup.get_index(db) is old
+
+        release.set()
+        reloader.join(timeout=10)
+        # 不再開始下一次重建，否則新索引會被只依資料庫內容重建的索引取代
+        monkeypatch.setattr(dedup, "FULL_RELOAD_INTERVAL", 3600)
+        index = dedup.get_index(db)
+        assert index is not old
+        assert index.find(7 << 30, 0) == 50
+        assert index.find(123 << 40, 0) == 2
+        assert index.find(2 << 20, 0) is None
+
+
+def test_merge_accepts_timezone_aware_published_at(Session):
+    """近似重複的新聞帶時區（例如 POST /news/ 的 +08:00）時，與不帶時區的既有新聞比較後合併"""
+    from app import crud
+
+    dedup.reset()
+    content = "湖人今天在主場以 118 比 109 擊敗勇士，詹姆斯繳出 32 分 11 籃板 9 助攻的全能數據。" * 3
+    try:
+        with Session() as db:
+            first = crud.add_news(db, "湖人擊敗勇士", content, "", datetime(2025, 3, 30, 4), "NBA")
+            merged = crud.add_news(db, "湖人主場擊敗勇士", content, "",
+                                   datetime(2025, 3, 30, 13, tzinfo=timezone(timedelta(hours=8))), "NBA")
+            assert merged.id == first.id
+            assert merged.title == "湖人主場擊敗勇士"
+            assert merged.published_at == datetime(2025, 3, 30, 5)
+    finally:
+        dedup.reset()
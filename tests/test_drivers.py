@@ -0,0 +1,111 @@
+import io
+import json
+import socket
+import sys
+from types import SimpleNamespace
+
+from app import push
+from app.database import copy_from
+
+
+class FakeCursor:
+    def __init__(self):
+        self.copied = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Psycopg2Cursor(FakeCursor):
+    def copy_expert(self, statement, buf):
+        self.copied[statement] = buf.read()
+
+
+class Psycopg3Cursor(FakeCursor):
+    def copy(self, statement):
+        self.copied[statement] = ""
+        cursor = self
+
+        class Copy(FakeCursor):
+            def write(self, data):
+                cursor.copied[statement] += data
+
+        return Copy()
+
+
+def _connection(cursor):
+    return SimpleNamespace(connection=SimpleNamespace(dbapi_connection=SimpleNamespace(cursor=lambda: cursor)))
+
+
+def test_copy_from_supports_both_drivers():
+    data = "".join(f"{i}\t2026-01-01 00:00:00\n" for i in range(20000))
+    statement = "COPY news_view_events (news_id, viewed_at) FROM STDIN"
+    for cursor in (Psycopg2Cursor(), Psycopg3Cursor()):
+        copy_from(_connection(cursor), statement, io.StringIO(data))
+        assert cursor.copied == {statement: data}
+
+
+def test_start_listener_picks_driver(monkeypatch):
+    monkeypatch.setattr(push, "PG_NOTIFY_ENABLED", True)
+    monkeypatch.setattr(push.NotifyListener, "start", lambda self: None)
+    for dsn, driver in (("postgresql://u:p@db/news", "psycopg2"),
+                        ("postgresql+psycopg2://u:p@db/news", "psycopg2"),
+                        ("postgresql+psycopg://u:p@db/news", "psycopg")):
+        listener = push.start_listener(dsn)
+        assert (listener.dsn, listener.driver) == ("postgresql://u:p@db/news", driver)
+    assert push.start_listener("sqlite://") is None
+
+
+class Psycopg2Connection:
+    """psycopg2 連線的替身：以 socketpair 提供可 select 的檔案描述子，poll 時放入通知"""
+
+    def __init__(self, payloads):
+        self.reader, self.writer = socket.socketpair()
+        self.payloads = payloads
+        self.notifies = []
+        self.executed = []
+        self.autocommit = False
+        self.closed = False
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def cursor(self):
+        connection = self
+
+        class Cursor(FakeCursor):
+            def execute(self, statement):
+                connection.executed.append(statement)
+
+        return Cursor()
+
+    def poll(self):
+        self.reader.recv(1)
+        self.notifies.extend(SimpleNamespace(payload=payload) for payload in self.payloads)
+
+    def close(self):
+        self.closed = True
+        self.reader.close()
+        self.writer.close()
+
+
+def test_listen_psycopg2_dispatches_notifications(monkeypatch):
+    payloads = [json.dumps({"id": 7, "type": "created", "data": {"id": 1}})]
+    conn = Psycopg2Connection(payloads)
+    monkeypatch.setitem(sys.modules, "psycopg2", SimpleNamespace(connect=lambda dsn: conn))
+    published = []
+
+    class Target:
+        def publish(self, event_type, data, event_id=None):
+            published.append((event_id, event_type, data))
+            listener._stopped.set()
+
+    listener = push.NotifyListener("postgresql://u:p@db/news", target=Target())
+    conn.writer.send(b"x")
+    listener._listen_psycopg2()
+    assert conn.autocommit and conn.executed == [f"LISTEN {push.NOTIFY_CHANNEL}"]
+    assert published == [(7, "created", {"id": 1})]
+    assert conn.closed
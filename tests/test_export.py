@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from slugify import slugify
+
+from app import crud, export
+
+TEAMS = ["湖人", "勇士", "塞爾提克", "公鹿", "金塊"]
+
+
+@pytest.fixture
+def news(Session):
+    """五篇新聞，其中兩篇的 published_at 相同，續傳時要靠 id 區分先後"""
+    times = [datetime(2025, 3, 1), datetime(2025, 3, 2), datetime(2025, 3, 2), datetime(2025, 3, 3),
+             datetime(2025, 3, 4)]
+    with Session() as db:
+        ids = [crud.add_news(db, f"{team}贏球", f"{team}今天第 {i} 場比賽以 {100 + i} 分贏球。" * 5, "摘要", when,
+                             "NBA" if i % 2 == 0 else "評論", [team, "例行賽"]).id
+               for i, (team, when) in enumerate(zip(TEAMS, times))]
+    return ids
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_ndjson_in_published_order(client, news):
+    response = client.get("/export/news")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = _ndjson(response)
+    assert [record["id"] for record in records] == news
+    first = records[0]
+    assert first["title"] == "湖人贏球"
+    assert first["category"] == "nba"
+    assert sorted(first["tags"]) == sorted([slugify("湖人"), slugify("例行賽")])
+    assert first["published_at"] == "2025-03-01T00:00:00"
+    assert export.decode_cursor(first["cursor"]) == (datetime(2025, 3, 1), news[0])
+
+
+def test_csv_header_and_rows(client, news):
+    response = client.get("/export/news", params={"format": "csv", "include_content": "false"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert "content" not in rows[0]
+    assert list(rows[0])[-1] == "cursor"
+    assert [int(row["id"]) for row in rows] == news
+    assert set(rows[0]["tags"].split("|")) == {slugify("湖人"), slugify("例行賽")}
+
+
+def test_cursor_round_trip():
+    token = export.encode_cursor(datetime(2025, 3, 2, 12, 30), 42)
+    assert "=" not in token
+    assert export.decode_cursor(token) == (datetime(2025, 3, 2, 12, 30), 42)
+
+
+@pytest.mark.parametrize("stop", [1, 2])
+def test_resume_after_cursor(client, news, stop):
+    """從中斷那列的 cursor 繼續，相同 published_at 的下一篇不會遺漏或重複"""
+    records = _ndjson(client.get("/export/news"))
+    resumed = _ndjson(client.get("/export/news", params={"after": records[stop]["cursor"]}))
+    assert [record["id"] for record in resumed] == news[stop + 1:]
+
+
+def test_filters_by_category_and_tag(client, news):
+    assert [r["id"] for r in _ndjson(client.get("/export/news", params={"category": "nba"}))] == news[::2]
+    records = _ndjson(client.get("/export/news", params={"tag": slugify("金塊")}))
+    assert [record["id"] for record in records] == news[4:]
+
+
+@pytest.mark.parametrize("token", ["not-a-cursor", "bWlzc2luZw"])
+def test_invalid_cursor_is_rejected(client, news, token):
+    response = client.get("/export/news", params={"after": token})
+    assert response.status_code == 400
+
+
+def test_compressed_stream(client, news):
+    response = client.get("/export/news", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    # httpx 依 Content-Encoding 解壓，內容與未壓縮的匯出相同
+    assert [record["id"] for record in _ndjson(response)] == news
@@ -0,0 +1,116 @@
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select
+
+from app import facets, models
+from scripts.seed_data import seed
+
+
+@pytest.fixture
+def seeded(Session):
+    seed(Session.kw["bind"], articles=500, batch=500, tags=20, entities=30, tags_per_article=3,
+         entities_per_article=2, image_ratio=0.0, days=30, paragraphs=2, fingerprints=False, seed_value=7)
+    facets.reset()
+    yield Session
+    facets.reset()
+
+
+def test_filtered_counts_match_sql(seeded):
+    with seeded() as db:
+        tag = db.scalar(select(models.Tag).order_by(models.Tag.id).limit(1))
+        result = facets.get_facets(db, tags=[tag.slug], limit=50)
+        expected = db.scalar(select(func.count(func.distinct(models.NewsTag.news_id)))
+                             .where(models.NewsTag.tag_id == tag.id))
+        assert result["total"] == expected
+        assert {"id": tag.id, "name": tag.name, "slug": tag.slug, "count": expected} in result["tags"]
+
+
+def test_reads_while_index_is_updated(seeded):
+    """get_facets 與其他執行緒的 index_news / index_links 並行時不會出錯"""
+    with seeded() as db:
+        facets.get_index(db)
+        tag_ids = db.scalars(select(models.Tag.id)).all()
+        max_id = db.scalar(select(func.max(models.News.id)))
+
+    # 縮短執行緒切換間隔，讓讀取更容易在走訪途中被寫入打斷
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    stopped = threading.Event()
+    errors = []
+
+    def writer():
+        news_id = max_id
+        while not stopped.is_set():
+            news_id += 1
+            # 每次都是新的日期與新的分面值，days 與 bitmaps 的大小持續改變
+            facets.index_news(news_id, None, datetime(2030, 1, 1) + timedelta(days=news_id),
+                              keys=[("tag", 10_000 + news_id)])
+            facets.index_links([(news_id, ("tag", tag_id)) for tag_id in tag_ids[:3]])
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        with seeded() as db:
+            for _ in range(50):
+                try:
+                    facets.get_facets(db, start=datetime(2000, 1, 1), tags=[], entities=[], limit=5)
+                    facets.get_facets(db, entities=[1], limit=5)
+                except Exception as e:  # pragma: no cover - 失敗時回報
+                    errors.append(e)
+    finally:
+        stopped.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+    assert not errors
+
+
+def test_incremental_load_picks_up_late_commits(seeded, monkeypatch):
+    """id 比已載入的最大 id 小、較晚 commit 的關聯，在重新讀取的範圍內會被載入"""
+    monkeypatch.setattr(facets, "REFRESH_INTERVAL", 0)
+    with seeded() as db:
+        link = db.scalar(select(models.NewsTag).order_by(models.NewsTag.id.desc()).offset(5).limit(1))
+        late = {"id": link.id, "news_id": link.news_id, "tag_id": link.tag_id}
+        db.delete(link)
+        db.commit()
+        index = facets.get_index(db)
+        assert late["id"] < index.max_ids["news_tags"]
+        assert late["news_id"] not in index.bitmaps[("tag", late["tag_id"])]
+
+        db.execute(insert(models.NewsTag).values(**late))
+        db.commit()
+        assert late["news_id"] in facets.get_index(db).bitmaps[("tag", late["tag_id"])]
+
+
+def test_full_reload_runs_off_the_request_path(seeded, monkeypatch):
+    """整份重建在背景執行緒進行，期間不持有 _index_lock，本行程的寫入會重播到新索引"""
+    monkeypatch.setattr(facets, "REFRESH_INTERVAL", 0)
+    with seeded() as db:
+        old = facets.get_index(db)
+        load = facets._load
+        release = threading.Event()
+
+        def slow_load(db, index):
+            if threading.current_thread().name == "facet-reload":
+                assert release.wait(10)
+            load(db, index)
+
+        monkeypatch.setattr(facets, "_load", slow_load)
+        monkeypatch.setattr(facets, "FULL_RELOAD_INTERVAL", 0)
+        assert facets.get_index(db) is old
+        reloader = facets._reloader
+        assert reloader.is_alive()
+        # 重建期間本行程的寫入不會被擋住
+        facets.index_links([(1, ("tag", 10_000))])
+        assert 1 in old.bitmaps[("tag", 10_000)]
+
+        release.set()
+        reloader.join(timeout=10)
+        # 不再開始下一次重建，否則新索引會被只依資料庫內容重建的索引取代
+        monkeypatch.setattr(facets, "FULL_RELOAD_INTERVAL", 3600)
+        index = facets.get_index(db)
+        assert index is not old
+        assert 1 in index.bitmaps[("tag", 10_000)]
+        assert len(index.all) == len(old.all)
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from app import jobs, models
+
+
+@pytest.fixture
+def runner(Session):
+    runner = jobs.JobRunner(Session, max_workers=1)
+    yield runner
+    runner.stop()
+
+
+def test_failed_claim_releases_slot(runner, Session, monkeypatch):
+    # 只執行這個測試註冊的工作種類
+    monkeypatch.setattr(jobs, "_handlers", {})
+    monkeypatch.setattr(jobs, "_schedule", {})
+    calls = []
+
+    @jobs.handler("test.noop", concurrency=1)
+    def noop(db, payloads):
+        calls.extend(payloads)
+
+    with Session() as db:
+        jobs.enqueue(db, "test.noop", {"n": 1}, key="test.noop:1")
+        db.commit()
+    claim = runner._claim
+
+    def broken(kind, spec):
+        raise RuntimeError("lock timeout")
+
+    monkeypatch.setattr(runner, "_claim", broken)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            runner.run_once()
+    assert runner._running["test.noop"] == 0
+
+    monkeypatch.setattr(runner, "_claim", claim)
+    assert runner.drain(timeout=10)
+    assert calls == [{"n": 1}]
+    with Session() as db:
+        assert db.query(models.OutboxJob.status).filter_by(kind="test.noop").scalar() == "done"
+
+
+def test_extract_entities_clears_response_cache(Session):
+    """背景抽取實體改變分面計數，快取的回應要一併清除"""
+    from app import crud
+    from app.compression import response_cache
+
+    with Session() as db:
+        news = crud.add_news(db, "湖人擊敗勇士", "湖人今天在主場擊敗勇士。" * 5, "", datetime(2025, 3, 30),
+                             "NBA")
+        response_cache.put(("/facets", "", "br"), "cached")
+        jobs.extract_entities(db, [{"news_id": news.id}])
+        assert len(response_cache) == 0
+        assert {entity.name for entity in news.entities} >= {"Los Angeles Lakers", "Golden State Warriors"}
+
+
+def test_related_updated_after_entity_extraction(Session, tmp_path, monkeypatch):
+    """實體抽取完成後排入相關新聞更新，news_related 不必等人工執行 related 命令列"""
+    from app import crud, related
+
+    monkeypatch.setattr(related, "INDEX_PATH", str(tmp_path / "related_index.npz"))
+    with Session() as db:
+        first = crud.add_news(db, "湖人擊敗勇士", "湖人今天在主場擊敗勇士，詹姆斯攻下 32 分。" * 5, "",
+                              datetime(2025, 3, 30), "NBA", ["湖人"])
+        second = crud.add_news(db, "勇士不敵湖人", "柯瑞砍下 30 分，勇士仍在客場輸給湖人。" * 5, "",
+                               datetime(2025, 3, 31), "NBA", ["湖人"])
+        ids = (first.id, second.id)
+        jobs.extract_entities(db, [{"news_id": news_id} for news_id in ids])
+        db.commit()
+
+        payloads = db.scalars(select(models.OutboxJob.payload).filter_by(kind="news.update_related")).all()
+        assert sorted(payload["news_id"] for payload in payloads) == list(ids)
+        jobs.update_related(db, payloads)
+        pairs = set(db.execute(select(models.NewsRelated.news_id, models.NewsRelated.related_id)).tuples())
+    assert pairs == {ids, ids[::-1]}
+
+
+def test_rebuild_commits_when_no_neighbors(Session, tmp_path):
+    """沒有任何鄰居時全量重建仍會清空並 commit news_related"""
+    from app import crud, related
+
+    with Session() as db:
+        news = crud.add_news(db, "湖人擊敗勇士", "湖人今天在主場擊敗勇士。" * 5, "", datetime(2025, 3, 30), "NBA")
+        db.add(models.NewsRelated(news_id=news.id, related_id=news.id, score=1.0, rank=1))
+        db.commit()
+        related.rebuild(db, path=str(tmp_path / "related_index.npz"))
+    with Session() as db:
+        assert db.query(models.NewsRelated).count() == 0
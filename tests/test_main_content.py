@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+import fixture_server
+from main_content import parse_article, validate_article
+
+
+def test_http_page_parsed_inside_story_container():
+    """HTTP 抓回整頁時只擷取 div#story 內的標題與段落，頁首、頁尾與側欄的 <h1>、<p> 不算在內"""
+    html = fixture_server.story_page(1).replace(
+        "</div></body>",
+        '</div><div class="sidebar"><div><h1>熱門排行</h1><p>側欄</p></div></div>'
+        "<footer><p>聯合線上版權所有</p></footer></body>",
+    )
+    article = parse_article(html, "https://tw-nba.udn.com/nba/story/6754/1")
+    assert article.title == "湖人擊敗勇士 詹姆斯全能演出 1"
+    assert article.paragraphs == fixture_server.PARAGRAPHS
+    assert validate_article(article)
@@ -0,0 +1,177 @@
+"""爬蟲的媒體階段，對本機的 fixture_server 下載圖片並寫入 SQLite"""
+import asyncio
+import struct
+import time
+
+import httpx
+import pytest
+
+import fixture_server
+import media
+from app import crud, uploads
+
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(**options):
+        server = fixture_server.serve(0, **options)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", server.RequestHandlerClass
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def run(Session, urls, **options):
+    """以新的 MediaStage 下載所有網址並寫入，回傳 (各網址的結果, 統計)"""
+    async def main():
+        async with httpx.AsyncClient() as client:
+            stage = media.MediaStage(client, session_factory=Session, **options)
+            results = await asyncio.gather(*(stage.get(url) for url in urls))
+            await stage.flush()
+            return results, stage.stats
+
+    return asyncio.run(main())
+
+
+
+def test_dedup_by_hash(server, Session):
+    base, _ = server(flaky_every=0)
+    # 10 張圖片只有 DISTINCT_PHOTOS 種內容，另外重複請求同一個網址
+    urls = [f"{base}/photos/{i}.png" for i in range(10)] + [f"{base}/photos/0.png"]
+    results, stats = run(Session, urls)
+    assert all(results)
+    assert stats["downloaded"] == 10
+    assert stats["url_hits"] == 1
+    assert stats["deduped"] == 10 - fixture_server.DISTINCT_PHOTOS
+    assert stats["stored"] == fixture_server.DISTINCT_PHOTOS
+    assert len({info.sha256 for info in results}) == fixture_server.DISTINCT_PHOTOS
+    with Session() as db:
+        assert crud.existing_media_hashes(db, [info.sha256 for info in results]) == {info.sha256 for info in results}
+
+    # 另一個行程再遇到相同內容時不重寫
+    _, stats = run(Session, [f"{base}/photos/{i}.png" for i in range(10, 15)])
+    assert stats["stored"] == 0
+    assert stats["already_stored"] == fixture_server.DISTINCT_PHOTOS
+
+
+def test_retry_on_503_honours_retry_after(server, Session, monkeypatch):
+    base, handler = server(flaky_every=7, retry_after=1)
+    monkeypatch.setattr(media, "BACKOFF", 0.01)
+    started = time.monotonic()
+    results, stats = run(Session, [f"{base}/photos/7.png"])
+    assert results[0] is not None
+    assert stats["retries"] == 1
+    assert handler.attempts[7] == 2
+    # 依 Retry-After 等待，而不是只有 BACKOFF 的退避
+    assert time.monotonic() - started >= 1.0
+
+
+def test_gives_up_after_retries(server, Session, monkeypatch):
+    base, handler = server(flaky_every=7)
+    monkeypatch.setattr(media, "BACKOFF", 0.01)
+    results, stats = run(Session, [f"{base}/photos/7.png"], retries=0)
+    assert results == [None]
+    assert stats["failed"] == 1
+    assert handler.attempts[7] == 1
+
+
+def test_per_host_limit(server, Session):
+    base, handler = server(flaky_every=0, photo_delay=0.05)
+    results, _ = run(Session, [f"{base}/photos/{i}.png" for i in range(12)], concurrency=16, per_host=3)
+    assert all(results)
+    assert handler.photo_stats["max_in_flight"] == 3
+
+
+
+def test_busy_host_does_not_hold_global_slots(server, Session):
+    """慢主機排隊中的請求不佔用全域名額，其他主機的圖片不必等它們"""
+    slow, _ = server(flaky_every=0, photo_delay=0.3)
+    fast, _ = server(flaky_every=0)
+
+    async def main():
+        async with httpx.AsyncClient() as client:
+            stage = media.MediaStage(client, session_factory=Session, concurrency=2, per_host=1)
+            slow_tasks = [asyncio.ensure_future(stage.get(f"{slow}/photos/{i}.png")) for i in range(4)]
+            await asyncio.sleep(0)
+            started = time.monotonic()
+            assert await stage.get(f"{fast}/photos/0.png")
+            elapsed = time.monotonic() - started
+            assert all(await asyncio.gather(*slow_tasks))
+            await stage.flush()
+            return elapsed
+
+    assert asyncio.run(main()) < 0.25
+
+
+def test_size_limit(server, Session, monkeypatch):
+    base, _ = server(flaky_every=0)
+    monkeypatch.setattr(uploads, "MAX_IMAGE_BYTES", 100)
+    results, stats = run(Session, [f"{base}/photos/1.png"])
+    assert results == [None]
+    assert stats["failed"] == 1
+    assert stats["stored"] == 0
+
+
+def test_truncated_image_is_counted_invalid(server, Session):
+    base, _ = server(flaky_every=0)
+    results, stats = run(Session, [f"{base}/photos/truncated.gif", f"{base}/photos/1.png"])
+    assert results[0] is None and results[1] is not None
+    assert stats["invalid"] == 1
+    assert stats["stored"] == 1
+
+
+def test_unexpected_verify_error_is_counted_invalid(server, Session, monkeypatch):
+    base, _ = server(flaky_every=0)
+
+    def broken(file, mime_type, size):
+        raise struct.error("unpack requires a buffer of 4 bytes")
+
+    monkeypatch.setattr(uploads, "verify", broken)
+    results, stats = run(Session, [f"{base}/photos/1.png"])
+    assert results == [None]
+    assert stats["invalid"] == 1
+
+
+def test_failed_write_is_retried(server, Session, monkeypatch):
+    base, _ = server(flaky_every=0)
+
+    async def main():
+        async with httpx.AsyncClient() as client:
+            stage = media.MediaStage(client, session_factory=Session, batch_size=2)
+            write = stage._write
+            monkeypatch.setattr(stage, "_write", lambda rows: (_ for _ in ()).throw(RuntimeError("資料庫離線")))
+            # 湊滿一批時寫入失敗，錯誤不會傳給這篇文章；之後每張新圖片都會再試一次
+            infos = [await stage.get(f"{base}/photos/{i}.png") for i in range(3)]
+            assert all(infos)
+            assert stage.stats["write_errors"] == 2
+            assert len(stage._pending) == 3
+            assert await stage.flush() is False
+            monkeypatch.setattr(stage, "_write", write)
+            assert await stage.flush() is True
+            return stage.stats
+
+    stats = asyncio.run(main())
+    assert stats["stored"] == 3
+
+
+def test_pending_rows_are_bounded_when_writes_fail(server, Session, monkeypatch):
+    base, _ = server(flaky_every=0)
+    monkeypatch.setattr(media, "MAX_PENDING_BATCHES", 1)
+
+    async def main():
+        async with httpx.AsyncClient() as client:
+            stage = media.MediaStage(client, session_factory=Session, batch_size=2)
+            monkeypatch.setattr(stage, "_write", lambda rows: (_ for _ in ()).throw(RuntimeError("資料庫離線")))
+            infos = [await stage.get(f"{base}/photos/{i}.png") for i in range(3)]
+            # 最舊的一張被丟棄，並從去重集合移除，之後遇到相同內容時會重新排入
+            assert len(stage._pending) == 2
+            assert stage.stats["dropped"] == 1
+            assert infos[0].sha256 not in stage._seen
+            assert f"{base}/photos/0.png" not in stage._by_url
+
+    asyncio.run(main())
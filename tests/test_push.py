@@ -0,0 +1,37 @@
+import asyncio
+import json
+
+from app import push
+
+
+def test_event_ids_match_across_workers_and_restarts():
+    """經 pg_notify 轉發的事件在每個 worker 上 id 相同；行程內編號在重啟後不會變小"""
+
+    async def run():
+        workers = [push.Broadcaster(), push.Broadcaster()]
+        subscribers = [worker.subscribe() for worker in workers]
+        # 其中一個 worker 重啟前已推播過幾個事件
+        for _ in range(3):
+            workers[1].publish("created", {"id": 0})
+        for worker in workers:
+            push.NotifyListener("", target=worker)._dispatch(
+                json.dumps({"id": 42, "type": "created", "data": {"id": 1}}))
+        ids = [[event["id"] for event in list(subscriber.queue._queue)] for subscriber in subscribers]
+        assert ids[0] == [42]
+        assert ids[1][-1] == 42
+
+        before = push.Broadcaster()
+        before.subscribe()
+        before.publish("created", {"id": 2})
+        restarted = push.Broadcaster()
+        subscriber = restarted.subscribe()
+        restarted.publish("created", {"id": 3})
+        restarted.publish("created", {"id": 4})
+        first, second = subscriber.queue.get_nowait(), subscriber.queue.get_nowait()
+        assert 0 < before._last_id < first["id"] < second["id"]
+
+        # 帶上 Last-Event-ID 重連到另一個 worker 時只補送之後的事件
+        resumed = workers[0].subscribe(last_event_id=41)
+        assert resumed.queue.get_nowait()["id"] == 42
+
+    asyncio.run(run())
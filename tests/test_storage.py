@@ -0,0 +1,44 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+import storage
+from models import ArticleContent, ImageInfo
+
+
+class Collection:
+    def __init__(self):
+        self.updates = []
+
+    def update_one(self, query, update, upsert=False):
+        self.updates.append(update)
+        return SimpleNamespace(upserted_id=None, matched_count=1)
+
+
+def _article(paragraphs, time_text="2025-03-30 12:34"):
+    now = datetime(2025, 3, 30, 13)
+    return ArticleContent(title="湖人擊敗勇士", time=time_text, url="https://tw-nba.udn.com/nba/story/6754/1",
+                          image=ImageInfo(url="", title="", alt=""), content="\n".join(paragraphs),
+                          paragraphs=paragraphs, crawled_at=now, updated_at=now)
+
+
+@pytest.mark.parametrize("length", [10, storage.COMPRESS_THRESHOLD + 1], ids=["plain", "compressed"])
+def test_save_article_unsets_stale_fields(length):
+    """重新爬取時移除第 1 版的 content、另一種格式的內文與已解析的時間字串"""
+    collection = Collection()
+    storage.save_article(collection, _article(["湖" * length]))
+    update = collection.updates[0]
+    body, other = ("body_z", "paragraphs") if "body_z" in update["$set"] else ("paragraphs", "body_z")
+    assert update["$unset"] == {"content": "", other: "", "time": ""}
+    assert body not in update["$unset"]
+
+
+def test_save_article_keeps_unparsed_time():
+    collection = Collection()
+    storage.save_article(collection, _article(["內文"], time_text="昨天"))
+    update = collection.updates[0]
+    assert update["$set"]["time"] == "昨天"
+    assert "time" not in update["$unset"]
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from app import trending
+
+
+def test_top_and_snapshot_while_background_folds(tmp_path, monkeypatch):
+    """背景執行緒併入與寫快照時，其他執行緒的 record、top 與 snapshot 不會出錯"""
+    monkeypatch.setattr(trending, "FOLD_INTERVAL", 0.001)
+    monkeypatch.setattr(trending, "SNAPSHOT_INTERVAL", 0.01)
+    monkeypatch.setattr(trending, "REFRESH_INTERVAL", 0)
+    tracker = trending.TrendingTracker(str(tmp_path), capacity=20)
+    stopped = threading.Event()
+    errors = []
+
+    def writer():
+        key = 0
+        while not stopped.is_set():
+            key += 1
+            # 項目比摘要容量多，摘要會持續替換項目、標籤也會被刪除
+            tracker.record([(key % 40, {"name": str(key % 40)}), (key % 7, {"name": str(key % 7)})],
+                           [(key % 40, {"name": str(key % 40)})])
+
+    threads = [threading.Thread(target=writer, daemon=True) for _ in range(2)]
+    tracker.start()
+    for thread in threads:
+        thread.start()
+    try:
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            try:
+                for kind in trending.KINDS:
+                    for window in trending.WINDOWS:
+                        tracker.top(kind, window, 10)
+                tracker.snapshot()
+            except Exception as e:  # pragma: no cover - 失敗時回報
+                errors.append(e)
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join(timeout=5)
+        tracker.stop()
+    assert not any(thread.is_alive() for thread in threads)
+    assert not errors
+    assert tracker.top("tags", "1h", 1)[0]["id"] in range(7)
+
+
+def test_labels_pruned_when_buckets_expire(tmp_path):
+    """時間桶過期後標籤跟著刪除"""
+    tracker = trending.TrendingTracker(str(tmp_path), capacity=5)
+    now = 1_700_000_000.0
+    tracker.record([(1, {"name": "a"})], [])
+    tracker.fold(now)
+    tracker.record([(2, {"name": "b"})], [])
+    assert set(tracker.labels["tags"]) == {1, 2}
+
+    # 24 小時後原本的桶都已過期，項目 2 併入新的桶，標籤保留
+    tracker.fold(now + 25 * 3600)
+    assert set(tracker.labels["tags"]) == {2}
+    tracker.fold(now + 50 * 3600)
+    assert tracker.labels["tags"] == {}
@@ -0,0 +1,69 @@
+import struct
+import zlib
+from datetime import datetime
+
+import pytest
+
+from app import models, uploads
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+IHDR = _png_chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+IEND = _png_chunk(b"IEND", b"")
+PNG = b"\x89PNG\r\n\x1a\n" + IHDR + _png_chunk(b"IDAT", zlib.compress(b"\x00\x00")) + IEND
+GIF = b"GIF89a\x01\x00\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+JPEG_SOF = b"\xff\xc0\x00\x0b\x08\x00\x02\x00\x03\x01\x01\x11\x00"
+
+
+@pytest.fixture
+def news_id(db):
+    category = models.Category(name="湖人", slug="lakers")
+    news = models.News(title="測試", slug="test", content="內容", published_at=datetime(2025, 1, 1), category=category)
+    db.add(news)
+    db.commit()
+    return news.id
+
+
+@pytest.fixture(params=["structural", "pillow"])
+def verifier(request, monkeypatch):
+    if request.param == "structural":
+        monkeypatch.setattr(uploads, "_pillow", lambda: None)
+    elif uploads._pillow() is None:
+        pytest.skip("未安裝 Pillow")
+
+
+@pytest.mark.parametrize("name, data", [
+    ("gif-header-only", b"GIF89a;"),
+    ("png-without-idat", b"\x89PNG\r\n\x1a\n" + IHDR + IEND),
+    ("png-truncated-ihdr", b"\x89PNG\r\n\x1a\n" + IHDR[:12] + IEND),
+    ("jpeg-soi-eoi", b"\xff\xd8\xff\xd9"),
+    ("jpeg-truncated-sof", b"\xff\xd8" + JPEG_SOF[:6] + b"\xff\xd9"),
+    ("jpeg-bad-segment-length", b"\xff\xd8\xff\xe0\x00\x01\xff\xd9"),
+])
+def test_truncated_image_is_rejected(client, news_id, verifier, name, data):
+    response = client.post(f"/news/{news_id}/image", files={"image": (f"{name}.img", data)})
+    assert response.status_code == 415, response.text
+
+
+@pytest.mark.parametrize("data, mime_type", [
+    (PNG, "image/png"),
+    (GIF, "image/gif"),
+    (b"\xff\xd8" + JPEG_SOF + b"\xff\xd9", "image/jpeg"),
+])
+def test_structural_check_reads_size(monkeypatch, tmp_path, data, mime_type):
+    monkeypatch.setattr(uploads, "_pillow", lambda: None)
+    path = tmp_path / "image"
+    path.write_bytes(data)
+    with open(path, "rb") as file:
+        width, height = uploads.verify(file, mime_type, len(data))
+    assert (width, height) == ((3, 2) if mime_type == "image/jpeg" else (1, 1))
+
+
+def test_valid_image_is_stored(client, news_id, monkeypatch):
+    monkeypatch.setattr(uploads, "_pillow", lambda: None)
+    response = client.post(f"/news/{news_id}/image", files={"image": ("a.png", PNG)})
+    assert response.status_code == 200, response.text
+    assert client.get(f"/news/{news_id}/image").content == PNG